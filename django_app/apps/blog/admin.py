@@ -9,6 +9,7 @@ class PostAdmin(admin.ModelAdmin):
     """Админ панель поста."""
 
     prepopulated_fields = {'slug': ('title',)}
+    readonly_fields = Post.RATING_FIELDS
 
 
 @admin.register(Category)
@@ -19,10 +20,17 @@ class CategoryAdmin(DjangoMpttAdmin):
 
 
 @admin.register(Comment)
-class CommentAdmin(DjangoMpttAdmin):
+class CommentAdmin(admin.ModelAdmin):
     """Админ панель коомментариев."""
 
-    pass
+    list_display = ('__str__', 'post', 'depth', 'create')
+    raw_id_fields = ('post', 'author', 'parent')
+
+    def get_readonly_fields(self, request, obj=None):
+        """Путь в дереве задается при создании - перенос ветки запрещен."""
+        if obj is not None:
+            return ('post', 'parent')
+        return ()
 
 
 @admin.register(PostRating)
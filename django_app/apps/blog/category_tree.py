@@ -0,0 +1,119 @@
+import threading
+import time
+
+from django.core.cache import cache
+from django.urls import reverse
+
+from .models import Category
+
+# Версия дерева в общем кеше: по ней воркеры узнают, что дерево
+# изменилось в другом процессе.
+VERSION_KEY = 'category_tree:version'
+
+
+class CategoryNode:
+    """Узел дерева категорий без обращений к БД."""
+
+    __slots__ = (
+        'id', 'slug', 'title', 'parent', 'children', 'url',
+        'ancestors', 'descendant_ids',
+    )
+
+    def __init__(self, id, slug, title):
+        self.id = id
+        self.slug = slug
+        self.title = title
+        self.parent = None
+        self.children = []
+        self.url = reverse('blog:category', kwargs={'slug': slug})
+        self.ancestors = ()
+        self.descendant_ids = frozenset()
+
+    def __str__(self):
+        return self.title
+
+    def get_absolute_url(self):
+        return self.url
+
+
+class CategoryTree:
+    """
+    Индекс всех категорий: узлы по id и slug, предки и id всего
+    поддерева (включая саму категорию) посчитаны заранее.
+    """
+
+    def __init__(self, rows):
+        self.nodes = {}
+        self.roots = []
+        parents = {}
+        # Порядок MPTT: родитель раньше детей, соседи по названию.
+        for row in rows:
+            node = CategoryNode(row['id'], row['slug'], row['title'])
+            self.nodes[node.id] = node
+            parents[node.id] = row['parent_id']
+        for node in self.nodes.values():
+            parent = self.nodes.get(parents[node.id])
+            if parent is None:
+                self.roots.append(node)
+            else:
+                node.parent = parent
+                parent.children.append(node)
+        self.by_slug = {node.slug: node for node in self.nodes.values()}
+        for root in self.roots:
+            self._index(root, ())
+
+    def _index(self, node, ancestors):
+        node.ancestors = ancestors
+        ids = {node.id}
+        for child in node.children:
+            ids |= self._index(child, (*ancestors, node))
+        node.descendant_ids = frozenset(ids)
+        return ids
+
+    @classmethod
+    def load(cls):
+        return cls(Category.objects.order_by('tree_id', 'lft').values(
+            'id', 'slug', 'title', 'parent_id'))
+
+    def get(self, slug):
+        return self.by_slug.get(slug)
+
+
+_lock = threading.Lock()
+_tree = None
+_version = None
+
+
+def _current_version():
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        cache.add(VERSION_KEY, time.time_ns(), timeout=None)
+        version = cache.get(VERSION_KEY)
+    return version
+
+
+def get_category_tree():
+    """
+    Дерево категорий процесса. Перестраивается одним запросом, только
+    если версия в кеше сменилась (категории изменены в любом воркере).
+    """
+    global _tree, _version
+    version = _current_version()
+    tree = _tree
+    if tree is not None and _version == version:
+        return tree
+    with _lock:
+        if _tree is None or _version != version:
+            _tree = CategoryTree.load()
+            _version = version
+        return _tree
+
+
+def invalidate_category_tree():
+    """Сброс дерева во всех процессах."""
+    global _tree
+    _tree = None
+    try:
+        cache.incr(VERSION_KEY)
+    except ValueError:
+        cache.add(VERSION_KEY, time.time_ns(), timeout=None)
@@ -0,0 +1,98 @@
+from functools import reduce
+from operator import or_
+
+from django.db.models import Count, F, Window
+from django.db.models.functions import Left, RowNumber
+from django.urls import reverse
+
+from apps.services import constants
+from apps.services.pagination import KeysetPaginator
+from .models import Comment
+
+# Корневые ветки - от новых к старым, ответы - по времени. Путь ответа
+# заканчивается его id, поэтому порядок пути - порядок добавления, и
+# ответы в ветке (по пути) и страницы ответов (по курсору) совпадают.
+ROOT_ORDERING = ('-create', '-id')
+REPLY_ORDERING = ('path',)
+
+
+def comments_with_authors():
+    """Комментарии с авторами, профилями и кол-вом ответов (reply_count)."""
+    return Comment.objects.select_related(
+        'author', 'author__userprofile',
+    ).annotate(reply_count=Count('children'))
+
+
+def load_comment_tree(comments, max_depth=constants.COMMENT_MAX_DEPTH,
+                      per_thread=constants.PAGINATE_COMMENTS_COUNT):
+    """
+    Ветки комментариев одного уровня одним запросом (с авторами и
+    профилями): каждому комментарию проставляется список ответов replies,
+    вложенных до глубины max_depth, - не больше per_thread первых ответов
+    на ветку (по пути в дереве). Остальные ответы догружаются по кнопке:
+    у комментария с недогруженными ответами replies_url - адрес страницы
+    его ответов после последнего загруженного.
+    """
+    nodes = {}
+    for comment in comments:
+        comment.replies = []
+        nodes[comment.pk] = comment
+    threads = [
+        comment.descendants_condition() for comment in comments
+        if comment.depth < max_depth
+    ]
+    if threads:
+        # Номер ответа в ветке считается по одному индексу (post, path),
+        # а авторы и счетчики читаются только для попавших в лимит.
+        thread_path = Left('path', len(comments[0].path))
+        ranked = Comment.objects.filter(
+            reduce(or_, threads), depth__lte=max_depth,
+        ).annotate(
+            number=Window(
+                RowNumber(), partition_by=thread_path, order_by=F('path').asc(),
+            ),
+        ).filter(number__lte=per_thread).values('pk')
+        replies = comments_with_authors().filter(
+            pk__in=ranked,
+        ).order_by('path')
+        for reply in replies:
+            reply.replies = []
+            nodes[reply.pk] = reply
+            # Путь упорядочен так, что родитель идет раньше ответов.
+            nodes[reply.parent_id].replies.append(reply)
+    paginator = KeysetPaginator(Comment.objects.none(), per_thread,
+                                REPLY_ORDERING)
+    for node in nodes.values():
+        node.replies_url = None
+        if node.reply_count > len(node.replies):
+            cursor = None
+            if node.replies:
+                cursor = paginator.encode(node.replies[-1])
+            node.replies_url = comment_page_url(node.post_id, node, cursor)
+    return comments
+
+
+def load_comment_page(post_id, parent=None, cursor=None,
+                      per_page=constants.PAGINATE_COMMENTS_COUNT):
+    """
+    Страница комментариев поста: корневых или прямых ответов на parent,
+    каждый - с веткой ответов (load_comment_tree). Два запроса на
+    страницу, и веток, и ответов в ветке на ней не больше per_page, поэтому
+    стоимость не зависит от числа комментариев поста и размера веток.
+    """
+    queryset = comments_with_authors().filter(post_id=post_id, parent=parent)
+    ordering = ROOT_ORDERING if parent is None else REPLY_ORDERING
+    page = KeysetPaginator(queryset, per_page, ordering).page(cursor)
+    load_comment_tree(page.object_list, per_thread=per_page)
+    return page
+
+
+def comment_page_url(post_id, parent=None, cursor=None):
+    """Адрес страницы комментариев для догрузки."""
+    query = []
+    if parent is not None:
+        query.append(f'parent={parent.pk}')
+    if cursor is not None:
+        query.append(f'after={cursor}')
+    url = reverse('blog:comment_list', kwargs={'pk': post_id})
+    return f'{url}?{"&".join(query)}' if query else url
@@ -0,0 +1,193 @@
+import random
+import time
+from uuid import uuid4
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.db.models import Max, Min
+
+from apps.services.utils import SlugAllocator
+from apps.user_app.models import UserProfile
+from .models import Category, Comment, Post
+from .rating_buffer import cast_vote
+
+NextgenUser = get_user_model()
+
+# Префикс имен синтетических пользователей.
+SYNTHETIC_PREFIX = 'synthetic-'
+# Доля голосов "нравится" и комментариев-ответов.
+LIKE_SHARE = 0.8
+REPLY_SHARE = 0.5
+
+EVENTS = ('posts', 'comments', 'ratings')
+
+
+class EngagementError(Exception):
+    """Исключение: для событий нет данных (пользователей, категорий, постов)."""
+
+    pass
+
+
+class IdSampler:
+    """
+    Случайные id из queryset без ORDER BY RANDOM(): случайная точка
+    в диапазоне [min, max] id и ближайшая запись не меньше нее (один
+    запрос по индексу на выборку). Границы диапазона кешируются и
+    перечитываются каждые BOUNDS_TTL выборок. Дыры в id немного смещают
+    выборку к записям после них, для синтетической нагрузки это неважно.
+    """
+
+    BOUNDS_TTL = 100
+
+    def __init__(self, queryset, rng=random):
+        self.queryset = queryset
+        self.rng = rng
+        self.bounds = None
+        self.samples = 0
+
+    def sample(self):
+        if self.bounds is None or self.samples >= self.BOUNDS_TTL:
+            self.bounds = self.queryset.aggregate(
+                low=Min('pk'), high=Max('pk'))
+            self.samples = 0
+        if self.bounds['low'] is None:
+            self.bounds = None
+            return None
+        self.samples += 1
+        return self.queryset.filter(
+            pk__gte=self.rng.randint(self.bounds['low'], self.bounds['high'])
+        ).order_by('pk').values_list('pk', flat=True).first()
+
+
+class RateLimiter:
+    """Не больше rate событий в секунду (0 - без ограничения)."""
+
+    def __init__(self, rate):
+        self.interval = 1 / rate if rate else 0
+        self.next_at = time.monotonic()
+
+    def wait(self):
+        if not self.interval:
+            return
+        delay = self.next_at - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+        self.next_at = max(self.next_at, time.monotonic()) + self.interval
+
+
+class EngagementGenerator:
+    """
+    Генератор синтетической активности: пользователи создаются пачкой
+    с непригодным паролем (без PBKDF2 на каждого), посты и пользователи
+    выбираются по случайным диапазонам id. Посты, комментарии и голоса
+    проходят через обычные пути записи (Post.save, Comment.save,
+    cast_vote), поэтому нагружают те же запросы, что и сайт, - и голоса
+    так же идут через буфер в режиме RATING_WRITE_BEHIND.
+    """
+
+    def __init__(self, seed=None, password=None):
+        self.rng = random.Random(seed)
+        # Хэш считается один раз на все создаваемые аккаунты.
+        self.password = make_password(password)
+        self.users = NextgenUser.objects.filter(
+            username__startswith=SYNTHETIC_PREFIX)
+        self.user_ids = IdSampler(self.users, self.rng)
+        self.post_ids = IdSampler(Post.published.all(), self.rng)
+        self.category_ids = IdSampler(Category.objects.all(), self.rng)
+        self.counts = dict.fromkeys(EVENTS, 0)
+
+    def create_users(self, count, batch_size=1000):
+        """Пачка синтетических пользователей с профилями."""
+        created = 0
+        while created < count:
+            size = min(batch_size, count - created)
+            names = [
+                f'{SYNTHETIC_PREFIX}{uuid4().hex[:12]}' for _ in range(size)
+            ]
+            users = NextgenUser.objects.bulk_create(
+                NextgenUser(username=name, password=self.password)
+                for name in names
+            )
+            slugs = SlugAllocator(UserProfile).allocate_many(names)
+            UserProfile.objects.bulk_create(
+                UserProfile(user=user, slug=slug)
+                for user, slug in zip(users, slugs)
+            )
+            created += size
+        return created
+
+    def ensure_users(self, count):
+        """Досоздание пула синтетических пользователей до count."""
+        missing = count - self.users.count()
+        return self.create_users(missing) if missing > 0 else 0
+
+    def run(self, counts, rate=0):
+        """
+        Ровно counts[event] событий каждого вида ({'posts': 10, ...})
+        вперемешку, со скоростью не больше rate в секунду. Если для
+        событий нет данных - EngagementError до первого события.
+        Возвращает счетчики.
+        """
+        events = [
+            event for event in EVENTS for _ in range(counts.get(event, 0))
+        ]
+        self.rng.shuffle(events)
+        if not events:
+            return self.counts
+        if self.user_ids.sample() is None:
+            raise EngagementError('Нет синтетических пользователей')
+        if counts.get('posts') and self.category_ids.sample() is None:
+            raise EngagementError('Нет категорий для постов')
+        if set(events) - {'posts'} and self.post_ids.sample() is None:
+            if not counts.get('posts'):
+                raise EngagementError(
+                    'Нет опубликованных постов для комментариев и голосов')
+            # Первым - пост, иначе комментировать и оценивать нечего.
+            events.remove('posts')
+            events.insert(0, 'posts')
+        limiter = RateLimiter(rate)
+        for event in events:
+            limiter.wait()
+            getattr(self, f'emit_{event}')()
+            self.counts[event] += 1
+        return self.counts
+
+    def sample(self, sampler, name):
+        """Случайный id или EngagementError, если записи пропали."""
+        pk = sampler.sample()
+        if pk is None:
+            raise EngagementError(f'Нет записей для выборки: {name}')
+        return pk
+
+    def emit_posts(self):
+        author_id = self.sample(self.user_ids, 'пользователи')
+        category_id = self.sample(self.category_ids, 'категории')
+        number = self.rng.randint(1, 10 ** 6)
+        Post.objects.create(
+            title=f'Синтетический пост {number}',
+            description=f'<p>Описание синтетического поста {number}.</p>',
+            text=f'<p>Текст синтетического поста {number}.</p>',
+            category_id=category_id,
+            author_id=author_id,
+            updater_id=author_id,
+        )
+
+    def emit_comments(self):
+        post_id = self.sample(self.post_ids, 'посты')
+        author_id = self.sample(self.user_ids, 'пользователи')
+        parent_id = None
+        if self.rng.random() < REPLY_SHARE:
+            parent_id = IdSampler(
+                Comment.objects.filter(post_id=post_id), self.rng).sample()
+        Comment.objects.create(
+            post_id=post_id,
+            author_id=author_id,
+            parent_id=parent_id,
+            body=f'Синтетический комментарий {self.rng.randint(1, 10 ** 6)}',
+        )
+
+    def emit_ratings(self):
+        post_id = self.sample(self.post_ids, 'посты')
+        user_id = self.sample(self.user_ids, 'пользователи')
+        value = 1 if self.rng.random() < LIKE_SHARE else -1
+        cast_vote(post_id, user_id, value)
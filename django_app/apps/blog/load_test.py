@@ -0,0 +1,410 @@
+import asyncio
+import http.cookies
+import json
+import random
+import re
+import ssl
+import statistics
+import time
+from bisect import bisect_left
+from collections import Counter
+from urllib.parse import urlencode, urlsplit
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.urls import reverse
+
+from apps.services.utils import SlugAllocator
+from apps.user_app.models import UserProfile
+from .models import Post
+
+NextgenUser = get_user_model()
+
+# Префикс имен пользователей нагрузочного теста.
+LOAD_USER_PREFIX = 'loadtest-'
+SCENARIOS = ('home', 'post_detail', 'rating', 'comment_create',
+             'comment_delete')
+# Верхние границы корзин гистограммы задержек (мс).
+LATENCY_BUCKETS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+# Ссылка на следующую страницу ленты (includes/pagination.html).
+FEED_NEXT_RE = re.compile(r'class="page-link feed-next" href="([^"]+)"')
+
+
+def ensure_load_users(count, password):
+    """
+    Пользователи loadtest-0..count-1 с общим паролем: недостающие
+    создаются пачкой с профилями, у существующих пароль обновляется.
+    """
+    names = [f'{LOAD_USER_PREFIX}{number}' for number in range(count)]
+    hashed = make_password(password)
+    users = NextgenUser.objects.filter(username__in=names)
+    users.update(password=hashed)
+    existing = set(users.values_list('username', flat=True))
+    missing = [name for name in names if name not in existing]
+    created = NextgenUser.objects.bulk_create(
+        NextgenUser(username=name, password=hashed) for name in missing)
+    slugs = SlugAllocator(UserProfile).allocate_many(missing)
+    UserProfile.objects.bulk_create(
+        UserProfile(user=user, slug=slug)
+        for user, slug in zip(created, slugs)
+    )
+    return names
+
+
+def target_posts(limit):
+    """Последние опубликованные посты: [(pk, путь страницы поста)]."""
+    return [
+        (pk, reverse('blog:post_detail', kwargs={'slug': slug}))
+        for pk, slug in Post.published.order_by('-create').values_list(
+            'pk', 'slug')[:limit]
+    ]
+
+
+class Response:
+    def __init__(self, status, headers, body):
+        self.status = status
+        self.headers = headers
+        self.body = body
+
+    def json(self):
+        return json.loads(self.body)
+
+
+class Connection:
+    """HTTP/1.1 соединение с keep-alive поверх asyncio streams."""
+
+    def __init__(self, base_url, timeout):
+        parts = urlsplit(base_url)
+        https = parts.scheme == 'https'
+        self.host = parts.hostname
+        self.port = parts.port or (443 if https else 80)
+        self.netloc = parts.netloc
+        self.ssl = ssl.create_default_context() if https else None
+        self.timeout = timeout
+        self.reader = self.writer = None
+
+    async def request(self, method, path, headers, body=b''):
+        while True:
+            reused = self.writer is not None
+            if not reused:
+                self.reader, self.writer = await asyncio.wait_for(
+                    asyncio.open_connection(self.host, self.port, ssl=self.ssl),
+                    self.timeout,
+                )
+            try:
+                return await asyncio.wait_for(
+                    self._exchange(method, path, headers, body), self.timeout)
+            except (ConnectionError, asyncio.IncompleteReadError):
+                self.close()
+                # Простаивающее соединение могло быть закрыто сервером -
+                # один повтор на новом.
+                if not reused:
+                    raise
+            except BaseException:
+                self.close()
+                raise
+
+    async def _exchange(self, method, path, headers, body):
+        lines = [f'{method} {path} HTTP/1.1', f'Host: {self.netloc}']
+        if body or method not in ('GET', 'HEAD'):
+            lines.append(f'Content-Length: {len(body)}')
+        lines.extend(f'{name}: {value}' for name, value in headers.items())
+        self.writer.write(
+            ('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1') + body)
+        await self.writer.drain()
+
+        status_line = await self.reader.readline()
+        if not status_line:
+            raise ConnectionError('Соединение закрыто сервером')
+        status = int(status_line.split()[1])
+        response_headers = []
+        while True:
+            line = await self.reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            response_headers.append((name.strip().lower(), value.strip()))
+        fields = dict(response_headers)
+
+        close = fields.get('connection', '').lower() == 'close'
+        if method == 'HEAD' or status in (204, 304) or status < 200:
+            response_body = b''
+        elif fields.get('transfer-encoding', '').lower() == 'chunked':
+            response_body = await self._read_chunked()
+        elif 'content-length' in fields:
+            response_body = await self.reader.readexactly(
+                int(fields['content-length']))
+        else:
+            response_body = await self.reader.read()
+            close = True
+        if close:
+            self.close()
+        return Response(status, response_headers, response_body)
+
+    async def _read_chunked(self):
+        chunks = []
+        while True:
+            size = int((await self.reader.readline()).split(b';')[0], 16)
+            if not size:
+                # Завершающие заголовки (trailers) не используются.
+                while await self.reader.readline() not in (b'\r\n', b'\n', b''):
+                    pass
+                return b''.join(chunks)
+            chunks.append(await self.reader.readexactly(size))
+            await self.reader.readexactly(2)
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+        self.reader = self.writer = None
+
+
+class Session:
+    """Браузер одного виртуального пользователя: соединение и cookies."""
+
+    def __init__(self, base_url, timeout):
+        self.base_url = base_url.rstrip('/')
+        self.connection = Connection(base_url, timeout)
+        self.cookies = {}
+
+    async def request(self, method, path, data=None, ajax=False):
+        headers = {'User-Agent': 'blog-load-test'}
+        if self.cookies:
+            headers['Cookie'] = '; '.join(
+                f'{name}={value}' for name, value in self.cookies.items())
+        if method not in ('GET', 'HEAD'):
+            # CSRF как в static/js_back: токен из cookie в заголовке,
+            # Referer нужен проверке под HTTPS.
+            headers['X-CSRFToken'] = self.cookies.get(
+                settings.CSRF_COOKIE_NAME, '')
+            headers['Referer'] = self.base_url + path
+        body = b''
+        if data is not None:
+            body = urlencode(data).encode()
+            headers['Content-Type'] = 'application/x-www-form-urlencoded'
+        if ajax:
+            headers['X-Requested-With'] = 'XMLHttpRequest'
+        response = await self.connection.request(method, path, headers, body)
+        for name, value in response.headers:
+            if name == 'set-cookie':
+                self._store_cookie(value)
+        return response
+
+    def _store_cookie(self, header):
+        cookie = http.cookies.SimpleCookie()
+        cookie.load(header)
+        for name, morsel in cookie.items():
+            if morsel['max-age'] == '0' or not morsel.value:
+                self.cookies.pop(name, None)
+            else:
+                self.cookies[name] = morsel.value
+
+    def close(self):
+        self.connection.close()
+
+
+class EndpointStats:
+    def __init__(self):
+        self.latencies = []
+        self.statuses = Counter()
+        self.errors = 0
+
+    def add(self, latency, status, error):
+        self.latencies.append(latency)
+        self.statuses[status] += 1
+        self.errors += error
+
+    def summary(self, elapsed):
+        latencies = sorted(self.latencies)
+        histogram = Counter(
+            bisect_left(LATENCY_BUCKETS, latency * 1000)
+            for latency in latencies)
+        labels = [f'<={bound}' for bound in LATENCY_BUCKETS] + [
+            f'>{LATENCY_BUCKETS[-1]}']
+        return {
+            'requests': len(latencies),
+            'rps': round(len(latencies) / elapsed, 1),
+            'error_rate': round(self.errors / len(latencies), 4),
+            'p50_ms': self._percentile(latencies, 50),
+            'p95_ms': self._percentile(latencies, 95),
+            'p99_ms': self._percentile(latencies, 99),
+            'max_ms': round(latencies[-1] * 1000, 1),
+            'statuses': {
+                str(status): count
+                for status, count in sorted(self.statuses.items())
+            },
+            'histogram_ms': {
+                labels[index]: histogram[index]
+                for index in range(len(labels)) if histogram[index]
+            },
+        }
+
+    @staticmethod
+    def _percentile(latencies, percent):
+        if len(latencies) < 2:
+            return round(latencies[0] * 1000, 1)
+        return round(statistics.quantiles(
+            latencies, n=100, method='inclusive')[percent - 1] * 1000, 1)
+
+
+class LoadTest:
+    """
+    Нагрузка по HTTP на работающий стек (nginx + gunicorn): concurrency
+    виртуальных пользователей в одном event loop выбирают сценарии по
+    весам до истечения duration. У каждого - анонимный сеанс для чтения
+    и сеанс под своим пользователем для голосов и комментариев (вход
+    через форму входа с CSRF). Статистика ведется по эндпоинтам.
+    Проверку капчи комментариев проходят тестовые ключи reCAPTCHA
+    (https://developers.google.com/recaptcha/docs/faq) на сервере.
+    """
+
+    def __init__(self, base_url, posts, users, password, weights,
+                 concurrency=10, duration=30, home_pages=3, timeout=10,
+                 seed=None):
+        self.base_url = base_url
+        self.posts = posts
+        self.users = users
+        self.password = password
+        self.scenarios = [name for name in SCENARIOS if weights.get(name)]
+        self.weights = [weights[name] for name in self.scenarios]
+        self.concurrency = concurrency
+        self.duration = duration
+        self.home_pages = home_pages
+        self.timeout = timeout
+        self.seed = seed
+        self.stats = {}
+        self.elapsed = 0
+        self.paths = {
+            'home': reverse('blog:home'),
+            'login': reverse('user_app:login'),
+            'rating': reverse('blog:rating'),
+        }
+
+    def run(self):
+        """Прогон; возвращает {эндпоинт: сводка}."""
+        started = time.monotonic()
+        asyncio.run(self._run(started + self.duration))
+        self.elapsed = time.monotonic() - started
+        return {
+            name: stats.summary(self.elapsed)
+            for name, stats in sorted(self.stats.items())
+        }
+
+    async def _run(self, deadline):
+        await asyncio.gather(*(
+            VirtualUser(self, number).run(deadline)
+            for number in range(self.concurrency)
+        ))
+
+    async def call(self, name, session, method, path, data=None, ajax=False,
+                   expect=200):
+        """Запрос с замером; None при сетевой ошибке."""
+        stats = self.stats.setdefault(name, EndpointStats())
+        started = time.perf_counter()
+        try:
+            response = await session.request(method, path, data, ajax)
+        except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError,
+                ValueError):
+            stats.add(time.perf_counter() - started, 'error', True)
+            return None
+        stats.add(time.perf_counter() - started, response.status,
+                  response.status != expect)
+        return response
+
+
+class VirtualUser:
+    def __init__(self, test, number):
+        self.test = test
+        self.rng = random.Random(
+            None if test.seed is None else test.seed + number)
+        self.username = test.users[number % len(test.users)]
+        self.anonymous = Session(test.base_url, test.timeout)
+        self.session = None
+        self.comments = []
+
+    async def run(self, deadline):
+        try:
+            while time.monotonic() < deadline:
+                scenario = self.rng.choices(
+                    self.test.scenarios, self.test.weights)[0]
+                await getattr(self, f'scenario_{scenario}')()
+        finally:
+            self.anonymous.close()
+            if self.session is not None:
+                self.session.close()
+
+    async def authorized(self):
+        """Сеанс под пользователем (вход при первом обращении)."""
+        if self.session is not None:
+            return self.session
+        session = Session(self.test.base_url, self.test.timeout)
+        path = self.test.paths['login']
+        await self.test.call('login_form', session, 'GET', path)
+        response = await self.test.call('login', session, 'POST', path, {
+            'username': self.username,
+            'password': self.test.password,
+            'csrfmiddlewaretoken': session.cookies.get(
+                settings.CSRF_COOKIE_NAME, ''),
+        }, expect=302)
+        if response is None or response.status != 302:
+            session.close()
+            return None
+        self.session = session
+        return session
+
+    async def scenario_home(self):
+        path = self.test.paths['home']
+        for page in range(self.test.home_pages):
+            response = await self.test.call(
+                'home' if not page else 'home_next', self.anonymous, 'GET',
+                path)
+            match = response and FEED_NEXT_RE.search(
+                response.body.decode('utf-8', 'replace'))
+            if not match:
+                return
+            path = self.test.paths['home'] + match.group(1).replace(
+                '&amp;', '&')
+
+    async def scenario_post_detail(self):
+        _, path = self.rng.choice(self.test.posts)
+        await self.test.call('post_detail', self.anonymous, 'GET', path)
+
+    async def scenario_rating(self):
+        session = await self.authorized()
+        if session is None:
+            return
+        pk, _ = self.rng.choice(self.test.posts)
+        await self.test.call('rating', session, 'POST', self.test.paths['rating'], {
+            'pk': pk,
+            'value': self.rng.choice((1, -1)),
+        })
+
+    async def scenario_comment_create(self):
+        session = await self.authorized()
+        if session is None:
+            return
+        pk, _ = self.rng.choice(self.test.posts)
+        response = await self.test.call(
+            'comment_create', session, 'POST',
+            reverse('blog:comment_create', kwargs={'pk': pk}),
+            {
+                'body': f'Нагрузочный комментарий {self.rng.randint(1, 10 ** 6)}',
+                'g-recaptcha-response': 'load-test',
+            },
+            ajax=True,
+        )
+        if response is not None and response.status == 200:
+            self.comments.append((pk, response.json()['id']))
+
+    async def scenario_comment_delete(self):
+        if not self.comments:
+            await self.scenario_comment_create()
+        if not self.comments:
+            return
+        pk, comment_id = self.comments.pop()
+        await self.test.call(
+            'comment_delete', self.session, 'DELETE',
+            reverse('blog:comment_delete', kwargs={'pk': pk, 'id': comment_id}),
+            ajax=True,
+        )
@@ -0,0 +1,216 @@
+import itertools
+import random
+import threading
+import time
+from uuid import uuid4
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from apps.blog.models import Comment, Post
+
+NextgenUser = get_user_model()
+
+NESTED_SET_TABLE = 'bench_comment_nested_set'
+
+
+class Command(BaseCommand):
+    """
+    Команда: сравнение скорости вставки ответов в одну горячую ветку.
+    Материализованный путь - настоящая модель Comment на указанном посте,
+    nested set (как было с MPTT) - эмуляция во временной таблице: вставка
+    сдвигает lft/rght всех узлов правее родителя.
+    Обе ветки заранее заполняются --seed комментариями, затем потоки
+    параллельно добавляют ответы к случайным узлам. Временные пользователь,
+    комментарии и таблица удаляются в конце.
+    """
+
+    help = 'Скорость вставки комментариев: путь против nested set.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('post_id', type=int, help='Пост для комментариев.')
+        parser.add_argument('--seed', type=int, default=2000)
+        parser.add_argument('--inserts', type=int, default=500)
+        parser.add_argument('--threads', type=int, default=4)
+
+    def handle(self, *args, **options):
+        if not Post.objects.filter(pk=options['post_id']).exists():
+            raise CommandError(f'Пост {options["post_id"]} не найден')
+        user = NextgenUser.objects.create(
+            username=f'comment-bench-{uuid4().hex[:8]}',
+            password=make_password(None),
+        )
+        try:
+            self.create_nested_set_table()
+            path_ids = self.seed_path(options['post_id'], user, options['seed'])
+            nested_ids = self.seed_nested_set(options['seed'])
+
+            def insert_path(parent_id):
+                Comment.objects.create(
+                    post_id=options['post_id'],
+                    author=user,
+                    body='benchmark',
+                    parent_id=parent_id,
+                )
+
+            results = (
+                ('materialized path', self.run(
+                    insert_path, path_ids, options)),
+                ('nested set', self.run(
+                    self.insert_nested_set, nested_ids, options)),
+            )
+        finally:
+            with connection.cursor() as cursor:
+                cursor.execute(f'DROP TABLE IF EXISTS {NESTED_SET_TABLE}')
+            user.delete()
+
+        for name, (rate, errors) in results:
+            self.stdout.write(
+                f'{name:>18}: {rate:8.1f} вставок/с, ошибок: {errors}')
+
+    def run(self, insert, parent_ids, options):
+        """Параллельные вставки. Возвращает (вставок в секунду, ошибок)."""
+        threads_count = options['threads']
+        per_thread = max(options['inserts'] // threads_count, 1)
+        barrier = threading.Barrier(threads_count + 1)
+        errors = []
+
+        def worker():
+            try:
+                barrier.wait()
+                for _ in range(per_thread):
+                    try:
+                        insert(random.choice(parent_ids))
+                    except Exception as e:
+                        errors.append(e)
+            finally:
+                connection.close()
+
+        threads = [
+            threading.Thread(target=worker) for _ in range(threads_count)
+        ]
+        for thread in threads:
+            thread.start()
+        barrier.wait()
+        started = time.perf_counter()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+        for error in errors[:3]:
+            self.stderr.write(f'{type(error).__name__}: {error}')
+        done = per_thread * threads_count - len(errors)
+        return done / elapsed, len(errors)
+
+    @transaction.atomic
+    def seed_path(self, post_id, user, count):
+        """Ветка из count комментариев со случайными родителями."""
+        root = Comment.objects.create(
+            post_id=post_id, author=user, body='benchmark')
+        nodes = [root]
+        comments = []
+        for _ in range(count - 1):
+            comment = Comment(
+                post_id=post_id, author=user, body='benchmark', path='-')
+            comment.parent_node = random.choice(nodes)
+            comments.append(comment)
+            nodes.append(comment)
+        # Родитель всегда создан раньше - pk и путь у него уже есть.
+        for batch_start in range(0, len(comments), 500):
+            batch = comments[batch_start:batch_start + 500]
+            Comment.objects.bulk_create(batch)
+            for comment in batch:
+                # Как в Comment.save: глубже предела - в ветку предка.
+                parent_path = comment.parent_node.path[
+                    :Comment.PATH_STEP * Comment.PATH_MAX_DEPTH]
+                comment.parent_id = int(parent_path[-Comment.PATH_STEP:])
+                comment.path = (
+                    parent_path + str(comment.pk).zfill(Comment.PATH_STEP))
+                comment.depth = len(parent_path) // Comment.PATH_STEP
+            Comment.objects.bulk_update(batch, ('parent', 'path', 'depth'))
+        return [node.pk for node in nodes]
+
+    def create_nested_set_table(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DROP TABLE IF EXISTS {NESTED_SET_TABLE}')
+            cursor.execute(
+                f'CREATE TABLE {NESTED_SET_TABLE} ('
+                f'id INTEGER PRIMARY KEY, parent_id INTEGER, '
+                f'tree_id INTEGER NOT NULL, lft INTEGER NOT NULL, '
+                f'rght INTEGER NOT NULL, level INTEGER NOT NULL)'
+            )
+            # Те же индексы, что создает MPTT.
+            cursor.execute(
+                f'CREATE INDEX {NESTED_SET_TABLE}_tree '
+                f'ON {NESTED_SET_TABLE} (tree_id, lft, rght)'
+            )
+
+    def seed_nested_set(self, count):
+        """Та же форма дерева в nested set: lft/rght считаются обходом."""
+        children = {1: []}
+        for pk in range(2, count + 1):
+            parent = random.randint(1, pk - 1)
+            children[parent].append(pk)
+            children[pk] = []
+        rows = []
+        counter = 1
+        stack = [(1, None, 0, False)]
+        bounds = {}
+        while stack:
+            pk, parent, level, done = stack.pop()
+            if done:
+                rows.append((pk, parent, 1, bounds[pk], counter, level))
+                counter += 1
+                continue
+            bounds[pk] = counter
+            counter += 1
+            stack.append((pk, parent, level, True))
+            for child in reversed(children[pk]):
+                stack.append((child, pk, level + 1, False))
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.executemany(
+                f'INSERT INTO {NESTED_SET_TABLE} '
+                f'(id, parent_id, tree_id, lft, rght, level) '
+                f'VALUES (%s, %s, %s, %s, %s, %s)',
+                rows,
+            )
+        self.nested_set_ids = itertools.count(count + 1)
+        return list(children)
+
+    def insert_nested_set(self, parent_id):
+        """
+        Вставка последним ребенком, как MPTT: сдвиг всех узлов правее.
+        Сдвиг задевает строки по всему дереву, поэтому без блокировки
+        дерева (корня) параллельные вставки взаимно блокируются - вставки
+        в одну ветку выполняются строго по очереди.
+        """
+        table = NESTED_SET_TABLE
+        lock = ' FOR UPDATE' if connection.vendor == 'postgresql' else ''
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT id FROM {table} WHERE tree_id = 1 AND lft = 1{lock}')
+            cursor.execute(
+                f'SELECT tree_id, rght, level FROM {table} WHERE id = %s',
+                [parent_id],
+            )
+            tree_id, right, level = cursor.fetchone()
+            cursor.execute(
+                f'UPDATE {table} SET lft = lft + 2 '
+                f'WHERE tree_id = %s AND lft > %s',
+                [tree_id, right],
+            )
+            cursor.execute(
+                f'UPDATE {table} SET rght = rght + 2 '
+                f'WHERE tree_id = %s AND rght >= %s',
+                [tree_id, right],
+            )
+            cursor.execute(
+                f'INSERT INTO {table} '
+                f'(id, parent_id, tree_id, lft, rght, level) '
+                f'VALUES (%s, %s, %s, %s, %s, %s)',
+                [
+                    next(self.nested_set_ids),
+                    parent_id, tree_id, right, right + 1, level + 1,
+                ],
+            )
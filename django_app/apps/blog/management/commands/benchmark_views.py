@@ -0,0 +1,309 @@
+import gc
+import json
+import random
+import statistics
+import time
+import tracemalloc
+from pathlib import Path
+from unittest import mock
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.test.utils import (
+    CaptureQueriesContext,
+    override_settings,
+    setup_test_environment,
+    teardown_test_environment,
+)
+from django.urls import reverse
+from django_recaptcha.fields import ReCaptchaField
+
+from apps.blog.models import Category, Comment, Post
+from apps.blog.post_transfer import PostImporter, read_rows
+from apps.blog.tag_stats import rebuild_tag_stats
+from apps.user_app.models import NextgenUser
+
+AJAX = {'HTTP_X_REQUESTED_WITH': 'XMLHttpRequest'}
+# Разница p95, которая не считается регрессией при любом допуске (с).
+LATENCY_NOISE = 0.002
+
+
+class Command(BaseCommand):
+    """
+    Команда: замер представлений в процессе на тестовой базе (при
+    разработке - SQLite в памяти) с детерминированным набором данных:
+    вложенные категории, посты, теги, голоса и ветки комментариев.
+    Каждое представление вызывается тестовым клиентом; фиксируются
+    кол-во SQL-запросов, p50/p95 времени ответа и пик выделенной памяти
+    (tracemalloc, отдельным проходом). Результат сравнивается с базовой
+    линией в JSON: рост запросов или памяти сверх допуска - ошибка
+    команды. Время зависит от машины, поэтому рост p95 по умолчанию
+    только выводится предупреждением, а ошибкой становится с
+    --check-latency (на той же машине, где снята линия).
+    С --save результат записывается как новая линия.
+    """
+
+    help = 'Замер запросов, времени и памяти представлений.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--posts', type=int, default=200)
+        parser.add_argument('--comments', type=int, default=1000)
+        parser.add_argument('--users', type=int, default=50)
+        parser.add_argument('--tags', type=int, default=30)
+        parser.add_argument('--iterations', type=int, default=30)
+        parser.add_argument('--warmup', type=int, default=3)
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument(
+            '--baseline',
+            default=str(Path(settings.BASE_DIR) / 'benchmarks' / 'baseline.json'),
+        )
+        parser.add_argument(
+            '--save',
+            action='store_true',
+            help='Записать результат как базовую линию.',
+        )
+        parser.add_argument(
+            '--latency-tolerance',
+            type=float,
+            default=0.5,
+            help='Допустимый рост p95 (доля).',
+        )
+        parser.add_argument(
+            '--check-latency',
+            action='store_true',
+            help='Считать рост p95 регрессией, а не предупреждением.',
+        )
+        parser.add_argument(
+            '--memory-tolerance',
+            type=float,
+            default=0.25,
+            help='Допустимый рост пика памяти (доля).',
+        )
+
+    def handle(self, *args, **options):
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(
+            verbosity=0, autoclobber=True, serialize=False)
+        try:
+            with override_settings(DEBUG=False, RATING_WRITE_BEHIND=False), \
+                    mock.patch.object(
+                        ReCaptchaField, 'validate', lambda self, value: None):
+                cache.clear()
+                self.rng = random.Random(options['seed'])
+                self.seed(options)
+                results = self.run_scenarios(options)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+        self.print_results(results)
+        path = Path(options['baseline'])
+        if options['save']:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_text(json.dumps({
+                'vendor': connection.vendor,
+                'dataset': self.dataset(options),
+                'results': results,
+            }, indent=2, ensure_ascii=False) + '\n')
+            self.stdout.write(self.style.SUCCESS(f'Базовая линия: {path}'))
+        elif path.exists():
+            self.compare(json.loads(path.read_text()), results, options)
+
+    def dataset(self, options):
+        return {
+            key: options[key]
+            for key in ('posts', 'comments', 'users', 'tags', 'seed')
+        }
+
+    def seed(self, options):
+        """Детерминированный набор данных."""
+        rng = self.rng
+        categories = []
+        for i in range(3):
+            root = Category.objects.create(title=f'Раздел {i}', slug=f'root-{i}')
+            categories.append(root)
+            for j in range(3):
+                child = Category.objects.create(
+                    title=f'Подраздел {i}.{j}', slug=f'child-{i}-{j}',
+                    parent=root)
+                categories.append(child)
+                for k in range(2):
+                    categories.append(Category.objects.create(
+                        title=f'Тема {i}.{j}.{k}', slug=f'leaf-{i}-{j}-{k}',
+                        parent=child))
+        usernames = [f'user{i}' for i in range(options['users'])]
+        tags = [f'тег{i}' for i in range(options['tags'])]
+        lines = []
+        for i in range(options['posts']):
+            voters = rng.sample(usernames, rng.randint(0, min(10, len(usernames))))
+            lines.append(json.dumps({
+                'title': f'Пост номер {i}',
+                'description': f'<p>Описание поста {i}</p>',
+                'text': '<p>' + ' '.join(
+                    rng.choice(('быстрый', 'запрос', 'индекс', 'кеш', 'шаблон'))
+                    for _ in range(200)) + '</p>',
+                'category': rng.choice(categories).slug,
+                'author': rng.choice(usernames),
+                'fixed': i < 2,
+                'create': f'2024-01-01T00:00:{i % 60:02d}+00:00',
+                'tags': rng.sample(tags, 3),
+                'ratings': [
+                    {'user': name, 'value': rng.choice((1, 1, -1))}
+                    for name in voters
+                ],
+            }, ensure_ascii=False))
+        importer = PostImporter()
+        importer.import_batch(list(read_rows(lines)))
+        rebuild_tag_stats()
+
+        users = list(NextgenUser.objects.order_by('pk'))
+        post_ids = list(Post.objects.order_by('pk').values_list('pk', flat=True))
+        # Половина комментариев - в одном "горячем" посте.
+        self.hot_post = Post.objects.get(pk=post_ids[0])
+        comments = []
+        for i in range(options['comments']):
+            post_id = self.hot_post.pk if i % 2 else rng.choice(post_ids)
+            parents = [c for c in comments[-20:] if c.post_id == post_id]
+            comments.append(Comment.objects.create(
+                post_id=post_id,
+                author=rng.choice(users),
+                body=f'Комментарий {i}',
+                parent=rng.choice(parents) if parents and rng.random() < 0.6
+                else None,
+            ))
+        self.reader = users[0]
+        self.tag_slug = Post.objects.get(pk=post_ids[1]).tags.first().slug
+
+    def scenarios(self):
+        """(имя, метод, url, данные, авторизован ли клиент)."""
+        hot = self.hot_post
+        return (
+            ('post_list', 'get', reverse('blog:home'), None, True),
+            ('post_list_anon_cached', 'get', reverse('blog:home'), None, False),
+            ('post_detail', 'get', hot.get_absolute_url(), None, True),
+            ('category_list', 'get',
+             reverse('blog:category', kwargs={'slug': 'root-0'}), None, True),
+            ('posts_by_tag', 'get',
+             reverse('blog:posts_by_tag', kwargs={'tag': self.tag_slug}),
+             None, True),
+            ('user_profile', 'get',
+             reverse('user_app:profile_detail',
+                     kwargs={'username': hot.author.username}),
+             None, True),
+            ('rating_create', 'post', reverse('blog:rating'),
+             {'pk': hot.pk, 'value': 1}, True),
+            ('comment_create', 'post',
+             reverse('blog:comment_create', kwargs={'pk': hot.pk}),
+             {'body': 'Новый комментарий'}, True),
+        )
+
+    def run_scenarios(self, options):
+        results = {}
+        for name, method, url, data, authorized in self.scenarios():
+            client = Client()
+            if authorized:
+                client.force_login(self.reader)
+            cache.clear()
+
+            def request():
+                response = getattr(client, method)(url, data, **AJAX) \
+                    if method == 'post' else client.get(url)
+                if response.status_code != 200:
+                    raise CommandError(
+                        f'{name}: {url} вернул {response.status_code}')
+
+            for _ in range(options['warmup']):
+                request()
+            timings = []
+            queries = []
+            for _ in range(options['iterations']):
+                with CaptureQueriesContext(connection) as context:
+                    started = time.perf_counter()
+                    request()
+                    timings.append(time.perf_counter() - started)
+                queries.append(len(context.captured_queries))
+            results[name] = {
+                'queries': max(queries),
+                'p50_ms': round(self.percentile(timings, 50) * 1000, 2),
+                'p95_ms': round(self.percentile(timings, 95) * 1000, 2),
+                'peak_kb': self.peak_memory(request),
+            }
+        return results
+
+    @staticmethod
+    def percentile(values, percent):
+        return statistics.quantiles(values, n=100, method='inclusive')[
+            percent - 1]
+
+    @staticmethod
+    def peak_memory(request, repeat=5):
+        """
+        Медиана пика памяти, выделенной за запрос (КБ). Перед замером -
+        холостой запрос (ленивые кеши модулей) и сборка мусора, иначе
+        в пик попадает то, что осталось от предыдущих сценариев.
+        """
+        peaks = []
+        request()
+        gc.collect()
+        tracemalloc.start()
+        try:
+            for _ in range(repeat):
+                tracemalloc.reset_peak()
+                current = tracemalloc.get_traced_memory()[0]
+                request()
+                peaks.append(tracemalloc.get_traced_memory()[1] - current)
+        finally:
+            tracemalloc.stop()
+        return round(statistics.median(peaks) / 1024, 1)
+
+    def print_results(self, results):
+        self.stdout.write(
+            f'{"представление":<24}{"запросов":>9}{"p50, мс":>10}'
+            f'{"p95, мс":>10}{"пик, КБ":>10}')
+        for name, result in results.items():
+            self.stdout.write(
+                f'{name:<24}{result["queries"]:>9}{result["p50_ms"]:>10}'
+                f'{result["p95_ms"]:>10}{result["peak_kb"]:>10}')
+
+    def compare(self, baseline, results, options):
+        if baseline.get('vendor') != connection.vendor:
+            raise CommandError(
+                f'Базовая линия снята на {baseline.get("vendor")}, '
+                f'а не на {connection.vendor}')
+        if baseline.get('dataset') != self.dataset(options):
+            raise CommandError(
+                'Набор данных отличается от базовой линии: '
+                f'{baseline.get("dataset")}')
+        regressions = []
+        slow = []
+        for name, base in baseline['results'].items():
+            result = results.get(name)
+            if result is None:
+                regressions.append(f'{name}: сценарий пропал')
+                continue
+            if result['queries'] > base['queries']:
+                regressions.append(
+                    f'{name}: запросов {base["queries"]} -> {result["queries"]}')
+            limit = base['p95_ms'] * (1 + options['latency_tolerance'])
+            if result['p95_ms'] > max(limit, base['p95_ms'] + LATENCY_NOISE * 1000):
+                slow.append(
+                    f'{name}: p95 {base["p95_ms"]} -> {result["p95_ms"]} мс')
+            limit = base['peak_kb'] * (1 + options['memory_tolerance'])
+            if result['peak_kb'] > limit:
+                regressions.append(
+                    f'{name}: память {base["peak_kb"]} -> {result["peak_kb"]} КБ')
+        if options['check_latency']:
+            regressions.extend(slow)
+        elif slow:
+            self.stdout.write(self.style.WARNING(
+                'Время ответа выросло (не ошибка без --check-latency):\n'
+                + '\n'.join(slow)))
+        if regressions:
+            raise CommandError(
+                'Регрессии относительно базовой линии:\n'
+                + '\n'.join(regressions))
+        self.stdout.write(self.style.SUCCESS(
+            'Регрессий относительно базовой линии нет'))
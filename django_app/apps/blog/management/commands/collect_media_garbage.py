@@ -0,0 +1,52 @@
+from django.core.management.base import BaseCommand
+
+from apps.blog.media_gc import QUARANTINE_DIR, collect_media_garbage
+from apps.services import constants
+
+
+class Command(BaseCommand):
+    """
+    Команда: поиск медиафайлов, на которые нет ссылок (замененные и
+    оставшиеся от удаленных постов изображения, неиспользуемые загрузки
+    ckeditor). По умолчанию файлы переносятся в карантин MEDIA_ROOT/.quarantine.
+    """
+
+    help = 'Сборка неиспользуемых медиафайлов.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Только отчет: какие файлы и сколько байт освободится.',
+        )
+        parser.add_argument(
+            '--delete',
+            action='store_true',
+            help='Удалять файлы вместо переноса в карантин.',
+        )
+        parser.add_argument(
+            '--min-age',
+            type=float,
+            default=constants.MEDIA_GC_MIN_AGE_HOURS,
+            help='Минимальный возраст файла в часах.',
+        )
+
+    def handle(self, *args, **options):
+        def report(name, size):
+            if options['verbosity'] > 1:
+                self.stdout.write(f'{size:>12} {name}')
+
+        count, size = collect_media_garbage(
+            min_age=options['min_age'] * 60 * 60,
+            dry_run=options['dry_run'],
+            delete=options['delete'],
+            callback=report,
+        )
+        if options['dry_run']:
+            action = 'можно освободить'
+        elif options['delete']:
+            action = 'удалено'
+        else:
+            action = f'перенесено в {QUARANTINE_DIR}'
+        self.stdout.write(self.style.SUCCESS(
+            f'Файлов: {count}, {size / 1024 / 1024:.2f} МБ {action}'))
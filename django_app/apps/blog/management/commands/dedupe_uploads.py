@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+
+from apps.blog.uploads import dedupe_legacy_uploads
+
+
+class Command(BaseCommand):
+    """
+    Команда: перенос загрузок ckeditor, сохраненных до хранилища по
+    содержимому, в uploads/blobs/ без дублей с заменой ссылок в постах.
+    """
+
+    help = 'Дедупликация старых загрузок ckeditor.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Только посчитать дубли, ничего не менять.',
+        )
+        parser.add_argument(
+            '--keep',
+            action='store_true',
+            help='Не удалять старые файлы после переноса.',
+        )
+
+    def handle(self, *args, **options):
+        files, unique, freed, posts = dedupe_legacy_uploads(
+            dry_run=options['dry_run'], keep=options['keep'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Файлов: {files}, уникальных: {unique}, '
+            f'освобождается: {freed / 1024 / 1024:.1f} МБ, '
+            f'изменено постов: {posts}'))
@@ -0,0 +1,43 @@
+import json
+import sys
+import time
+
+from django.core.management.base import BaseCommand
+from django.core.serializers.json import DjangoJSONEncoder
+
+from apps.blog.post_transfer import export_rows
+
+
+class Command(BaseCommand):
+    """
+    Команда: выгрузка постов с тегами и голосами в JSONL (пост на строку).
+    Файл читает import_posts.
+    """
+
+    help = 'Выгрузка постов в JSONL.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path', help='Файл для выгрузки, "-" - стандартный вывод.')
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        count = 0
+        stream = (
+            sys.stdout if options['path'] == '-'
+            else open(options['path'], 'w', encoding='utf-8')
+        )
+        try:
+            for row in export_rows(batch_size=options['batch_size']):
+                stream.write(json.dumps(
+                    row, ensure_ascii=False, cls=DjangoJSONEncoder))
+                stream.write('\n')
+                count += 1
+        finally:
+            if stream is not sys.stdout:
+                stream.close()
+        elapsed = time.perf_counter() - started
+        self.stderr.write(self.style.SUCCESS(
+            f'Выгружено постов: {count} за {elapsed:.1f} с '
+            f'({count / elapsed:.0f} строк/с)'))
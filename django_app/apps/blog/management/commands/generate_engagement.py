@@ -0,0 +1,59 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.blog.engagement import EVENTS, EngagementError, EngagementGenerator
+
+
+class Command(BaseCommand):
+    """
+    Команда: синтетические данные и нагрузка. Создает пачкой
+    пользователей, затем генерирует ровно заданное кол-во постов,
+    комментариев и голосов вперемешку с ограничением скорости.
+    Пример для локального набора данных продакшен-масштаба:
+    generate_engagement --users 10000 --posts 5000 --comments 50000
+    --ratings 200000
+    """
+
+    help = 'Генерация пользователей, постов, комментариев и голосов.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=0,
+                            help='Сколько пользователей создать.')
+        parser.add_argument('--posts', type=int, default=0)
+        parser.add_argument('--comments', type=int, default=0)
+        parser.add_argument('--ratings', type=int, default=0)
+        parser.add_argument('--rate', type=float, default=0,
+                            help='Событий в секунду, 0 - без ограничения.')
+        parser.add_argument('--password', default=None,
+                            help='Общий пароль пользователей (по умолчанию '
+                                 'вход невозможен).')
+        parser.add_argument('--seed', type=int, default=None)
+
+    def handle(self, *args, **options):
+        generator = EngagementGenerator(
+            seed=options['seed'], password=options['password'])
+        started = time.perf_counter()
+        if options['users']:
+            generator.create_users(options['users'])
+            self.report('Пользователей', options['users'], started)
+        counts = {event: options[event] for event in EVENTS}
+        if not any(counts.values()):
+            return
+        started = time.perf_counter()
+        try:
+            counts = generator.run(counts, rate=options['rate'])
+        except EngagementError as e:
+            raise CommandError(str(e))
+        self.report(
+            ', '.join(f'{event}: {count}' for event, count in counts.items())
+            + '. Событий',
+            sum(counts.values()),
+            started,
+        )
+
+    def report(self, label, count, started):
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'{label}: {count} за {elapsed:.1f} с '
+            f'({count / elapsed:.0f} в секунду)'))
@@ -0,0 +1,58 @@
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.blog.post_transfer import PostImporter, PostImportError, read_rows
+from apps.blog.tag_stats import refresh_tag_stats
+from apps.services import page_cache
+
+
+class Command(BaseCommand):
+    """
+    Команда: массовая загрузка постов из JSONL (формат export_posts).
+    Каждая пачка записывается в своей транзакции. Slug занятые в базе
+    получают номер, теги и пользователи создаются при необходимости.
+    """
+
+    help = 'Загрузка постов из JSONL.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path', help='Файл для загрузки, "-" - стандартный ввод.')
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        importer = PostImporter()
+        started = time.perf_counter()
+        count = 0
+        stream = (
+            sys.stdin if options['path'] == '-'
+            else open(options['path'], encoding='utf-8')
+        )
+        try:
+            batch = []
+            for line in read_rows(stream):
+                batch.append(line)
+                if len(batch) >= options['batch_size']:
+                    count += importer.import_batch(batch)
+                    batch = []
+                    self.report(count, started)
+            if batch:
+                count += importer.import_batch(batch)
+        except PostImportError as e:
+            raise CommandError(f'{e}. Загружено постов: {count}')
+        finally:
+            if stream is not sys.stdin:
+                stream.close()
+        tag_ids = sorted(importer.tag_ids)
+        for start in range(0, len(tag_ids), options['batch_size']):
+            refresh_tag_stats(tag_ids[start:start + options['batch_size']])
+        page_cache.invalidate(page_cache.SITE_SCOPE)
+        self.report(count, started, style=self.style.SUCCESS)
+
+    def report(self, count, started, style=str):
+        elapsed = time.perf_counter() - started
+        self.stdout.write(style(
+            f'Загружено постов: {count} за {elapsed:.1f} с '
+            f'({count / elapsed:.0f} строк/с)'))
@@ -0,0 +1,92 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.blog.load_test import (
+    SCENARIOS,
+    LoadTest,
+    ensure_load_users,
+    target_posts,
+)
+
+
+class Command(BaseCommand):
+    """
+    Команда: нагрузочный тест работающего сайта по HTTP (только asyncio
+    стандартной библиотеки). Пользователи loadtest-* и список постов
+    берутся из базы, поэтому команда запускается рядом с ней, например
+    для docker-compose.prod.yml:
+    docker compose exec blog_backend python django_app/manage.py load_test
+    --url http://nginx --concurrency 50 --duration 60
+    Веса сценариев задаются как у generate_engagement: --home 6 --rating 2.
+    Комментарии требуют тестовых ключей reCAPTCHA на сервере.
+    """
+
+    help = 'Нагрузочный тест сайта по HTTP.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', default='http://localhost:8000')
+        parser.add_argument('--concurrency', type=int, default=10,
+                            help='Виртуальных пользователей.')
+        parser.add_argument('--duration', type=float, default=30,
+                            help='Длительность, с.')
+        parser.add_argument('--users', type=int, default=10,
+                            help='Пользователей loadtest-* для входа.')
+        parser.add_argument('--password', default='loadtest-password')
+        parser.add_argument('--posts', type=int, default=100,
+                            help='Сколько последних постов открывать.')
+        parser.add_argument('--home-pages', type=int, default=3,
+                            help='Страниц ленты за сценарий home.')
+        parser.add_argument('--timeout', type=float, default=10)
+        parser.add_argument('--seed', type=int, default=None)
+        parser.add_argument('--json', default=None,
+                            help='Файл для результата в JSON.')
+        defaults = {'home': 6, 'post_detail': 3, 'rating': 2,
+                    'comment_create': 1, 'comment_delete': 1}
+        for scenario in SCENARIOS:
+            parser.add_argument(
+                '--' + scenario.replace('_', '-'), type=int,
+                default=defaults[scenario], help='Вес сценария.')
+
+    def handle(self, *args, **options):
+        posts = target_posts(options['posts'])
+        if not posts:
+            raise CommandError('Нет опубликованных постов')
+        test = LoadTest(
+            base_url=options['url'],
+            posts=posts,
+            users=ensure_load_users(
+                max(options['users'], 1), options['password']),
+            password=options['password'],
+            weights={scenario: options[scenario] for scenario in SCENARIOS},
+            concurrency=options['concurrency'],
+            duration=options['duration'],
+            home_pages=options['home_pages'],
+            timeout=options['timeout'],
+            seed=options['seed'],
+        )
+        results = test.run()
+        self.stdout.write(
+            f'{"эндпоинт":<16}{"запросов":>9}{"в сек.":>8}{"ошибок":>8}'
+            f'{"p50":>8}{"p95":>8}{"p99":>8}{"max":>9}  статусы')
+        for name, result in results.items():
+            self.stdout.write(
+                f'{name:<16}{result["requests"]:>9}{result["rps"]:>8}'
+                f'{result["error_rate"]:>8.1%}{result["p50_ms"]:>8}'
+                f'{result["p95_ms"]:>8}{result["p99_ms"]:>8}'
+                f'{result["max_ms"]:>9}  {result["statuses"]}')
+        if options['verbosity'] > 1:
+            for name, result in results.items():
+                self.stdout.write(f'{name}, мс: {result["histogram_ms"]}')
+        total = sum(result['requests'] for result in results.values())
+        self.stdout.write(self.style.SUCCESS(
+            f'Запросов: {total} за {test.elapsed:.1f} с '
+            f'({total / test.elapsed:.0f} в секунду)'))
+        if options['json']:
+            with open(options['json'], 'w', encoding='utf-8') as output:
+                json.dump({
+                    'url': options['url'],
+                    'concurrency': options['concurrency'],
+                    'elapsed': round(test.elapsed, 1),
+                    'results': results,
+                }, output, indent=2, ensure_ascii=False)
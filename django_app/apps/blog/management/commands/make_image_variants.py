@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand
+
+from apps.blog.models import Post
+from apps.blog.tasks import make_avatar_variants, make_post_thumbnail_variants
+from apps.services.images import needs_variants
+from apps.user_app.models import UserProfile
+
+
+class Command(BaseCommand):
+    """
+    Команда: постановка в очередь уменьшения изображений постов и
+    аватаров, у которых еще нет вариантов (загруженных до появления
+    конвейера или при недоступном брокере).
+    """
+
+    help = 'Создание уменьшенных копий изображений постов и аватаров.'
+
+    def handle(self, *args, **options):
+        sources = (
+            (Post, 'thumbnail', make_post_thumbnail_variants),
+            (UserProfile, 'avatar', make_avatar_variants),
+        )
+        for model, field_name, task in sources:
+            queued = 0
+            instances = model.objects.only(
+                field_name, f'{field_name}_variants').order_by('pk')
+            for instance in instances.iterator():
+                if needs_variants(
+                    getattr(instance, field_name),
+                    getattr(instance, f'{field_name}_variants'),
+                ):
+                    task.delay(instance.pk)
+                    queued += 1
+            self.stdout.write(self.style.SUCCESS(
+                f'{model._meta.verbose_name_plural}: в очереди {queued}'))
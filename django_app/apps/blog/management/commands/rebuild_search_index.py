@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from apps.blog.search import rebuild_index
+
+
+class Command(BaseCommand):
+    """
+    Команда: полная переиндексация постов для поиска.
+    Нужна после массовых изменений в обход Post.save (импорт, update()).
+    """
+
+    help = 'Переиндексация постов для полнотекстового поиска.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        count = rebuild_index(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Проиндексировано постов: {count}'))
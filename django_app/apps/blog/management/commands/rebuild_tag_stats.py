@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from apps.blog.tag_stats import rebuild_tag_stats
+
+
+class Command(BaseCommand):
+    """
+    Команда: полный пересчет статистики тегов и облака тегов.
+    Нужна после массовых изменений в обход сигналов (импорт, update()).
+    """
+
+    help = 'Пересчет статистики тегов.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        count = rebuild_tag_stats(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Пересчитано тегов: {count}'))
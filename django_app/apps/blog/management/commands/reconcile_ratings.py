@@ -0,0 +1,84 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, Q, Sum
+
+from apps.blog.models import Post, PostRating
+
+
+class Command(BaseCommand):
+    """
+    Команда: сверка счетчиков рейтинга постов с таблицей голосов.
+    Посты обходятся пачками по pk, расходящиеся счетчики перезаписываются.
+    """
+
+    help = 'Пересчитывает rating_sum, likes_count и dislikes_count постов.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Кол-во постов в одной пачке.',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Только показать расхождения, ничего не записывая.',
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        dry_run = options['dry_run']
+        checked = fixed = 0
+        last_pk = 0
+        while True:
+            posts = list(
+                Post.objects.filter(pk__gt=last_pk).order_by('pk').only(
+                    'pk', *Post.RATING_FIELDS)[:batch_size]
+            )
+            if not posts:
+                break
+            last_pk = posts[-1].pk
+            checked += len(posts)
+            stale = self.find_stale(posts)
+            fixed += len(stale)
+            for post in stale:
+                self.stdout.write(
+                    f'Пост {post.pk}: верный рейтинг {post.rating_sum}, '
+                    f'лайки {post.likes_count}, '
+                    f'дизлайки {post.dislikes_count}'
+                )
+            if stale and not dry_run:
+                with transaction.atomic():
+                    Post.objects.bulk_update(stale, Post.RATING_FIELDS)
+        action = 'Найдено расхождений' if dry_run else 'Исправлено'
+        self.stdout.write(self.style.SUCCESS(
+            f'Проверено постов: {checked}. {action}: {fixed}.'
+        ))
+
+    def find_stale(self, posts):
+        """Посты пачки с неверными счетчиками (уже с верными значениями)."""
+        totals = {
+            row['post_id']: row for row in PostRating.objects.filter(
+                post_id__in=[post.pk for post in posts],
+            ).values('post_id').annotate(
+                total=Sum('value'),
+                likes=Count('id', filter=Q(value=1)),
+                dislikes=Count('id', filter=Q(value=-1)),
+            ).order_by()
+        }
+        stale = []
+        for post in posts:
+            row = totals.get(post.pk, {})
+            actual = (
+                row.get('total', 0),
+                row.get('likes', 0),
+                row.get('dislikes', 0),
+            )
+            stored = tuple(getattr(post, name) for name in Post.RATING_FIELDS)
+            if actual != stored:
+                (post.rating_sum,
+                 post.likes_count,
+                 post.dislikes_count) = actual
+                stale.append(post)
+        return stale
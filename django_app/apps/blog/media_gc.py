@@ -0,0 +1,169 @@
+import os
+import shutil
+import sqlite3
+import tempfile
+import time
+
+from django.conf import settings
+from django.utils import timezone
+
+from apps.user_app.models import UserProfile
+from .models import Post, UploadBlob
+from .uploads import UPLOAD_URL_RE, media_name
+
+# Каталог карантина внутри MEDIA_ROOT (сам сборщиком не обходится).
+QUARANTINE_DIR = '.quarantine'
+BATCH_SIZE = 1000
+
+
+class ReferenceSet:
+    """
+    Множество используемых файлов во временной SQLite-базе на диске:
+    память не растет с кол-вом файлов.
+    """
+
+    def __init__(self):
+        descriptor, self.path = tempfile.mkstemp(suffix='.sqlite3')
+        os.close(descriptor)
+        self.db = sqlite3.connect(self.path)
+        self.db.execute('CREATE TABLE refs (name TEXT PRIMARY KEY)')
+
+    def add(self, names):
+        batch = []
+        for name in names:
+            if name:
+                batch.append((name,))
+            if len(batch) >= BATCH_SIZE:
+                self._insert(batch)
+                batch = []
+        self._insert(batch)
+
+    def _insert(self, batch):
+        self.db.executemany('INSERT OR IGNORE INTO refs VALUES (?)', batch)
+
+    def missing(self, names):
+        """Имена из пачки, которых нет в множестве."""
+        placeholders = ', '.join('?' * len(names))
+        found = {row[0] for row in self.db.execute(
+            f'SELECT name FROM refs WHERE name IN ({placeholders})', names)}
+        return [name for name in names if name not in found]
+
+    def close(self):
+        self.db.close()
+        os.remove(self.path)
+
+
+def _variant_names(variants_rows):
+    for variants in variants_rows:
+        for key, value in (variants or {}).items():
+            if key != 'source':
+                yield from (name for _, name in value)
+
+
+def referenced_names():
+    """
+    Все используемые файлы MEDIA_ROOT: изображения постов и аватары
+    с вариантами, загрузки ckeditor из индекса и ссылки в текстах постов.
+    """
+    for field in (Post._meta.get_field('thumbnail'),
+                  UserProfile._meta.get_field('avatar')):
+        yield field.default
+    yield from Post.objects.values_list('thumbnail', flat=True).iterator()
+    yield from _variant_names(Post.objects.values_list(
+        'thumbnail_variants', flat=True).iterator())
+    yield from UserProfile.objects.values_list(
+        'avatar', flat=True).iterator()
+    yield from _variant_names(UserProfile.objects.values_list(
+        'avatar_variants', flat=True).iterator())
+    yield from UploadBlob.objects.filter(posts__isnull=False).values_list(
+        'file', flat=True).distinct().iterator()
+    # Старые (не переложенные dedupe_uploads) ссылки из текстов постов.
+    for description, text in Post.objects.values_list(
+            'description', 'text').iterator():
+        for field in (description, text):
+            for match in UPLOAD_URL_RE.findall(field or ''):
+                yield media_name(match)
+
+
+def media_files(root):
+    """Обход MEDIA_ROOT: (имя относительно корня, размер, mtime)."""
+    stack = [root]
+    while stack:
+        directory = stack.pop()
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    if entry.name != QUARANTINE_DIR:
+                        stack.append(entry.path)
+                elif entry.is_file(follow_symlinks=False):
+                    stat = entry.stat(follow_symlinks=False)
+                    name = os.path.relpath(entry.path, root).replace(
+                        os.sep, '/')
+                    yield name, stat.st_size, stat.st_mtime
+
+
+def orphaned_files(references, min_age):
+    """Неиспользуемые файлы старше min_age секунд: (имя, размер)."""
+    root = str(settings.MEDIA_ROOT)
+    threshold = time.time() - min_age
+    batch = {}
+    for name, size, mtime in media_files(root):
+        # Свежие файлы могут быть еще не сохранены в БД
+        # (загрузка в редакторе, задача вариантов).
+        if mtime > threshold:
+            continue
+        batch[name] = size
+        if len(batch) >= BATCH_SIZE:
+            yield from _orphans(references, batch)
+            batch = {}
+    if batch:
+        yield from _orphans(references, batch)
+
+
+def _orphans(references, batch):
+    for name in references.missing(list(batch)):
+        yield name, batch[name]
+
+
+def collect_media_garbage(min_age, dry_run=False, delete=False,
+                          callback=None):
+    """
+    Сборка неиспользуемых файлов MEDIA_ROOT. По умолчанию файлы
+    переносятся в карантин (MEDIA_ROOT/.quarantine/<дата>/...), с delete -
+    удаляются, с dry_run - только считаются. callback(имя, размер)
+    вызывается для каждого найденного файла.
+    Возвращает (кол-во файлов, байт).
+    """
+    root = str(settings.MEDIA_ROOT)
+    if not os.path.isdir(root):
+        return 0, 0
+    quarantine = os.path.join(
+        root, QUARANTINE_DIR, timezone.now().strftime('%Y-%m-%d-%H%M%S'))
+    references = ReferenceSet()
+    count = size_total = 0
+    blobs = []
+    try:
+        references.add(referenced_names())
+        for name, size in orphaned_files(references, min_age):
+            count += 1
+            size_total += size
+            if callback is not None:
+                callback(name, size)
+            if dry_run:
+                continue
+            path = os.path.join(root, name)
+            if delete:
+                os.remove(path)
+            else:
+                target = os.path.join(quarantine, name)
+                os.makedirs(os.path.dirname(target), exist_ok=True)
+                shutil.move(path, target)
+            if name.startswith(settings.UPLOAD_BLOBS_PATH):
+                blobs.append(name)
+            if len(blobs) >= BATCH_SIZE:
+                UploadBlob.objects.filter(file__in=blobs).delete()
+                blobs = []
+    finally:
+        references.close()
+    UploadBlob.objects.filter(file__in=blobs).delete()
+    return count, size_total
@@ -0,0 +1,47 @@
+# Generated by Django 5.0.4 on 2026-10-18 18:13
+
+from django.db import migrations, models
+from django.db.models import Count, Q, Sum
+
+
+def fill_rating_counters(apps, schema_editor):
+    """Заполнение счетчиков рейтинга по существующим голосам."""
+    Post = apps.get_model('blog', 'Post')
+    PostRating = apps.get_model('blog', 'PostRating')
+    totals = PostRating.objects.values('post_id').annotate(
+        total=Sum('value'),
+        likes=Count('id', filter=Q(value=1)),
+        dislikes=Count('id', filter=Q(value=-1)),
+    ).order_by()
+    for row in totals.iterator():
+        Post.objects.filter(pk=row['post_id']).update(
+            rating_sum=row['total'],
+            likes_count=row['likes'],
+            dislikes_count=row['dislikes'],
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0019_post_feed_keyset_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='dislikes_count',
+            field=models.PositiveIntegerField(default=0, verbose_name='Дизлайки'),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='likes_count',
+            field=models.PositiveIntegerField(default=0, verbose_name='Лайки'),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='rating_sum',
+            field=models.IntegerField(default=0, verbose_name='Рейтинг'),
+        ),
+        migrations.RunPython(fill_rating_counters, migrations.RunPython.noop),
+    ]
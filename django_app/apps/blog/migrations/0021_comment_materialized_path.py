@@ -0,0 +1,139 @@
+# Generated by Django 5.0.4 on 2026-10-18 19:02
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+# Должны совпадать с Comment.PATH_STEP и Comment.PATH_MAX_DEPTH.
+PATH_STEP = 10
+PATH_MAX_DEPTH = 24
+BATCH_SIZE = 1000
+
+
+def fill_paths(apps, schema_editor):
+    """
+    Перевод дерева комментариев из MPTT в материализованный путь.
+    Родители обрабатываются раньше ответов (по level), ответы глубже
+    PATH_MAX_DEPTH переносятся в ветку предка с максимальной глубины.
+    """
+    Comment = apps.get_model('blog', 'Comment')
+    paths = {}
+    batch = []
+    rows = Comment.objects.order_by('level', 'id').values_list(
+        'id', 'parent_id', 'post_id')
+    for pk, parent_id, post_id in rows.iterator():
+        parent_path = ''
+        parent = paths.get(parent_id)
+        if parent is not None and parent[0] == post_id:
+            parent_path = parent[1][:PATH_STEP * PATH_MAX_DEPTH]
+        path = parent_path + str(pk).zfill(PATH_STEP)
+        paths[pk] = (post_id, path)
+        batch.append(Comment(
+            pk=pk,
+            path=path,
+            depth=len(parent_path) // PATH_STEP,
+            parent_id=int(parent_path[-PATH_STEP:]) if parent_path else None,
+        ))
+        if len(batch) >= BATCH_SIZE:
+            Comment.objects.bulk_update(batch, ('path', 'depth', 'parent'))
+            batch = []
+    Comment.objects.bulk_update(batch, ('path', 'depth', 'parent'))
+
+
+def fill_mptt(apps, schema_editor):
+    """Обратный перевод: сортировка по пути - это обход дерева в глубину."""
+    Comment = apps.get_model('blog', 'Comment')
+    batch = []
+    stack = []
+    tree_id = counter = 0
+    rows = Comment.objects.order_by('path').values_list('id', 'path', 'depth')
+    for pk, path, depth in rows.iterator():
+        while stack and not path.startswith(stack[-1].path):
+            node = stack.pop()
+            node.rght = counter
+            counter += 1
+            batch.append(node)
+        if not stack:
+            tree_id += 1
+            counter = 1
+        node = Comment(
+            pk=pk, path=path, tree_id=tree_id, level=depth, lft=counter)
+        counter += 1
+        stack.append(node)
+        if len(batch) >= BATCH_SIZE:
+            Comment.objects.bulk_update(
+                batch, ('lft', 'rght', 'tree_id', 'level'))
+            batch = []
+    while stack:
+        node = stack.pop()
+        node.rght = counter
+        counter += 1
+        batch.append(node)
+    Comment.objects.bulk_update(batch, ('lft', 'rght', 'tree_id', 'level'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0020_post_rating_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='comment',
+            name='depth',
+            field=models.PositiveSmallIntegerField(default=0, editable=False, verbose_name='Глубина'),
+        ),
+        migrations.AddField(
+            model_name='comment',
+            name='path',
+            field=models.CharField(default='', editable=False, max_length=250, verbose_name='Путь в дереве'),
+            preserve_default=False,
+        ),
+        migrations.AlterField(
+            model_name='comment',
+            name='parent',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='children', to='blog.comment', verbose_name='Родительский комментарий'),
+        ),
+        migrations.RunPython(fill_paths, fill_mptt),
+        # Значения по умолчанию нужны только для отката миграции.
+        migrations.AlterField(
+            model_name='comment',
+            name='level',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AlterField(
+            model_name='comment',
+            name='lft',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AlterField(
+            model_name='comment',
+            name='rght',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AlterField(
+            model_name='comment',
+            name='tree_id',
+            field=models.PositiveIntegerField(db_index=True, default=0, editable=False),
+        ),
+        migrations.RemoveField(
+            model_name='comment',
+            name='level',
+        ),
+        migrations.RemoveField(
+            model_name='comment',
+            name='lft',
+        ),
+        migrations.RemoveField(
+            model_name='comment',
+            name='rght',
+        ),
+        migrations.RemoveField(
+            model_name='comment',
+            name='tree_id',
+        ),
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['post', 'path'], name='blog_comment_path_idx'),
+        ),
+    ]
@@ -0,0 +1,71 @@
+# Generated by Django 5.0.4 on 2026-10-18 19:40
+
+import django.contrib.postgres.search
+from django.db import migrations
+
+FTS_TABLE = 'blog_post_fts'
+
+
+def create_search_index(apps, schema_editor):
+    """
+    PostgreSQL: GIN-индекс по search_vector и заполнение векторов.
+    SQLite: теневая FTS5-таблица с текстом опубликованных постов.
+    """
+    connection = schema_editor.connection
+    if connection.vendor == 'postgresql':
+        schema_editor.execute(
+            'CREATE INDEX blog_post_search_idx ON blog_post '
+            'USING gin (search_vector)'
+        )
+        schema_editor.execute(
+            "UPDATE blog_post SET search_vector = "
+            "setweight(to_tsvector('russian', coalesce(title, '')), 'A') || "
+            "setweight(to_tsvector('russian', coalesce(description, '')), 'B') || "
+            "setweight(to_tsvector('russian', coalesce(text, '')), 'C')"
+        )
+        return
+    import html
+
+    from django.utils.html import strip_tags
+
+    schema_editor.execute(
+        f'CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5('
+        f"title, description, text, tokenize = 'unicode61')"
+    )
+    Post = apps.get_model('blog', 'Post')
+    rows = [
+        (pk, title, html.unescape(strip_tags(description)),
+         html.unescape(strip_tags(text)))
+        for pk, title, description, text in Post.objects.filter(
+            status='published',
+        ).values_list('pk', 'title', 'description', 'text').iterator()
+    ]
+    with connection.cursor() as cursor:
+        cursor.executemany(
+            f'INSERT INTO {FTS_TABLE} (rowid, title, description, text) '
+            f'VALUES (%s, %s, %s, %s)',
+            rows,
+        )
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute('DROP INDEX IF EXISTS blog_post_search_idx')
+    else:
+        schema_editor.execute(f'DROP TABLE IF EXISTS {FTS_TABLE}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0021_comment_materialized_path'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
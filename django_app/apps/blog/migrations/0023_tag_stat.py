@@ -0,0 +1,68 @@
+# Generated by Django 5.0.4 on 2026-10-18 18:55
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+# Должно совпадать с constants.TAG_RECENT_POSTS_COUNT.
+TAG_RECENT_POSTS_COUNT = 200
+
+
+def fill_tag_stats(apps, schema_editor):
+    """Начальная статистика тегов (как apps.blog.tag_stats.rebuild_tag_stats)."""
+    ContentType = apps.get_model('contenttypes', 'ContentType')
+    Post = apps.get_model('blog', 'Post')
+    TaggedItem = apps.get_model('taggit', 'TaggedItem')
+    TagStat = apps.get_model('blog', 'TagStat')
+    content_type = ContentType.objects.filter(
+        app_label='blog', model='post').first()
+    if content_type is None:
+        return
+    published = Post.objects.filter(status='published')
+    recent = {}
+    rows = TaggedItem.objects.filter(
+        content_type=content_type,
+        object_id__in=published.values('pk'),
+    ).values_list('tag_id', 'object_id')
+    order = {
+        pk: index for index, pk in enumerate(published.order_by(
+            '-fixed', '-create', 'id').values_list('pk', flat=True))
+    }
+    counts = {}
+    for tag_id, post_id in rows.iterator():
+        counts[tag_id] = counts.get(tag_id, 0) + 1
+        recent.setdefault(tag_id, []).append(post_id)
+    TagStat.objects.bulk_create(
+        TagStat(
+            tag_id=tag_id,
+            post_count=count,
+            recent_post_ids=sorted(recent[tag_id], key=order.__getitem__)[
+                :TAG_RECENT_POSTS_COUNT],
+        )
+        for tag_id, count in counts.items()
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0022_post_search'),
+        ('contenttypes', '0002_remove_content_type_name'),
+        ('taggit', '0006_rename_taggeditem_content_type_object_id_taggit_tagg_content_8fc721_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TagStat',
+            fields=[
+                ('tag', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stat', serialize=False, to='taggit.tag', verbose_name='Тег')),
+                ('post_count', models.PositiveIntegerField(default=0, verbose_name='Опубликованных постов')),
+                ('recent_post_ids', models.JSONField(default=list, verbose_name='Последние посты')),
+            ],
+            options={
+                'verbose_name': 'Статистика тега',
+                'verbose_name_plural': 'Статистика тегов',
+                'indexes': [models.Index(fields=['-post_count'], name='blog_tagsta_post_co_0620eb_idx')],
+            },
+        ),
+        migrations.RunPython(fill_tag_stats, migrations.RunPython.noop),
+    ]
@@ -1,14 +1,16 @@
-from django.db import models
+from django.contrib.postgres.search import SearchVectorField
+from django.db import models, transaction
+from django.db.models import F, Q
 from django.urls import reverse
 from django.core.validators import FileExtensionValidator
 from django.contrib.auth import get_user_model
 from taggit.managers import TaggableManager
+from taggit.models import Tag
 from ckeditor.fields import RichTextField
-from django.db.models import Sum
 
 from apps.services import constants
 from mptt.models import MPTTModel, TreeForeignKey
-from apps.services.utils import unique_slugify
+from apps.services.utils import save_with_unique_slug
 
 # Получение модели пользователя.
 NextgenUser = get_user_model()
@@ -23,7 +25,9 @@ class PostPublishedManager(models.Manager):
 class PostPublishedRealtedManager(PostPublishedManager):
     """
     Модельный менеджер для опубликованых постов со связанными полями.
-    Аннотированы кол-вом лайков и отсортированы по дате создания.
+    Отсортированы по дате создания.
+    Теги не подгружаются: карточки берутся из кеша, теги догружаются
+    только для непопавших в кеш (см. тег post_cards).
     """
 
     def get_queryset(self):
@@ -31,11 +35,31 @@ class PostPublishedRealtedManager(PostPublishedManager):
             'author',
             'author__userprofile',
             'category',
-        ).prefetch_related('tags').annotate(
-            get_sum_rating=Sum('ratings__value')).order_by('-create')
+        ).order_by('-create')
         return queryset
 
 
+def rating_deltas(old_value, new_value):
+    """
+    Изменение счетчиков рейтинга поста при смене голоса old -> new.
+    None - голоса нет.
+    """
+    return {
+        'rating_sum': (new_value or 0) - (old_value or 0),
+        'likes_count': (new_value == 1) - (old_value == 1),
+        'dislikes_count': (new_value == -1) - (old_value == -1),
+    }
+
+
+def rating_counters_delta(old_value, new_value):
+    """То же изменение в виде kwargs для queryset.update()."""
+    return {
+        name: F(name) + delta
+        for name, delta in rating_deltas(old_value, new_value).items()
+        if delta
+    }
+
+
 class Post(models.Model):
     """Модель: Пост."""
 
@@ -78,6 +102,14 @@ class Post(models.Model):
         ))],
         verbose_name='Изображение поста',
     )
+    # Уменьшенные копии изображения, создаются задачей Celery
+    # (см. apps.services.images.make_variants).
+    thumbnail_variants = models.JSONField(
+        default=dict,
+        blank=True,
+        editable=False,
+        verbose_name='Варианты изображения',
+    )
     tags = TaggableManager(
         verbose_name='Теги',
         help_text='Список тегов, разделенный запятыми.',
@@ -111,6 +143,23 @@ class Post(models.Model):
         verbose_name='Обновил',
     )
     fixed = models.BooleanField(default=False, verbose_name='Закреплено')
+    rating_sum = models.IntegerField(default=0, verbose_name='Рейтинг')
+    likes_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Лайки',
+    )
+    dislikes_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Дизлайки',
+    )
+    # Поисковый вектор для PostgreSQL, заполняется apps.blog.search.
+    # GIN-индекс по нему создается миграцией только на PostgreSQL.
+    search_vector = SearchVectorField(null=True, editable=False)
+
+    # Счетчики рейтинга меняются только через PostRating.
+    RATING_FIELDS = ('rating_sum', 'likes_count', 'dislikes_count')
+    # Поля, которые ведутся в обход Post.save.
+    DERIVED_FIELDS = ('search_vector', 'thumbnail_variants')
 
     objects = models.Manager()
     published = PostPublishedManager()
@@ -119,7 +168,13 @@ class Post(models.Model):
     class Meta:
         db_table = 'blog_post'
         ordering = ['-fixed', '-create']
-        indexes = [models.Index(fields=['-fixed', '-create', 'status'])]
+        indexes = [
+            models.Index(
+                fields=['-fixed', '-create', 'id'],
+                condition=models.Q(status='published'),
+                name='blog_post_feed_idx',
+            ),
+        ]
         verbose_name = 'Статья'
         verbose_name_plural = 'Статьи'
 
@@ -131,17 +186,29 @@ class Post(models.Model):
 
     def save(self, *args, **kwargs):
         """
-        При создании новой записи генерируется уникалльный slug, если он
-        совпадает с тем что уже есть.
-        При обновлении фото, старое будет удаляться.
+        При создании новой записи генерируется уникальный slug: при
+        совпадении с существующим добавляется номер -2, -3...
+        Замененное или оставшееся от удаленного поста фото убирает
+        сборщик мусора (см. apps.blog.media_gc).
+        Счетчики рейтинга при обновлении не перезаписываются, чтобы не
+        затереть голоса, пришедшие после загрузки поста. Поисковый вектор
+        и варианты изображения тоже ведутся отдельно.
         """
         if not self.pk:
-            self.slug = unique_slugify(self, self.title)
+            return save_with_unique_slug(
+                self, self.title, super().save, *args, **kwargs)
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key
+                and field.name not in self.RATING_FIELDS
+                and field.name not in self.DERIVED_FIELDS
+            ]
         super().save(*args, **kwargs)
 
     def get_sum_rating(self):
         """Получение рейтинга (лайки/дизлайки)."""
-        return self.ratings.aggregate(Sum('value', default=0))['value__sum']
+        return self.rating_sum
 
 
 class Category(MPTTModel):
@@ -187,13 +254,23 @@ class Category(MPTTModel):
         return reverse('blog:category', kwargs={'slug': self.slug})
 
 
-class Comment(MPTTModel):
-    """Модель: Древовыидные комментарии."""
+class Comment(models.Model):
+    """
+    Модель: Древовыидные комментарии.
+    Дерево хранится материализованным путем в пределах поста: path -
+    id всех предков и самого комментария по PATH_STEP цифр. Ответ только
+    дописывает свою строку, не сдвигая соседей, а ветка выбирается одним
+    диапазонным запросом по индексу (post, path).
+    """
 
     STATUS_OPTIONS = (
         ('published', 'Опубликовано'),
         ('draft', 'Черновик')
     )
+    # Цифр на уровень в пути и максимальная глубина дерева. Ответы
+    # глубже сохраняются в ветку предка с максимальной глубины.
+    PATH_STEP = 10
+    PATH_MAX_DEPTH = 24
 
     post = models.ForeignKey(
         Post,
@@ -223,7 +300,7 @@ class Comment(MPTTModel):
         max_length=constants.COMM_MAX_LENGTH,
 
     )
-    parent = TreeForeignKey(
+    parent = models.ForeignKey(
         'self',
         null=True,
         blank=True,
@@ -231,18 +308,65 @@ class Comment(MPTTModel):
         on_delete=models.CASCADE,
         verbose_name='Родительский комментарий',
     )
-
-    class MTTMeta:
-        order_insertion_by = ('-create',)
+    path = models.CharField(
+        max_length=PATH_STEP * (PATH_MAX_DEPTH + 1),
+        editable=False,
+        verbose_name='Путь в дереве',
+    )
+    depth = models.PositiveSmallIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Глубина',
+    )
 
     class Meta:
         ordering = ('-create',)
         verbose_name = 'Комментарий'
         verbose_name_plural = 'Комментарии'
+        indexes = (
+            models.Index(
+                fields=('post', 'path'),
+                name='blog_comment_path_idx',
+            ),
+        )
 
     def __str__(self):
         return f'{self.author}:{self.body}'
 
+    def save(self, *args, **kwargs):
+        """
+        Новый комментарий вставляется и получает путь (родителя + свой id)
+        в одной транзакции. Родитель с другого поста игнорируется.
+        """
+        if not self._state.adding or self.path:
+            return super().save(*args, **kwargs)
+        parent_path = ''
+        if self.parent_id is not None:
+            parent_path = Comment.objects.filter(
+                pk=self.parent_id, post_id=self.post_id,
+            ).values_list('path', flat=True).first() or ''
+            parent_path = parent_path[:self.PATH_STEP * self.PATH_MAX_DEPTH]
+            self.parent_id = (
+                int(parent_path[-self.PATH_STEP:]) if parent_path else None
+            )
+        self.depth = len(parent_path) // self.PATH_STEP
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            self.path = parent_path + str(self.pk).zfill(self.PATH_STEP)
+            Comment.objects.filter(pk=self.pk).update(path=self.path)
+
+    def is_child_node(self):
+        return self.parent_id is not None
+
+    def descendants_condition(self):
+        """Условие на ответы в ветке комментария: диапазон пути."""
+        upper = str(int(self.path) + 1).zfill(len(self.path))
+        return Q(post_id=self.post_id, path__gt=self.path, path__lt=upper)
+
+    def get_descendants(self):
+        """Все ответы в ветке комментария, одним запросом по диапазону пути."""
+        return Comment.objects.filter(self.descendants_condition())
+
 
 class PostRating(models.Model):
     """Модель: Рейтинг постов."""
@@ -272,3 +396,90 @@ class PostRating(models.Model):
 
     def __str__(self):
         return self.post.title
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        """Запоминается значение голоса из БД для расчета изменения."""
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_value = dict(zip(field_names, values)).get('value')
+        return instance
+
+    def save(self, *args, **kwargs):
+        """Вместе с голосом атомарно обновляются счетчики поста."""
+        old_value = None
+        if not self._state.adding:
+            old_value = getattr(self, '_loaded_value', None)
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            counters = rating_counters_delta(old_value, self.value)
+            if counters:
+                Post.objects.filter(pk=self.post_id).update(**counters)
+        self._loaded_value = self.value
+
+
+class TagStat(models.Model):
+    """
+    Модель: Статистика тега - кол-во опубликованных постов и id последних
+    из них в порядке ленты. Пересчитывается по затронутым тегам
+    (см. apps.blog.tag_stats).
+    """
+
+    tag = models.OneToOneField(
+        Tag,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='stat',
+        verbose_name='Тег',
+    )
+    post_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Опубликованных постов',
+    )
+    recent_post_ids = models.JSONField(
+        default=list,
+        verbose_name='Последние посты',
+    )
+
+    class Meta:
+        indexes = [models.Index(fields=['-post_count'])]
+        verbose_name = 'Статистика тега'
+        verbose_name_plural = 'Статистика тегов'
+
+    def __str__(self):
+        return f'{self.tag}: {self.post_count}'
+
+    def covers_all_posts(self):
+        """Все посты тега есть в recent_post_ids - лента без JOIN."""
+        return len(self.recent_post_ids) >= self.post_count
+
+
+class UploadBlob(models.Model):
+    """
+    Модель: Файл загрузок ckeditor, адресованный по содержимому
+    (см. apps.services.storage.ContentAddressedStorage), и посты,
+    в тексте которых он встречается.
+    """
+
+    sha256 = models.CharField(max_length=64, unique=True, verbose_name='SHA-256')
+    file = models.CharField(
+        max_length=constants.PATH_MAX_LENGTH,
+        verbose_name='Файл',
+    )
+    size = models.PositiveBigIntegerField(verbose_name='Размер')
+    create = models.DateTimeField(
+        auto_now_add=True,
+        verbose_name='Время загрузки',
+    )
+    posts = models.ManyToManyField(
+        Post,
+        blank=True,
+        related_name='uploads',
+        verbose_name='Посты',
+    )
+
+    class Meta:
+        verbose_name = 'Загруженный файл'
+        verbose_name_plural = 'Загруженные файлы'
+
+    def __str__(self):
+        return self.file
@@ -0,0 +1,261 @@
+import json
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.contrib.contenttypes.models import ContentType
+from django.db import transaction
+from django.db.models import Prefetch
+from django.utils.dateparse import parse_datetime
+from taggit.models import Tag, TaggedItem
+
+from apps.services.utils import SlugAllocator
+from apps.user_app.models import UserProfile
+from . import search
+from .models import Category, Post, PostRating, rating_deltas
+
+NextgenUser = get_user_model()
+
+# Поля поста, которые переносятся как есть.
+POST_FIELDS = ('title', 'description', 'text', 'status', 'fixed')
+# Обязательные ключи строки импорта.
+REQUIRED_KEYS = ('title', 'category', 'author')
+# Типы полей строки импорта; null допустим там, где он значит "нет".
+FIELD_TYPES = {
+    'title': str,
+    'description': str,
+    'text': str,
+    'status': str,
+    'fixed': bool,
+    'category': str,
+    'author': str,
+    'slug': (str, type(None)),
+    'thumbnail': (str, type(None)),
+    'create': (str, type(None)),
+    'update': (str, type(None)),
+    'tags': list,
+    'ratings': list,
+}
+
+
+class PostImportError(ValueError):
+    """Некорректная строка файла импорта."""
+
+    def __init__(self, line_number, message):
+        super().__init__(f'Строка {line_number}: {message}')
+
+
+def export_rows(batch_size=500):
+    """
+    Посты с тегами и голосами в виде словарей для JSONL. iterator() с
+    chunk_size читает посты серверным курсором (в PostgreSQL), связи
+    подгружаются пачками - память не зависит от кол-ва постов.
+    """
+    posts = Post.objects.select_related('category', 'author').prefetch_related(
+        'tags',
+        Prefetch(
+            'ratings',
+            queryset=PostRating.objects.select_related('user').only(
+                'post_id', 'value', 'user__username'),
+        ),
+    ).defer('search_vector').order_by('pk')
+    for post in posts.iterator(chunk_size=batch_size):
+        row = {field: getattr(post, field) for field in POST_FIELDS}
+        row.update({
+            'slug': post.slug,
+            'category': post.category.slug,
+            'author': post.author.username,
+            'thumbnail': post.thumbnail.name,
+            'create': post.create.isoformat(),
+            'update': post.update.isoformat(),
+            'tags': sorted(tag.name for tag in post.tags.all()),
+            'ratings': [
+                {'user': rating.user.username, 'value': rating.value}
+                for rating in post.ratings.all()
+            ],
+        })
+        yield row
+
+
+def read_rows(stream):
+    """Строки JSONL файла: (номер строки, словарь), пустые пропускаются."""
+    for line_number, line in enumerate(stream, 1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except json.JSONDecodeError as e:
+            raise PostImportError(line_number, f'некорректный JSON ({e})')
+        if not isinstance(row, dict):
+            raise PostImportError(line_number, 'ожидается объект')
+        for key in REQUIRED_KEYS:
+            if not row.get(key):
+                raise PostImportError(line_number, f'нет поля {key!r}')
+        for key, types in FIELD_TYPES.items():
+            if key in row and not isinstance(row[key], types):
+                raise PostImportError(
+                    line_number, f'некорректное поле {key!r}: {row[key]!r}')
+        for key in ('create', 'update'):
+            if row.get(key) and not _is_datetime(row[key]):
+                raise PostImportError(
+                    line_number, f'некорректная дата {key!r}: {row[key]!r}')
+        if not all(isinstance(name, str) and name for name in row.get('tags', ())):
+            raise PostImportError(
+                line_number, f'некорректные теги {row["tags"]!r}')
+        if row.get('status', 'published') not in dict(Post.STATUS_OPTIONS):
+            raise PostImportError(
+                line_number, f'некорректный статус {row["status"]!r}')
+        # Один голос на пользователя - последний.
+        ratings = {}
+        for rating in row.get('ratings', ()):
+            if (
+                not isinstance(rating, dict)
+                or rating.get('value') not in (1, -1)
+                or not isinstance(rating.get('user'), str)
+                or not rating['user']
+            ):
+                raise PostImportError(line_number, f'некорректный голос {rating}')
+            ratings[rating['user']] = rating['value']
+        row['ratings'] = ratings
+        yield line_number, row
+
+
+def _is_datetime(value):
+    try:
+        return parse_datetime(value) is not None
+    except ValueError:
+        return False
+
+
+class PostImporter:
+    """
+    Массовый импорт постов пачками: на пачку - по одному запросу чтения
+    категорий, пользователей и тегов и по одному bulk_create постов,
+    связей с тегами и голосов. Slug выдаются SlugAllocator на всю пачку,
+    счетчики рейтинга считаются до вставки. Недостающие авторы и
+    проголосовавшие создаются без пароля, недостающие теги - заново.
+    Поисковый индекс и статистика тегов обновляются по пачке, сигналы
+    моделей при bulk_create не срабатывают.
+    """
+
+    def __init__(self):
+        self.categories = {}
+        self.users = {}
+        self.tags = {}
+        self.content_type = ContentType.objects.get_for_model(Post)
+        self.tag_ids = set()
+
+    def import_batch(self, rows):
+        """Импорт пачки [(номер строки, словарь)]. Возвращает кол-во постов."""
+        with transaction.atomic():
+            self.load_categories(rows)
+            self.load_users(rows)
+            self.load_tags(rows)
+            posts = self.create_posts(rows)
+            self.create_tagged_items(posts, rows)
+            self.create_ratings(posts, rows)
+            search.index_posts([post.pk for post in posts])
+        return len(posts)
+
+    def load_categories(self, rows):
+        slugs = {row['category'] for _, row in rows} - set(self.categories)
+        self.categories.update(Category.objects.filter(
+            slug__in=slugs).values_list('slug', 'pk'))
+        for line_number, row in rows:
+            if row['category'] not in self.categories:
+                raise PostImportError(
+                    line_number, f'нет категории {row["category"]!r}')
+
+    def load_users(self, rows):
+        names = set()
+        for _, row in rows:
+            names.add(row['author'])
+            names.update(row['ratings'])
+        names -= set(self.users)
+        self.users.update(NextgenUser.objects.filter(
+            username__in=names).values_list('username', 'pk'))
+        missing = sorted(names - set(self.users))
+        if not missing:
+            return
+        # Пароль непригоден для входа: хэш считается один раз.
+        password = make_password(None)
+        users = NextgenUser.objects.bulk_create(
+            NextgenUser(username=name, password=password) for name in missing)
+        slugs = SlugAllocator(UserProfile).allocate_many(missing)
+        UserProfile.objects.bulk_create(
+            UserProfile(user=user, slug=slug)
+            for user, slug in zip(users, slugs)
+        )
+        self.users.update((user.username, user.pk) for user in users)
+
+    def load_tags(self, rows):
+        names = {
+            name for _, row in rows for name in row.get('tags', ())
+        } - set(self.tags)
+        self.tags.update(Tag.objects.filter(
+            name__in=names).values_list('name', 'pk'))
+        missing = sorted(names - set(self.tags))
+        if not missing:
+            return
+        slugs = SlugAllocator(Tag).allocate_many(missing)
+        tags = Tag.objects.bulk_create(
+            Tag(name=name, slug=slug) for name, slug in zip(missing, slugs))
+        self.tags.update((tag.name, tag.pk) for tag in tags)
+
+    def create_posts(self, rows):
+        slugs = SlugAllocator(Post).allocate_many(
+            [row.get('slug') or row['title'] for _, row in rows])
+        posts = []
+        for (_, row), slug in zip(rows, slugs):
+            author_id = self.users[row['author']]
+            post = Post(
+                slug=slug,
+                category_id=self.categories[row['category']],
+                author_id=author_id,
+                updater_id=author_id,
+                **{
+                    field: row[field] for field in POST_FIELDS
+                    if field in row
+                },
+            )
+            if row.get('thumbnail'):
+                post.thumbnail = row['thumbnail']
+            for value in row['ratings'].values():
+                for name, delta in rating_deltas(None, value).items():
+                    setattr(post, name, getattr(post, name) + delta)
+            posts.append(post)
+        Post.objects.bulk_create(posts)
+        # auto_now_add/auto_now перезаписывают даты при вставке.
+        dated = []
+        for post, (_, row) in zip(posts, rows):
+            dates = {
+                field: parse_datetime(row[field])
+                for field in ('create', 'update') if row.get(field)
+            }
+            if dates:
+                for field, value in dates.items():
+                    setattr(post, field, value or getattr(post, field))
+                dated.append(post)
+        Post.objects.bulk_update(dated, ('create', 'update'))
+        return posts
+
+    def create_tagged_items(self, posts, rows):
+        items = []
+        for post, (_, row) in zip(posts, rows):
+            tag_ids = {self.tags[name] for name in row.get('tags', ())}
+            self.tag_ids |= tag_ids
+            items.extend(
+                TaggedItem(
+                    tag_id=tag_id,
+                    content_type=self.content_type,
+                    object_id=post.pk,
+                )
+                for tag_id in tag_ids
+            )
+        TaggedItem.objects.bulk_create(items)
+
+    def create_ratings(self, posts, rows):
+        PostRating.objects.bulk_create(
+            PostRating(post=post, user_id=self.users[user], value=value)
+            for post, (_, row) in zip(posts, rows)
+            for user, value in row['ratings'].items()
+        )
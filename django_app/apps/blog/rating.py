@@ -0,0 +1,163 @@
+import time
+
+from django.db import OperationalError, connection, transaction
+
+from apps.services.page_cache import invalidate, post_card_scopes
+from .models import Post, PostRating, rating_deltas
+
+RATING_CREATED = 'created'
+RATING_UPDATED = 'updated'
+RATING_DELETED = 'deleted'
+RATING_UNCHANGED = 'unchanged'
+
+# Изменение счетчиков поста для каждого исхода голоса value.
+OUTCOMES = {
+    RATING_CREATED: lambda value: rating_deltas(None, value),
+    RATING_UPDATED: lambda value: rating_deltas(-value, value),
+    RATING_DELETED: lambda value: rating_deltas(value, None),
+}
+
+POSTGRESQL_VOTE_SQL = '''
+WITH existing AS (
+    SELECT 1 FROM {rating} WHERE post_id = %(post)s AND user_id = %(user)s
+), removed AS (
+    DELETE FROM {rating}
+    WHERE post_id = %(post)s AND user_id = %(user)s AND value = %(value)s
+    RETURNING 'deleted'::text AS status
+), changed AS (
+    UPDATE {rating} SET value = %(value)s
+    WHERE post_id = %(post)s AND user_id = %(user)s AND value <> %(value)s
+    RETURNING 'updated'::text AS status
+), created AS (
+    INSERT INTO {rating} (post_id, user_id, value)
+    SELECT %(post)s, %(user)s, %(value)s
+    WHERE NOT EXISTS (SELECT 1 FROM existing)
+    ON CONFLICT (post_id, user_id) DO NOTHING
+    RETURNING 'created'::text AS status
+), outcome AS (
+    SELECT status FROM removed
+    UNION ALL SELECT status FROM changed
+    UNION ALL SELECT status FROM created
+)
+UPDATE {post} SET
+    {counters}
+FROM (SELECT 1) AS one LEFT JOIN outcome ON TRUE
+WHERE {post}.id = %(post)s
+RETURNING outcome.status, {post}.rating_sum
+'''
+
+# Сколько раз повторять голос в SQLite при "database is locked".
+SQLITE_LOCK_RETRIES = 5
+
+
+def apply_vote(post_id, user_id, value):
+    """
+    Голос пользователя за пост: повторный такой же голос снимает его,
+    противоположный - меняет, иначе голос создается.
+    Счетчики поста обновляются тем же обращением к БД, а страницы с
+    карточкой поста сбрасываются после коммита.
+    Возвращает (статус, новый рейтинг поста).
+    """
+    if value not in (1, -1):
+        raise ValueError('Голос может быть только 1 или -1')
+    if connection.vendor == 'postgresql':
+        scopes = post_card_scopes(post_id)
+        status, rating_sum = _apply_vote_postgresql(
+            post_id, user_id, value)
+    else:
+        for attempt in range(SQLITE_LOCK_RETRIES):
+            try:
+                scopes = post_card_scopes(post_id)
+                status, rating_sum = _apply_vote_serialized(
+                    post_id, user_id, value)
+                break
+            except OperationalError as e:
+                # Повтор возможен только если голос - вся транзакция.
+                if (connection.in_atomic_block
+                        or 'locked' not in str(e)
+                        or attempt == SQLITE_LOCK_RETRIES - 1):
+                    raise
+                time.sleep(0.05 * (attempt + 1))
+    if status != RATING_UNCHANGED:
+        transaction.on_commit(lambda: invalidate(*scopes))
+    return status, rating_sum
+
+
+def _apply_vote_postgresql(post_id, user_id, value):
+    """
+    PostgreSQL: один запрос из CTE. Удаление, смена и вставка голоса
+    взаимоисключающие по снимку данных, поэтому срабатывает не больше одной
+    из них и исход известен точно. Затем по исходу обновляются счетчики.
+    Если строку голоса одновременно изменил параллельный клик того же
+    пользователя, запрос ничего не меняет (ON CONFLICT DO NOTHING и
+    перепроверка условий) и не падает с IntegrityError.
+    """
+    params = {'post': post_id, 'user': user_id, 'value': value}
+    counters = []
+    for name in Post.RATING_FIELDS:
+        cases = []
+        for status, deltas in OUTCOMES.items():
+            params[f'{status}_{name}'] = deltas(value)[name]
+            cases.append(f"WHEN '{status}' THEN %({status}_{name})s")
+        counters.append(
+            f'{name} = {name} + CASE outcome.status {" ".join(cases)} ELSE 0 END'
+        )
+    sql = POSTGRESQL_VOTE_SQL.format(
+        rating=connection.ops.quote_name(PostRating._meta.db_table),
+        post=connection.ops.quote_name(Post._meta.db_table),
+        counters=',\n    '.join(counters),
+    )
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        row = cursor.fetchone()
+        if row is None:
+            raise Post.DoesNotExist(f'Пост {post_id} не найден')
+    status, rating_sum = row
+    return status or RATING_UNCHANGED, rating_sum
+
+
+def _apply_vote_serialized(post_id, user_id, value):
+    """
+    SQLite: в SQLite нет изменяющих CTE, поэтому голос применяется
+    в одной транзакции, которая начинается с записи. Первый же UPDATE
+    берет блокировку на запись базы, так что параллельные голоса
+    выполняются по очереди и не гоняются за unique_together.
+    Если SQLite отказал в блокировке без ожидания (защита от взаимной
+    блокировки), apply_vote повторяет транзакцию целиком.
+    """
+    rating = connection.ops.quote_name(PostRating._meta.db_table)
+    post = connection.ops.quote_name(Post._meta.db_table)
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(
+            f'UPDATE {rating} SET value = %s '
+            f'WHERE post_id = %s AND user_id = %s AND value <> %s',
+            [value, post_id, user_id, value],
+        )
+        if cursor.rowcount:
+            status = RATING_UPDATED
+        else:
+            cursor.execute(
+                f'DELETE FROM {rating} '
+                f'WHERE post_id = %s AND user_id = %s AND value = %s',
+                [post_id, user_id, value],
+            )
+            if cursor.rowcount:
+                status = RATING_DELETED
+            else:
+                cursor.execute(
+                    f'INSERT INTO {rating} (post_id, user_id, value) '
+                    f'VALUES (%s, %s, %s)',
+                    [post_id, user_id, value],
+                )
+                status = RATING_CREATED
+        deltas = OUTCOMES[status](value)
+        cursor.execute(
+            f'UPDATE {post} SET '
+            + ', '.join(f'{name} = {name} + %s' for name in Post.RATING_FIELDS)
+            + ' WHERE id = %s RETURNING rating_sum',
+            [deltas[name] for name in Post.RATING_FIELDS] + [post_id],
+        )
+        row = cursor.fetchone()
+        if row is None:
+            raise Post.DoesNotExist(f'Пост {post_id} не найден')
+    return status, *row
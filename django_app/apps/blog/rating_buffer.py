@@ -0,0 +1,381 @@
+import threading
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from functools import lru_cache
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import connection, transaction
+from django.db.models import Count, Q, Sum
+from django.utils.module_loading import import_string
+
+from apps.services import constants
+from apps.services.page_cache import invalidate_post, invalidate_post_card
+from .models import Post, PostRating
+from .rating import (
+    RATING_CREATED, RATING_DELETED, RATING_UPDATED, apply_vote,
+)
+
+# Значение голоса в буфере, означающее "голоса нет".
+NO_VOTE = 0
+
+
+class BaseVoteBuffer(ABC):
+    """
+    Буфер голосов для отложенной записи (write-behind).
+    По каждой паре (пост, пользователь) хранится текущий голос и голос,
+    который был в БД на момент попадания в буфер (base), а по посту -
+    сумма еще не записанных изменений рейтинга.
+    """
+
+    @abstractmethod
+    def get_vote(self, post_id, user_id):
+        """Голос из буфера (0 - снят) или None если пары в буфере нет."""
+
+    @abstractmethod
+    def toggle(self, post_id, user_id, value, base=None):
+        """
+        Применение клика к голосу в буфере.
+        base - голос из БД, обязателен если пары в буфере еще нет, иначе
+        бросается LookupError. Возвращает (старый, новый, изменение поста).
+        """
+
+    @abstractmethod
+    def pending_delta(self, post_id):
+        """Незаписанное изменение рейтинга поста."""
+
+    @abstractmethod
+    def snapshot(self):
+        """Все пары буфера: список (post_id, user_id, value, base)."""
+
+    @abstractmethod
+    def acknowledge(self, entries):
+        """
+        Подтверждение записи снимка в БД: из буфера убираются пары,
+        не менявшиеся после снимка, у остальных base становится записанным
+        значением.
+        """
+
+    @abstractmethod
+    def flush_lock(self):
+        """
+        Блокировка записи буфера в БД (контекстный менеджер): отдает True,
+        если блокировка взята, и False, если буфер уже пишет другой процесс.
+        """
+
+
+class LocalVoteBuffer(BaseVoteBuffer):
+    """
+    Буфер в памяти процесса: для тестов, где голоса и запись буфера
+    в одном процессе (задача Celery в воркере этот буфер не видит).
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.flushing = threading.Lock()
+        self.votes = {}
+        self.bases = {}
+        self.deltas = {}
+
+    def get_vote(self, post_id, user_id):
+        return self.votes.get((post_id, user_id))
+
+    def toggle(self, post_id, user_id, value, base=None):
+        key = (post_id, user_id)
+        with self.lock:
+            if key not in self.votes:
+                if base is None:
+                    raise LookupError(key)
+                self.votes[key] = self.bases[key] = base
+            old = self.votes[key]
+            new = NO_VOTE if old == value else value
+            self.votes[key] = new
+            delta = self.deltas.get(post_id, 0) + new - old
+            self.deltas[post_id] = delta
+        return old, new, delta
+
+    def pending_delta(self, post_id):
+        return self.deltas.get(post_id, 0)
+
+    def snapshot(self):
+        with self.lock:
+            return [
+                (post_id, user_id, value, self.bases[(post_id, user_id)])
+                for (post_id, user_id), value in self.votes.items()
+            ]
+
+    def acknowledge(self, entries):
+        with self.lock:
+            for post_id, user_id, value, base in entries:
+                key = (post_id, user_id)
+                delta = self.deltas.get(post_id, 0) - (value - base)
+                if delta:
+                    self.deltas[post_id] = delta
+                else:
+                    self.deltas.pop(post_id, None)
+                if self.votes.get(key) == value:
+                    del self.votes[key]
+                    del self.bases[key]
+                else:
+                    self.bases[key] = value
+
+    @contextmanager
+    def flush_lock(self):
+        acquired = self.flushing.acquire(blocking=False)
+        try:
+            yield acquired
+        finally:
+            if acquired:
+                self.flushing.release()
+
+
+class RedisVoteBuffer(BaseVoteBuffer):
+    """
+    Буфер в Redis, общий для всех воркеров.
+    Изменения делаются Lua-скриптами, поэтому атомарны.
+    """
+
+    VOTES_KEY = 'rating:votes'
+    BASES_KEY = 'rating:bases'
+    DELTAS_KEY = 'rating:deltas'
+    FLUSH_LOCK_KEY = 'rating:flush-lock'
+
+    TOGGLE_SCRIPT = '''
+    local old = redis.call('HGET', KEYS[1], ARGV[1])
+    if not old then
+        if ARGV[4] == '' then return false end
+        old = ARGV[4]
+        redis.call('HSET', KEYS[2], ARGV[1], old)
+    end
+    old = tonumber(old)
+    local new = tonumber(ARGV[3])
+    if old == new then new = 0 end
+    redis.call('HSET', KEYS[1], ARGV[1], new)
+    local delta = redis.call('HINCRBY', KEYS[3], ARGV[2], new - old)
+    return {old, new, delta}
+    '''
+
+    ACKNOWLEDGE_SCRIPT = '''
+    for i = 1, #ARGV, 4 do
+        local field, post, value = ARGV[i], ARGV[i + 1], ARGV[i + 2]
+        local change = tonumber(value) - tonumber(ARGV[i + 3])
+        if change ~= 0 then
+            if redis.call('HINCRBY', KEYS[3], post, -change) == 0 then
+                redis.call('HDEL', KEYS[3], post)
+            end
+        end
+        if redis.call('HGET', KEYS[1], field) == value then
+            redis.call('HDEL', KEYS[1], field)
+            redis.call('HDEL', KEYS[2], field)
+        else
+            redis.call('HSET', KEYS[2], field, value)
+        end
+    end
+    '''
+
+    def __init__(self):
+        import redis
+
+        self.client = redis.Redis.from_url(settings.RATING_BUFFER_REDIS_URL)
+        self.keys = (self.VOTES_KEY, self.BASES_KEY, self.DELTAS_KEY)
+        self.toggle_script = self.client.register_script(self.TOGGLE_SCRIPT)
+        self.acknowledge_script = self.client.register_script(
+            self.ACKNOWLEDGE_SCRIPT)
+
+    def get_vote(self, post_id, user_id):
+        value = self.client.hget(self.VOTES_KEY, f'{post_id}:{user_id}')
+        return None if value is None else int(value)
+
+    def toggle(self, post_id, user_id, value, base=None):
+        result = self.toggle_script(
+            keys=self.keys,
+            args=[
+                f'{post_id}:{user_id}',
+                post_id,
+                value,
+                '' if base is None else base,
+            ],
+        )
+        if result is None:
+            raise LookupError((post_id, user_id))
+        old, new, delta = result
+        return old, new, delta
+
+    def pending_delta(self, post_id):
+        return int(self.client.hget(self.DELTAS_KEY, post_id) or 0)
+
+    def snapshot(self):
+        with self.client.pipeline() as pipe:
+            pipe.hgetall(self.VOTES_KEY)
+            pipe.hgetall(self.BASES_KEY)
+            votes, bases = pipe.execute()
+        entries = []
+        for field, value in votes.items():
+            post_id, user_id = map(int, field.split(b':'))
+            entries.append((post_id, user_id, int(value), int(bases[field])))
+        return entries
+
+    def acknowledge(self, entries):
+        args = []
+        for post_id, user_id, value, base in entries:
+            args += [f'{post_id}:{user_id}', post_id, value, base]
+        if args:
+            self.acknowledge_script(keys=self.keys, args=args)
+
+    @contextmanager
+    def flush_lock(self):
+        from redis.exceptions import LockError
+
+        lock = self.client.lock(
+            self.FLUSH_LOCK_KEY, timeout=constants.RATING_FLUSH_LOCK_TIMEOUT)
+        acquired = lock.acquire(blocking=False)
+        try:
+            yield acquired
+        finally:
+            if acquired:
+                try:
+                    lock.release()
+                except LockError:
+                    # Блокировка истекла по таймауту.
+                    pass
+
+
+@lru_cache(maxsize=None)
+def get_vote_buffer():
+    """Буфер голосов из настройки RATING_BUFFER_BACKEND (один на процесс)."""
+    return import_string(settings.RATING_BUFFER_BACKEND)()
+
+
+def buffer_vote(post_id, user_id, value):
+    """
+    Голос в режиме отложенной записи: меняется только буфер, в БД -
+    одно чтение рейтинга поста (и голоса, если пары еще нет в буфере).
+    Возвращает (статус, рейтинг с учетом незаписанных голосов).
+    """
+    if value not in (1, -1):
+        raise ValueError('Голос может быть только 1 или -1')
+    buffer = get_vote_buffer()
+    rating_sum, slug = Post.objects.values_list('rating_sum', 'slug').get(
+        pk=post_id)
+    try:
+        old, new, delta = buffer.toggle(post_id, user_id, value)
+    except LookupError:
+        base = PostRating.objects.filter(
+            post_id=post_id, user_id=user_id,
+        ).values_list('value', flat=True).first()
+        old, new, delta = buffer.toggle(
+            post_id, user_id, value, base or NO_VOTE)
+    if new == NO_VOTE:
+        status = RATING_DELETED
+    elif old == NO_VOTE:
+        status = RATING_CREATED
+    else:
+        status = RATING_UPDATED
+    invalidate_post(slug)
+    return status, rating_sum + delta
+
+
+def cast_vote(post_id, user_id, value):
+    """
+    Голос пользователя за пост - единая точка входа для сайта и
+    генераторов нагрузки: в режиме RATING_WRITE_BEHIND голос копится в
+    буфере (buffer_vote), иначе сразу пишется в БД (apply_vote).
+    Возвращает (статус, рейтинг поста).
+    """
+    vote = buffer_vote if settings.RATING_WRITE_BEHIND else apply_vote
+    return vote(post_id, user_id, value)
+
+
+def flush_vote_buffer():
+    """
+    Запись буфера в БД: голоса по паре (пост, пользователь) уже схлопнуты
+    в итоговое значение, поэтому на пачку кликов приходится один upsert
+    или delete. Счетчики затронутых постов пересчитываются по таблице
+    голосов одним запросом. Запись идет под блокировкой буфера: если
+    предыдущая запись еще не закончилась, эта пропускается. Возвращает
+    кол-во записанных голосов.
+    """
+    buffer = get_vote_buffer()
+    with buffer.flush_lock() as acquired:
+        if not acquired:
+            return 0
+        entries = buffer.snapshot()
+        written = _write_votes(entries)
+        buffer.acknowledge(entries)
+    return written
+
+
+def _write_votes(entries):
+    """Запись снимка буфера в БД, возвращает кол-во измененных голосов."""
+    changed = [entry for entry in entries if entry[2] != entry[3]]
+    if changed:
+        with transaction.atomic():
+            # Голоса за удаленные посты и от удаленных пользователей
+            # отбрасываются (и подтверждаются вместе со снимком): иначе
+            # ошибка внешнего ключа останавливала бы каждую запись буфера.
+            changed = _existing_votes(changed)
+            PostRating.objects.bulk_create(
+                [
+                    PostRating(post_id=post_id, user_id=user_id, value=value)
+                    for post_id, user_id, value, _ in changed
+                    if value != NO_VOTE
+                ],
+                update_conflicts=True,
+                unique_fields=('post', 'user'),
+                update_fields=('value',),
+            )
+            removed = [
+                (post_id, user_id)
+                for post_id, user_id, value, _ in changed
+                if value == NO_VOTE
+            ]
+            if removed:
+                table = connection.ops.quote_name(PostRating._meta.db_table)
+                with connection.cursor() as cursor:
+                    cursor.executemany(
+                        f'DELETE FROM {table} '
+                        f'WHERE post_id = %s AND user_id = %s',
+                        removed,
+                    )
+            post_ids = {post_id for post_id, *_ in changed}
+            recount_post_ratings(post_ids)
+        for post_id in post_ids:
+            invalidate_post_card(post_id)
+    return len(changed)
+
+
+def _existing_votes(entries):
+    """Пары снимка, пост и пользователь которых еще есть в БД."""
+    post_ids = set(Post.objects.filter(
+        pk__in={post_id for post_id, *_ in entries},
+    ).values_list('pk', flat=True))
+    user_ids = set(get_user_model().objects.filter(
+        pk__in={user_id for _, user_id, *_ in entries},
+    ).values_list('pk', flat=True))
+    return [
+        entry for entry in entries
+        if entry[0] in post_ids and entry[1] in user_ids
+    ]
+
+
+def recount_post_ratings(post_ids):
+    """Пересчет счетчиков рейтинга постов по таблице голосов."""
+    totals = {
+        row['post_id']: row for row in PostRating.objects.filter(
+            post_id__in=post_ids,
+        ).values('post_id').annotate(
+            total=Sum('value'),
+            likes=Count('id', filter=Q(value=1)),
+            dislikes=Count('id', filter=Q(value=-1)),
+        ).order_by()
+    }
+    posts = []
+    for post_id in post_ids:
+        row = totals.get(post_id, {})
+        posts.append(Post(
+            pk=post_id,
+            rating_sum=row.get('total', 0),
+            likes_count=row.get('likes', 0),
+            dislikes_count=row.get('dislikes', 0),
+        ))
+    Post.objects.bulk_update(posts, Post.RATING_FIELDS)
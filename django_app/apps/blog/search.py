@@ -0,0 +1,229 @@
+import html
+import re
+
+from django.contrib.postgres.search import (
+    SearchHeadline,
+    SearchQuery,
+    SearchRank,
+    SearchVector,
+)
+from django.db import connection, transaction
+from django.db.models import F, Func, TextField, Value
+from django.db.models.functions import Concat
+from django.utils.html import escape, strip_tags
+
+from apps.services import constants
+from .models import Post
+
+# Конфигурация полнотекстового поиска PostgreSQL.
+SEARCH_CONFIG = 'russian'
+# Теневая FTS5-таблица для SQLite (rowid = id поста).
+FTS_TABLE = 'blog_post_fts'
+# Веса полей в bm25 SQLite: заголовок > описание > текст.
+FTS_WEIGHTS = (10.0, 4.0, 1.0)
+
+# Служебные символы выделения: сниппет сначала экранируется,
+# затем они заменяются на <mark>.
+MARK_START = '\x02'
+MARK_STOP = '\x03'
+
+SNIPPET_WORDS = 30
+
+
+def post_search_vector():
+    """Вектор поста: заголовок (A) > описание (B) > текст (C)."""
+    return (
+        SearchVector('title', weight='A', config=SEARCH_CONFIG)
+        + SearchVector('description', weight='B', config=SEARCH_CONFIG)
+        + SearchVector('text', weight='C', config=SEARCH_CONFIG)
+    )
+
+
+def plain_text(value):
+    """Текст поля ckeditor без разметки и html-сущностей."""
+    return html.unescape(strip_tags(value or ''))
+
+
+def highlight(snippet):
+    """Экранирование сниппета с выделением найденных слов."""
+    return escape(html.unescape(snippet).strip()).replace(
+        MARK_START, '<mark>').replace(MARK_STOP, '</mark>')
+
+
+def fts_query(query):
+    """
+    Запрос пользователя в синтаксисе FTS5: каждое слово - фраза в кавычках
+    с поиском по префиксу, слова объединяются через AND.
+    """
+    words = re.findall(r'\w+', query)
+    return ' '.join(f'"{word}"*' for word in words)
+
+
+def index_post(post):
+    """Обновление поискового индекса поста (вызывается после сохранения)."""
+    if connection.vendor == 'postgresql':
+        Post.objects.filter(pk=post.pk).update(
+            search_vector=post_search_vector())
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [post.pk])
+        if post.status == 'published':
+            cursor.execute(
+                f'INSERT INTO {FTS_TABLE} (rowid, title, description, text) '
+                f'VALUES (%s, %s, %s, %s)',
+                [
+                    post.pk,
+                    post.title,
+                    plain_text(post.description),
+                    plain_text(post.text),
+                ],
+            )
+
+
+def unindex_post(post_id):
+    """Удаление поста из индекса (в PostgreSQL вектор удаляется с постом)."""
+    if connection.vendor != 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [post_id])
+
+
+def search_posts(query, page=1, per_page=constants.PAGINATE_SEARCH_COUNT):
+    """
+    Поиск по опубликованным постам, по убыванию релевантности.
+    Возвращает (посты, есть ли следующая страница); у постов
+    проставлены rank и snippet - экранированный фрагмент текста
+    с выделенными <mark> словами.
+    """
+    offset = (page - 1) * per_page
+    if connection.vendor == 'postgresql':
+        posts = _search_postgresql(query, offset, per_page + 1)
+    else:
+        posts = _search_sqlite(query, offset, per_page + 1)
+    return posts[:per_page], len(posts) > per_page
+
+
+def _search_postgresql(query, offset, limit):
+    """
+    Поиск по GIN-индексу search_vector, сниппет - ts_headline по всему
+    тексту поста без разметки.
+    """
+    search_query = SearchQuery(
+        query, config=SEARCH_CONFIG, search_type='websearch')
+    plain = Func(
+        Concat(
+            F('title'), Value('. '), F('description'), Value(' '), F('text'),
+            output_field=TextField(),
+        ),
+        Value('<[^>]+>'), Value(' '), Value('g'),
+        function='REGEXP_REPLACE',
+    )
+    posts = list(
+        Post.published.select_related('author', 'category').filter(
+            search_vector=search_query,
+        ).annotate(
+            rank=SearchRank(F('search_vector'), search_query),
+            headline=SearchHeadline(
+                plain,
+                search_query,
+                config=SEARCH_CONFIG,
+                start_sel=MARK_START,
+                stop_sel=MARK_STOP,
+                max_words=SNIPPET_WORDS,
+                min_words=SNIPPET_WORDS // 2,
+            ),
+        ).defer('text').order_by('-rank', '-id')[offset:offset + limit]
+    )
+    for post in posts:
+        post.snippet = highlight(post.headline)
+    return posts
+
+
+def _search_sqlite(query, offset, limit):
+    """Поиск по FTS5-таблице: ранжирование bm25, сниппет - snippet()."""
+    match = fts_query(query)
+    if not match:
+        return []
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'SELECT rowid, bm25({FTS_TABLE}, %s, %s, %s) AS rank, '
+            f'snippet({FTS_TABLE}, -1, %s, %s, %s, %s) '
+            f'FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s '
+            f'ORDER BY rank, rowid DESC LIMIT %s OFFSET %s',
+            [
+                *FTS_WEIGHTS,
+                MARK_START, MARK_STOP, '…', SNIPPET_WORDS,
+                match, limit, offset,
+            ],
+        )
+        rows = cursor.fetchall()
+    posts = Post.published.select_related('author', 'category').defer(
+        'text').in_bulk([row[0] for row in rows])
+    results = []
+    for post_id, rank, snippet in rows:
+        post = posts.get(post_id)
+        if post is not None:
+            # bm25 тем лучше, чем меньше (отрицательный).
+            post.rank = -rank
+            post.snippet = highlight(snippet)
+            results.append(post)
+    return results
+
+
+def index_posts(post_ids):
+    """Индексация пачки постов (массовый импорт в обход Post.save)."""
+    if not post_ids:
+        return 0
+    if connection.vendor == 'postgresql':
+        return Post.objects.filter(pk__in=post_ids).update(
+            search_vector=post_search_vector())
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {FTS_TABLE} WHERE rowid IN '
+            f'({", ".join(["%s"] * len(post_ids))})',
+            list(post_ids),
+        )
+    posts = Post.published.filter(pk__in=post_ids).only(
+        'title', 'description', 'text')
+    return _insert_fts([
+        (
+            post.pk,
+            post.title,
+            plain_text(post.description),
+            plain_text(post.text),
+        )
+        for post in posts
+    ])
+
+
+@transaction.atomic
+def rebuild_index(batch_size=500):
+    """Полная переиндексация постов. Возвращает кол-во проиндексированных."""
+    if connection.vendor == 'postgresql':
+        return Post.objects.update(search_vector=post_search_vector())
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {FTS_TABLE}')
+    count = 0
+    posts = Post.published.only('title', 'description', 'text').order_by('pk')
+    batch = []
+    for post in posts.iterator(chunk_size=batch_size):
+        batch.append((
+            post.pk,
+            post.title,
+            plain_text(post.description),
+            plain_text(post.text),
+        ))
+        if len(batch) >= batch_size:
+            count += _insert_fts(batch)
+            batch = []
+    return count + _insert_fts(batch)
+
+
+def _insert_fts(rows):
+    with connection.cursor() as cursor:
+        cursor.executemany(
+            f'INSERT INTO {FTS_TABLE} (rowid, title, description, text) '
+            f'VALUES (%s, %s, %s, %s)',
+            rows,
+        )
+    return len(rows)
@@ -0,0 +1,199 @@
+from django.db.models.signals import (
+    m2m_changed, post_delete, post_save, pre_delete, pre_save,
+)
+from django.db import transaction
+from django.dispatch import receiver
+from django.utils import timezone
+from taggit.models import Tag
+
+from apps.services import images, page_cache
+from apps.user_app.models import UserProfile
+from . import search, tag_stats, tasks, uploads
+from .category_tree import invalidate_category_tree
+from .models import Category, Comment, Post, PostRating, rating_counters_delta
+
+
+@receiver(post_delete, sender=PostRating)
+def rating_deleted(sender, instance, origin=None, **kwargs):
+    """
+    При удалении голоса уменьшаются счетчики поста.
+    Срабатывает и при каскадном удалении (например, пользователя), кроме
+    удаления самого поста.
+    """
+    if isinstance(origin, Post):
+        return
+    Post.objects.filter(pk=instance.post_id).update(
+        **rating_counters_delta(instance.value, None)
+    )
+
+
+@receiver(pre_save, sender=Post)
+def post_saving(sender, instance, **kwargs):
+    """
+    Пост до сохранения: сбрасываются и страницы лент, где была его
+    карточка (при переносе в другую категорию, смене даты или статуса).
+    """
+    if instance.pk is not None:
+        instance._previous = Post.objects.only(
+            *page_cache.FEED_POSITION_FIELDS).filter(pk=instance.pk).first()
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def post_changed(sender, instance, **kwargs):
+    """Сброс кеша страницы поста и страниц лент с его карточкой."""
+    page_cache.invalidate_post_feeds(
+        instance,
+        previous=instance.__dict__.pop('_previous', None),
+        tag_ids=getattr(instance, '_deleted_tag_ids', ()),
+    )
+
+
+@receiver(post_save, sender=Post)
+def post_saved(sender, instance, **kwargs):
+    """
+    Поисковый индекс поста и индекс его загрузок обновляются в той же
+    транзакции.
+    """
+    search.index_post(instance)
+    uploads.sync_post_uploads(instance)
+
+
+@receiver(post_delete, sender=Post)
+def post_deleted(sender, instance, **kwargs):
+    search.unindex_post(instance.pk)
+    tag_stats.refresh_tag_stats(getattr(instance, '_deleted_tag_ids', ()))
+
+
+@receiver(post_save, sender=Post)
+def post_tag_stats_changed(sender, instance, created=False, **kwargs):
+    """
+    Статус, дата и закреп поста влияют на счетчики и ленты его тегов.
+    У нового поста тегов еще нет - они добавятся через m2m_changed.
+    """
+    if not created:
+        tag_stats.refresh_tag_stats(
+            instance.tags.values_list('pk', flat=True))
+
+
+@receiver(pre_delete, sender=Post)
+def post_deleting(sender, instance, **kwargs):
+    """Теги запоминаются до каскадного удаления связей."""
+    instance._deleted_tag_ids = list(
+        instance.tags.values_list('pk', flat=True))
+
+
+@receiver(m2m_changed, sender=Post.tags.through)
+def post_tags_changed(sender, instance, action, pk_set=None, **kwargs):
+    """
+    Теги поста сохраняются после самого поста: время обновления
+    сдвигается (меняется версия карточки) и кеш страниц сбрасывается еще
+    раз, включая ленты снятых тегов.
+    Статистика пересчитывается только для затронутых тегов.
+    """
+    if action == 'pre_clear':
+        if isinstance(instance, Post):
+            instance._cleared_tag_ids = list(
+                instance.tags.values_list('pk', flat=True))
+        return
+    if not action.startswith('post_'):
+        return
+    if isinstance(instance, Tag):
+        tag_stats.refresh_tag_stats([instance.pk])
+        return
+    Post.objects.filter(pk=instance.pk).update(update=timezone.now())
+    if action == 'post_clear':
+        pk_set = getattr(instance, '_cleared_tag_ids', ())
+    page_cache.invalidate_post_feeds(instance, tag_ids=pk_set or ())
+    tag_stats.refresh_tag_stats(pk_set or ())
+
+
+@receiver(post_save, sender=Tag)
+@receiver(pre_delete, sender=Tag)
+def tag_changed(sender, instance, created=False, **kwargs):
+    """
+    Переименование или удаление тега меняет карточки его постов
+    и облако тегов.
+    """
+    if not created:
+        Post.objects.filter(tags=instance).update(update=timezone.now())
+        tag_stats.schedule_tag_cloud_update()
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+@receiver(post_save, sender=PostRating)
+@receiver(post_delete, sender=PostRating)
+def post_related_changed(sender, instance, origin=None, **kwargs):
+    """
+    Сброс кеша страницы поста при изменении его комментариев, а при
+    изменении голосов - и страниц лент с его карточкой (рейтинг).
+    """
+    if isinstance(origin, Post):
+        return
+    if sender is PostRating:
+        page_cache.invalidate_post_card(instance.post_id)
+        return
+    slug = Post.objects.filter(pk=instance.post_id).values_list(
+        'slug', flat=True).first()
+    if slug:
+        page_cache.invalidate_post(slug)
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def category_changed(sender, **kwargs):
+    """
+    Дерево категорий перестраивается после коммита, иначе другой воркер
+    успеет собрать его из старых данных под новой версией. Кеш страниц
+    сбрасывается после дерева, чтобы не закешировать старый сайдбар.
+    """
+    def invalidate():
+        invalidate_category_tree()
+        page_cache.invalidate(page_cache.SITE_SCOPE)
+
+    transaction.on_commit(invalidate)
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+@receiver(post_save, sender=UserProfile)
+def site_changed(sender, created=False, **kwargs):
+    """
+    Теги и профили (аватары в комментариях) есть на всех страницах -
+    сбрасывается весь кеш страниц.
+    Новые тег или профиль еще нигде не показаны.
+    """
+    if created:
+        return
+    page_cache.invalidate(page_cache.SITE_SCOPE)
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_save, sender=UserProfile)
+def image_saved(sender, instance, **kwargs):
+    """
+    Новое изображение поста или аватар уменьшаются задачей Celery после
+    коммита. До этого шаблоны выводят оригинал.
+    """
+    if sender is Post:
+        field_file, variants = instance.thumbnail, instance.thumbnail_variants
+        task = tasks.make_post_thumbnail_variants
+    else:
+        field_file, variants = instance.avatar, instance.avatar_variants
+        task = tasks.make_avatar_variants
+    if images.needs_variants(field_file, variants):
+        transaction.on_commit(lambda: task.delay(instance.pk))
+
+
+@receiver(post_delete, sender=Post)
+@receiver(post_delete, sender=UserProfile)
+def image_deleted(sender, instance, **kwargs):
+    """Варианты изображения удаляются вместе с записью."""
+    if sender is Post:
+        field_file, variants = instance.thumbnail, instance.thumbnail_variants
+    else:
+        field_file, variants = instance.avatar, instance.avatar_variants
+    if variants:
+        transaction.on_commit(
+            lambda: images.delete_variants(field_file.storage, variants))
@@ -0,0 +1,140 @@
+import math
+
+from django.contrib.contenttypes.models import ContentType
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count
+from taggit.models import Tag, TaggedItem
+
+from apps.services import constants, page_cache
+from .models import Post, TagStat
+
+# Облако тегов в общем кеше (список словарей, без обращений к БД).
+TAG_CLOUD_KEY = 'tag_cloud'
+# Кол-во размеров шрифта в облаке.
+TAG_CLOUD_WEIGHTS = 5
+# Порядок ленты по тегу - как в PostListMixin.keyset_ordering.
+FEED_ORDERING = ('-fixed', '-create', 'id')
+
+
+def _published_tagged_items(tag_ids):
+    return TaggedItem.objects.filter(
+        tag_id__in=tag_ids,
+        content_type=ContentType.objects.get_for_model(Post),
+        object_id__in=Post.published.values('pk'),
+    )
+
+
+@transaction.atomic
+def refresh_tag_stats(tag_ids):
+    """
+    Пересчет статистики указанных тегов: одно агрегирующее чтение
+    счетчиков, по запросу последних постов на тег и один upsert.
+    Облако тегов обновляется после коммита.
+    """
+    tag_ids = set(tag_ids)
+    if not tag_ids:
+        return
+    # Пересчеты одного тега идут по очереди до коммита: иначе
+    # параллельный пересчет, прочитавший счетчики до чужого коммита,
+    # запишет их последним. Строки статистики может еще не быть,
+    # поэтому блокируются теги (по порядку pk - без взаимоблокировок),
+    # а счетчики читаются уже после блокировки.
+    tag_ids = list(
+        Tag.objects.select_for_update().filter(pk__in=tag_ids).order_by(
+            'pk').values_list('pk', flat=True)
+    )
+    if not tag_ids:
+        return
+    counts = dict(
+        _published_tagged_items(tag_ids).values_list('tag_id').annotate(
+            count=Count('object_id')).order_by()
+    )
+    stats = []
+    for tag_id in tag_ids:
+        recent = []
+        if counts.get(tag_id):
+            recent = list(
+                Post.published.filter(tags__id=tag_id).order_by(
+                    *FEED_ORDERING).values_list('pk', flat=True)[
+                    :constants.TAG_RECENT_POSTS_COUNT]
+            )
+        stats.append(TagStat(
+            tag_id=tag_id,
+            post_count=counts.get(tag_id, 0),
+            recent_post_ids=recent,
+        ))
+    TagStat.objects.bulk_create(
+        stats,
+        update_conflicts=True,
+        unique_fields=('tag',),
+        update_fields=('post_count', 'recent_post_ids'),
+    )
+    schedule_tag_cloud_update()
+
+
+@transaction.atomic
+def rebuild_tag_stats(batch_size=500):
+    """Пересчет статистики всех тегов. Возвращает кол-во тегов."""
+    TagStat.objects.exclude(
+        tag__in=Tag.objects.values('pk')).delete()
+    tag_ids = list(Tag.objects.order_by('pk').values_list('pk', flat=True))
+    for start in range(0, len(tag_ids), batch_size):
+        refresh_tag_stats(tag_ids[start:start + batch_size])
+    return len(tag_ids)
+
+
+def build_tag_cloud():
+    """
+    Самые популярные теги по алфавиту с весом от 1 до TAG_CLOUD_WEIGHTS
+    (логарифмическая шкала по кол-ву постов).
+    """
+    rows = list(
+        TagStat.objects.filter(post_count__gt=0).order_by(
+            '-post_count', 'tag__name').values_list(
+            'tag__name', 'tag__slug', 'post_count')[
+            :constants.TAG_CLOUD_COUNT]
+    )
+    if not rows:
+        return []
+    low = math.log(rows[-1][2])
+    spread = math.log(rows[0][2]) - low or 1
+    return sorted(
+        (
+            {
+                'name': name,
+                'slug': slug,
+                'count': count,
+                'weight': 1 + round(
+                    (math.log(count) - low) / spread
+                    * (TAG_CLOUD_WEIGHTS - 1)),
+            }
+            for name, slug, count in rows
+        ),
+        key=lambda tag: tag['name'].lower(),
+    )
+
+
+def get_tag_cloud():
+    """Облако тегов из кеша, при промахе строится одним запросом."""
+    cloud = cache.get(TAG_CLOUD_KEY)
+    if cloud is None:
+        cloud = build_tag_cloud()
+        cache.set(TAG_CLOUD_KEY, cloud, timeout=None)
+    return cloud
+
+
+def update_tag_cloud():
+    """
+    Перестроение облака. Облако есть на всех страницах, поэтому кеш
+    страниц сбрасывается, только если облако действительно изменилось.
+    """
+    cloud = build_tag_cloud()
+    if cache.get(TAG_CLOUD_KEY) != cloud:
+        cache.set(TAG_CLOUD_KEY, cloud, timeout=None)
+        page_cache.invalidate(page_cache.SITE_SCOPE)
+
+
+def schedule_tag_cloud_update():
+    """Обновление облака после коммита - из уже сохраненной статистики."""
+    transaction.on_commit(update_tag_cloud)
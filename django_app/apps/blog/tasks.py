@@ -1,44 +1,93 @@
 import logging
-from uuid import uuid4
 
-from django.db import transaction
-from django.contrib.auth import get_user_model
+from django.conf import settings
 
 from blog_nextgen.celery import app
-from apps.blog.models import PostRating, Post
-
-
-UserModel = get_user_model()
+from apps.blog.engagement import EngagementError, EngagementGenerator
+from apps.blog.media_gc import collect_media_garbage
+from apps.blog.models import Post
+from apps.blog.rating_buffer import flush_vote_buffer
+from apps.services import constants, images, page_cache
+from apps.user_app.models import UserProfile
 
 
 logger = logging.getLogger(__name__)
 
 
 @app.task
-def autolike_post_every_5_seconds():
-    """Создает рандомного пользователя и ставит лайк рандомному посту."""
+def generate_engagement():
+    """
+    Синтетическая активность для демо и нагрузки: ENGAGEMENT_EVENTS
+    событий за запуск от пула из ENGAGEMENT_USERS пользователей.
+    """
+    generator = EngagementGenerator()
+    generator.ensure_users(settings.ENGAGEMENT_USERS)
     try:
-        with transaction.atomic():
-            # Создание пользователя
-            user = UserModel.objects.create_user(
-                username=str(uuid4())[:5],
-                password=str(uuid4())[:5],
-            )
-            logger.info(f"Создан пользователь: {user.username}")
-
-            # Выбор случайного поста
-            random_post = Post.published.order_by('?').first()
-            if not random_post:
-                logger.warning("Не удалось найти опубликованные посты.")
-                return
-
-            # Ставим лайк посту
-            PostRating.objects.create(
-                post=random_post,
-                user=user,
-                value=1,
-            )
-            logger.info(f"Пользователь {user.username} поставил лайк посту {random_post.id}")
-
-    except Exception as e:
-        logger.error(f"Ошибка при выполнении задачи: {str(e)}")
+        counts = generator.run(settings.ENGAGEMENT_EVENTS)
+    except EngagementError as e:
+        logger.warning(f'Синтетическая активность не создана: {e}')
+        return
+    logger.info(f'Синтетическая активность: {counts}')
+
+
+@app.task
+def flush_rating_buffer():
+    """Запись накопленных в буфере голосов в БД."""
+    if not settings.RATING_WRITE_BEHIND:
+        return
+    written = flush_vote_buffer()
+    if written:
+        logger.info(f"Записано голосов из буфера: {written}")
+
+
+def _update_variants(queryset, field_name, widths):
+    """
+    Построение вариантов изображения поля и запись их в БД.
+    Запись идет только если файл поля за это время не сменился, иначе
+    созданные варианты удаляются (их построит следующая задача).
+    Возвращает True, если варианты записаны.
+    """
+    instance = queryset.first()
+    if instance is None:
+        return False
+    field_file = getattr(instance, field_name)
+    old_variants = getattr(instance, f'{field_name}_variants')
+    if not images.needs_variants(field_file, old_variants):
+        return False
+    variants = images.make_variants(field_file, widths)
+    updated = queryset.filter(**{field_name: field_file.name}).update(
+        **{f'{field_name}_variants': variants})
+    if not updated:
+        images.delete_variants(field_file.storage, variants)
+        return False
+    if old_variants.get('source') != field_file.name:
+        images.delete_variants(field_file.storage, old_variants)
+    return True
+
+
+@app.task
+def make_post_thumbnail_variants(post_id):
+    """Уменьшенные копии изображения поста."""
+    queryset = Post.objects.filter(pk=post_id)
+    if _update_variants(queryset, 'thumbnail', constants.THUMBNAIL_WIDTHS):
+        page_cache.invalidate_post_card(post_id)
+        logger.info(f'Созданы варианты изображения поста {post_id}')
+
+
+@app.task
+def make_avatar_variants(profile_id):
+    """Уменьшенные копии аватара (аватары есть в комментариях везде)."""
+    queryset = UserProfile.objects.filter(pk=profile_id)
+    if _update_variants(queryset, 'avatar', constants.AVATAR_WIDTHS):
+        page_cache.invalidate(page_cache.SITE_SCOPE)
+        logger.info(f'Созданы варианты аватара профиля {profile_id}')
+
+
+@app.task
+def collect_orphaned_media():
+    """Перенос неиспользуемых медиафайлов в карантин."""
+    count, size = collect_media_garbage(
+        min_age=constants.MEDIA_GC_MIN_AGE_HOURS * 60 * 60)
+    if count:
+        logger.info(
+            f'В карантин перенесено файлов: {count} ({size} байт)')
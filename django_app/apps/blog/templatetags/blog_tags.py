@@ -0,0 +1,115 @@
+import hashlib
+
+from django import template
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import prefetch_related_objects
+from django.template.loader import render_to_string
+from django.utils.html import format_html, format_html_join
+from django.utils.safestring import mark_safe
+
+from apps.blog.category_tree import get_category_tree
+from apps.services import images
+from apps.blog.tag_stats import get_tag_cloud
+from apps.core.metrics import timing
+
+register = template.Library()
+
+POST_CARD_TEMPLATE = 'includes/post_card.html'
+
+
+def post_card_key(post):
+    """Ключ кеша карточки поста, общий для всех лент."""
+    return f'card:{post.pk}'
+
+
+def post_card_version(post):
+    """
+    Версия карточки из данных, которые в ней выводятся.
+    Сохранение поста и смена тегов меняют post.update, голоса - рейтинг,
+    переименование категории или автора - их поля, готовые уменьшенные
+    копии изображения - его варианты.
+    """
+    source = ':'.join(map(str, (
+        post.update.isoformat(),
+        post.thumbnail_variants.get('source', ''),
+        post.rating_sum,
+        post.category.slug,
+        post.category.title,
+        post.author.username,
+    )))
+    return hashlib.md5(source.encode()).hexdigest()
+
+
+@register.simple_tag
+def post_cards(posts):
+    """
+    Карточки постов ленты из кеша фрагментов: все карточки читаются
+    одним get_many, рендерятся и сохраняются только устаревшие.
+    """
+    posts = list(posts)
+    keys = {post.pk: post_card_key(post) for post in posts}
+    cached = cache.get_many(keys.values())
+    cards = {}
+    missed = []
+    for post in posts:
+        version = post_card_version(post)
+        entry = cached.get(keys[post.pk])
+        if entry is not None and entry[0] == version:
+            cards[post.pk] = entry[1]
+        else:
+            missed.append((post, version))
+    if missed:
+        with timing('cards'):
+            prefetch_related_objects([post for post, _ in missed], 'tags')
+            fresh = {}
+            for post, version in missed:
+                cards[post.pk] = render_to_string(
+                    POST_CARD_TEMPLATE, {'post': post})
+                fresh[keys[post.pk]] = (version, cards[post.pk])
+            cache.set_many(fresh, settings.POST_CARD_CACHE_TIMEOUT)
+    return mark_safe(''.join(cards[post.pk] for post in posts))
+
+
+@register.inclusion_tag('includes/sidebar.html')
+def category_sidebar():
+    """Сайдбар категорий из дерева в памяти процесса, без запросов к БД."""
+    return {'categories': get_category_tree().roots}
+
+
+@register.inclusion_tag('includes/tag_cloud.html')
+def tag_cloud():
+    """Облако популярных тегов из кеша (см. apps.blog.tag_stats)."""
+    return {'tags': get_tag_cloud()}
+
+
+@register.simple_tag
+def responsive_img(field_file, variants, sizes='100vw', **attrs):
+    """
+    Изображение с уменьшенными копиями: <picture> с WebP и JPEG в srcset,
+    браузер выбирает ширину по sizes. Пока копий нет - оригинал.
+    Остальные аргументы становятся атрибутами <img>, по умолчанию
+    загрузка ленивая.
+    """
+    attrs.setdefault('loading', 'lazy')
+    attrs.setdefault('decoding', 'async')
+    if not images.has_variants(field_file, variants):
+        return format_html(
+            '<img src="{}"{}>', field_file.url, _html_attrs(attrs))
+    storage = field_file.storage
+    jpeg = variants['jpeg']
+    return format_html(
+        '<picture><source type="{}" srcset="{}" sizes="{}">'
+        '<img src="{}" srcset="{}" sizes="{}"{}></picture>',
+        images.VARIANT_FORMATS['webp'][1],
+        images.srcset(storage, variants, 'webp'),
+        sizes,
+        storage.url(jpeg[-1][1]),
+        images.srcset(storage, variants, 'jpeg'),
+        sizes,
+        _html_attrs(attrs),
+    )
+
+
+def _html_attrs(attrs):
+    return format_html_join('', ' {}="{}"', attrs.items())
@@ -0,0 +1,328 @@
+import io
+import json
+import random
+import re
+import threading
+import time
+
+import pytest
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import connection, transaction
+from django.db.models import Count, Q, Sum
+from django.utils import timezone
+from taggit.models import Tag
+
+from apps.blog.comment_tree import load_comment_page
+from apps.blog.engagement import EngagementGenerator
+from apps.blog.models import Category, Comment, Post, PostRating, TagStat
+from apps.blog.rating import apply_vote
+from apps.blog.rating_buffer import (
+    buffer_vote, flush_vote_buffer, get_vote_buffer,
+)
+from apps.services import constants
+from apps.user_app.models import NextgenUser
+
+THREADS = 8
+VOTES_PER_THREAD = 50
+
+
+@pytest.mark.django_db(transaction=True)
+def test_parallel_votes_keep_rating_counters_consistent():
+    """
+    Потоки одновременно голосуют за один пост от небольшого пула
+    пользователей (одни и те же пользователи кликают параллельно),
+    после чего счетчики поста сверяются с таблицей голосов.
+    """
+    users = [
+        NextgenUser.objects.create_user(username=f'voter{i}')
+        for i in range(5)
+    ]
+    post = Post.objects.create(
+        title='Пост',
+        description='Описание',
+        text='Текст',
+        category=Category.objects.create(title='Раздел', slug='razdel'),
+        author=users[0],
+        updater=users[0],
+    )
+    errors = []
+    barrier = threading.Barrier(THREADS)
+
+    def vote(seed):
+        rng = random.Random(seed)
+        try:
+            barrier.wait()
+            for _ in range(VOTES_PER_THREAD):
+                apply_vote(
+                    post.pk, rng.choice(users).pk, rng.choice((1, -1)))
+        except Exception as e:
+            errors.append(e)
+        finally:
+            connection.close()
+
+    threads = [
+        threading.Thread(target=vote, args=(seed,))
+        for seed in range(THREADS)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    post.refresh_from_db(fields=Post.RATING_FIELDS)
+    actual = post.ratings.aggregate(
+        rating_sum=Sum('value', default=0),
+        likes_count=Count('id', filter=Q(value=1)),
+        dislikes_count=Count('id', filter=Q(value=-1)),
+    )
+    assert {name: getattr(post, name) for name in Post.RATING_FIELDS} == actual
+
+
+@pytest.mark.django_db
+def test_large_thread_loads_replies_page_by_page(client):
+    """
+    В ветке с ответами больше страницы на странице поста выводится не
+    больше PAGINATE_COMMENTS_COUNT ответов, а остальные догружаются
+    страницами по replies_url без пропусков и повторов.
+    """
+    per_page = constants.PAGINATE_COMMENTS_COUNT
+    user = NextgenUser.objects.create_user(username='author')
+    post = Post.objects.create(
+        title='Пост',
+        description='Описание',
+        text='Текст',
+        category=Category.objects.create(title='Раздел', slug='razdel'),
+        author=user,
+        updater=user,
+    )
+    root = Comment.objects.create(post=post, author=user, body='Корень')
+    replies = [
+        Comment.objects.create(
+            post=post, author=user, parent=root, body=f'Ответ {i}')
+        for i in range(per_page * 2 + 5)
+    ]
+
+    [thread] = load_comment_page(post.pk)
+    assert [reply.pk for reply in thread.replies] == [
+        reply.pk for reply in replies[:per_page]
+    ]
+
+    loaded = [reply.pk for reply in thread.replies]
+    url = thread.replies_url
+    while url:
+        page = client.get(url).json()
+        loaded += [
+            int(pk) for pk in re.findall(r'id="comment-thread-(\d+)"', page['html'])
+        ]
+        url = page['next']
+    assert loaded == [reply.pk for reply in replies]
+
+
+@pytest.mark.django_db(transaction=True)
+@pytest.mark.skipif(
+    not connection.features.has_select_for_update,
+    reason='записи в SQLite и так идут по очереди',
+)
+def test_parallel_tagging_keeps_tag_stats_fresh():
+    """
+    Второй пересчет тега начинается, пока первый не закоммичен: он
+    должен дождаться коммита и учесть оба поста, а не записать
+    последним счетчик без чужого поста.
+    """
+    user = NextgenUser.objects.create_user(username='author')
+    category = Category.objects.create(title='Раздел', slug='razdel')
+    first, second = [
+        Post.objects.create(
+            title=title,
+            description='Описание',
+            text='Текст',
+            category=category,
+            author=user,
+            updater=user,
+        )
+        for title in ('Первый', 'Второй')
+    ]
+    tag = Tag.objects.create(name='Общий', slug='obshchii')
+    first_refreshed = threading.Event()
+    errors = []
+
+    def tag_first():
+        try:
+            with transaction.atomic():
+                first.tags.add(tag)
+                first_refreshed.set()
+                # Второй поток начинает пересчет до этого коммита.
+                time.sleep(0.5)
+        except Exception as e:
+            errors.append(e)
+        finally:
+            connection.close()
+
+    def tag_second():
+        first_refreshed.wait()
+        try:
+            second.tags.add(tag)
+        except Exception as e:
+            errors.append(e)
+        finally:
+            connection.close()
+
+    threads = [threading.Thread(target=tag_first),
+               threading.Thread(target=tag_second)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    stat = TagStat.objects.get(tag=tag)
+    assert stat.post_count == 2
+    assert sorted(stat.recent_post_ids) == sorted([first.pk, second.pk])
+
+
+@pytest.fixture
+def local_vote_buffer(settings):
+    """Буфер голосов в памяти процесса вместо Redis."""
+    settings.RATING_BUFFER_BACKEND = 'apps.blog.rating_buffer.LocalVoteBuffer'
+    get_vote_buffer.cache_clear()
+    yield get_vote_buffer()
+    get_vote_buffer.cache_clear()
+
+
+@pytest.mark.django_db
+def test_flush_drops_votes_for_deleted_posts(local_vote_buffer):
+    """
+    Голос за пост, удаленный пока голос был в буфере, отбрасывается,
+    а остальные голоса записываются, и буфер не застревает.
+    """
+    user = NextgenUser.objects.create_user(username='voter')
+    category = Category.objects.create(title='Раздел', slug='razdel')
+    kept, deleted = [
+        Post.objects.create(
+            title=title,
+            description='Описание',
+            text='Текст',
+            category=category,
+            author=user,
+            updater=user,
+        )
+        for title in ('Остается', 'Удаляется')
+    ]
+    buffer_vote(kept.pk, user.pk, 1)
+    buffer_vote(deleted.pk, user.pk, 1)
+    deleted.delete()
+
+    assert flush_vote_buffer() == 1
+    assert local_vote_buffer.snapshot() == []
+    assert list(PostRating.objects.values_list('post_id', 'value')) == [
+        (kept.pk, 1),
+    ]
+    kept.refresh_from_db(fields=Post.RATING_FIELDS)
+    assert kept.rating_sum == 1
+
+
+@pytest.mark.django_db
+def test_synthetic_votes_follow_write_behind(settings, local_vote_buffer):
+    """
+    Голоса генератора активности в режиме отложенной записи, как и голоса
+    сайта, копятся в буфере, а в БД попадают только при сбросе буфера.
+    """
+    settings.RATING_WRITE_BEHIND = True
+    generator = EngagementGenerator(seed=1)
+    generator.create_users(1)
+    user = generator.users.get()
+    Post.objects.create(
+        title='Пост',
+        description='Описание',
+        text='Текст',
+        category=Category.objects.create(title='Раздел', slug='razdel'),
+        author=user,
+        updater=user,
+    )
+
+    generator.run({'ratings': 1})
+
+    assert not PostRating.objects.exists()
+    assert len(local_vote_buffer.snapshot()) == 1
+    assert flush_vote_buffer() == 1
+    assert PostRating.objects.count() == 1
+
+
+@pytest.mark.django_db
+def test_vote_invalidates_only_feed_pages_with_post(
+        client, django_capture_on_commit_callbacks):
+    """
+    Голос сбрасывает кеш страницы поста и только тех страниц ленты,
+    на которых есть его карточка, без ожидания срока кеша.
+    """
+    user = NextgenUser.objects.create_user(username='author')
+    category = Category.objects.create(title='Раздел', slug='razdel')
+    now = timezone.now()
+    posts = []
+    for i in range(constants.PAGINATE_POSTS_COUNT * 2 + 2):
+        post = Post.objects.create(
+            title=f'Пост {i}',
+            description='Описание',
+            text='Текст',
+            category=category,
+            author=user,
+            updater=user,
+        )
+        Post.objects.filter(pk=post.pk).update(
+            create=now - timezone.timedelta(hours=i))
+        posts.append(post)
+    cache.clear()
+
+    pages, url = [], '/'
+    while url:
+        pages.append(url)
+        url = client.get(
+            url, HTTP_X_REQUESTED_WITH='XMLHttpRequest').json()['next']
+
+    def cache_states():
+        return [
+            client.get(page, HTTP_X_REQUESTED_WITH='XMLHttpRequest')[
+                'X-Page-Cache']
+            for page in pages
+        ]
+
+    assert cache_states() == ['HIT'] * len(pages)
+    # Середина второй страницы: первая и третья не зависят от поста.
+    voted = posts[constants.PAGINATE_POSTS_COUNT + 2]
+    with django_capture_on_commit_callbacks(execute=True):
+        apply_vote(voted.pk, user.pk, 1)
+    assert cache_states() == ['HIT', 'MISS', 'HIT']
+    page = client.get(pages[1], HTTP_X_REQUESTED_WITH='XMLHttpRequest')
+    assert 'Рейтинг: 1' in page.json()['html']
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('malformed', [
+    {'ratings': {'user0': 1}},
+    {'ratings': [['user0', 1]]},
+    {'ratings': [{'user': ['user0'], 'value': 1}]},
+    {'tags': 'тег'},
+    {'tags': [{'name': 'тег'}]},
+    {'category': ['razdel']},
+    {'status': ['published']},
+    {'create': 42},
+    {'create': '2024-13-01T00:00:00'},
+])
+def test_import_rejects_malformed_rows(tmp_path, malformed):
+    """
+    Строка неверной структуры останавливает импорт с номером строки, а
+    не падает с AttributeError или TypeError посреди пачки.
+    """
+    Category.objects.create(title='Раздел', slug='razdel')
+    row = {'title': 'Пост', 'category': 'razdel', 'author': 'user0'}
+    path = tmp_path / 'posts.jsonl'
+    path.write_text(
+        json.dumps(row) + '\n' + json.dumps({**row, **malformed}) + '\n',
+        encoding='utf-8',
+    )
+
+    with pytest.raises(CommandError, match='Строка 2: '):
+        call_command('import_posts', str(path), stdout=io.StringIO())
+    assert not Post.objects.exists()
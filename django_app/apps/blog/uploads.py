@@ -0,0 +1,111 @@
+import hashlib
+import os
+import re
+
+from django.conf import settings
+from django.core.files import File
+from django.db import transaction
+
+from ckeditor_uploader.utils import storage
+from .models import Post, UploadBlob
+
+# Ссылки на загрузки ckeditor в тексте поста: путь после MEDIA_URL
+# (относительные и абсолютные URL одинаково).
+UPLOAD_URL_RE = re.compile(
+    re.escape(settings.MEDIA_URL.strip('/') + '/'
+              + settings.CKEDITOR_UPLOAD_PATH.strip('/') + '/')
+    + r'''[^"'\s<>)?#]+'''
+)
+
+
+def media_name(url_path):
+    """Имя файла в хранилище по пути из ссылки."""
+    return url_path[len(settings.MEDIA_URL.strip('/')) + 1:]
+
+
+def sync_post_uploads(post):
+    """Обновление индекса: какие файлы загрузок встречаются в посте."""
+    names = {
+        media_name(match)
+        for field in (post.description, post.text)
+        for match in UPLOAD_URL_RE.findall(field or '')
+    }
+    post.uploads.set(UploadBlob.objects.filter(file__in=names))
+
+
+def legacy_upload_names():
+    """Файлы загрузок ckeditor, сохраненные до хранилища по содержимому."""
+    blobs = settings.UPLOAD_BLOBS_PATH.rstrip('/')
+    stack = [settings.CKEDITOR_UPLOAD_PATH.rstrip('/')]
+    while stack:
+        directory = stack.pop()
+        if directory == blobs or not storage.exists(directory):
+            continue
+        directories, files = storage.listdir(directory)
+        stack.extend(os.path.join(directory, name) for name in directories)
+        for name in files:
+            yield os.path.join(directory, name)
+
+
+def dedupe_legacy_uploads(dry_run=False, keep=False):
+    """
+    Перенос старых загрузок в хранилище по содержимому: одинаковые
+    файлы становятся одним, ссылки в постах переписываются на
+    канонические URL, старые файлы удаляются (если не keep).
+    Возвращает (файлов, уникальных, байт освобождено, постов изменено).
+    """
+    renames = {}
+    digests = set()
+    freed = 0
+    for name in legacy_upload_names():
+        size = storage.size(name)
+        with storage.open(name, 'rb') as content:
+            if dry_run:
+                digest = _digest(content)
+                freed += size if digest in digests else 0
+                digests.add(digest)
+                renames[name] = None
+                continue
+            renames[name] = storage.save(name, File(content))
+        if renames[name] in digests:
+            freed += size
+        digests.add(renames[name])
+    posts_changed = 0
+    if not dry_run:
+        posts_changed = _rewrite_posts(renames)
+        if not keep:
+            for name in renames:
+                storage.delete(name)
+    return len(renames), len(digests), freed, posts_changed
+
+
+def _digest(content):
+    digest = hashlib.sha256()
+    for chunk in File(content).chunks():
+        digest.update(chunk)
+    return digest.hexdigest()
+
+
+@transaction.atomic
+def _rewrite_posts(renames):
+    """Замена ссылок на старые файлы во всех постах, где они есть."""
+    def replace(match):
+        name = renames.get(media_name(match.group(0)))
+        if name is None:
+            return match.group(0)
+        return match.group(0)[:-len(media_name(match.group(0)))] + name
+
+    changed = 0
+    posts = Post.objects.filter(
+        description__contains=settings.CKEDITOR_UPLOAD_PATH,
+    ) | Post.objects.filter(text__contains=settings.CKEDITOR_UPLOAD_PATH)
+    for post in posts.select_for_update().iterator():
+        description = UPLOAD_URL_RE.sub(replace, post.description)
+        text = UPLOAD_URL_RE.sub(replace, post.text)
+        if (description, text) != (post.description, post.text):
+            post.description, post.text = description, text
+            post.save(update_fields=('description', 'text', 'update'))
+            changed += 1
+        else:
+            sync_post_uploads(post)
+    return changed
@@ -9,6 +9,7 @@ urlpatterns = [
     path('', views.PostListView.as_view(), name='home'),
     path('post/create/', views.PostCreateView.as_view(), name='post_create'),
     path('rating/', views.RatingCreateView.as_view(), name='rating'),
+    path('search/', views.PostSearchView.as_view(), name='search'),
     path('post/<slug:slug>/',
          views.PostDetailView.as_view(),
          name='post_detail'),
@@ -21,6 +22,9 @@ urlpatterns = [
     path('post/<slug:slug>/update/',
          views.PostUpdateView.as_view(),
          name='post_update'),
+    path('post/<int:pk>/comments/',
+         views.CommentListView.as_view(),
+         name='comment_list'),
     path('post/<int:pk>/comments/create/',
          views.CommentCreateView.as_view(),
          name='comment_create'),
@@ -1,11 +1,12 @@
 from http import HTTPStatus
 
+from django.conf import settings
 from django.contrib.messages.views import SuccessMessageMixin
 from django.contrib.auth.mixins import LoginRequiredMixin
-from django.http import HttpResponse
+from django.http import Http404, HttpResponse
 from django.shortcuts import get_object_or_404
 from django.shortcuts import redirect
-from django.db.models import Q
+from django.template.loader import render_to_string
 from django.urls import reverse_lazy
 from django.http import JsonResponse
 from django.views.generic import (
@@ -15,19 +16,36 @@ from django.views.generic import (
     CreateView,
     UpdateView,
     DeleteView,
+    TemplateView,
 )
 
 from taggit.models import Tag
-from .models import Post, Category, Comment, PostRating
+from .models import Post, Comment, PostRating
 from .forms import PostCreateForm, PostUpdateForm, CommentCreateForm
+from .category_tree import get_category_tree
+from .comment_tree import comment_page_url, load_comment_page
+from .rating_buffer import cast_vote, get_vote_buffer
+from .search import search_posts
+from apps.core.metrics import timing
+from apps.services import constants
 from apps.services.mixins import (
     AuthorRequiredMixin,
     PostListMixin,
     WaringFormMessageMixin,
 )
+from apps.services.pagination import InvalidCursor
+from apps.services.page_cache import (
+    SEARCH_SCOPE,
+    SITE_SCOPE,
+    AnonymousPageCacheMixin,
+    FeedPageCacheMixin,
+    category_scope,
+    post_scope,
+    tag_scope,
+)
 
 
-class PostListView(PostListMixin, ListView):
+class PostListView(FeedPageCacheMixin, PostListMixin, ListView):
     """Представление: Страница всех постов."""
 
     def get_queryset(self):
@@ -40,31 +58,94 @@ class PostListView(PostListMixin, ListView):
         return context
 
 
-class PostByTagListView(PostListMixin, ListView):
+class PostByTagListView(FeedPageCacheMixin, PostListMixin, ListView):
     """Представление: Получение всех постов по тегу."""
 
     tag = None
 
+    def get_feed_scope(self):
+        return tag_scope(self.kwargs['tag'])
+
     def get_queryset(self):
-        """Получение queryset: посты сортируются по тегу из пути."""
-        self.tag = Tag.objects.get(slug=self.kwargs['tag'])
-        queryset = self.model.published_related.filter(
-            tags__slug=self.tag.slug)
-        return queryset
+        """
+        Получение queryset: посты по тегу из пути. Если все посты тега
+        есть в его статистике - выборка по первичным ключам без JOIN
+        через таблицу тегов (см. apps.blog.tag_stats).
+        """
+        self.tag = get_object_or_404(
+            Tag.objects.select_related('stat'), slug=self.kwargs['tag'])
+        stat = getattr(self.tag, 'stat', None)
+        if stat is not None and stat.covers_all_posts():
+            return self.model.published_related.filter(
+                pk__in=stat.recent_post_ids)
+        return self.model.published_related.filter(tags=self.tag)
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['title'] = f'Статьи по тегу {self.tag.name}'
+        return context
+
+
+class PostSearchView(AnonymousPageCacheMixin, TemplateView):
+    """
+    Представление: полнотекстовый поиск по постам (см. apps.blog.search).
+    Для AJAX-запросов результаты отдаются в JSON.
+    """
+
+    template_name = 'blog/search.html'
+    page_cache_scopes = (SEARCH_SCOPE,)
+    query_max_length = 200
+
+    def get(self, request, *args, **kwargs):
+        self.query = request.GET.get('q', '').strip()[:self.query_max_length]
+        try:
+            self.page = int(request.GET.get('page', 1))
+        except ValueError:
+            raise Http404('Некорректная страница')
+        if self.page < 1:
+            raise Http404('Некорректная страница')
+        self.posts, has_next = [], False
+        if self.query:
+            self.posts, has_next = search_posts(self.query, self.page)
+        self.next_url = None
+        if has_next:
+            query = request.GET.copy()
+            query['page'] = self.page + 1
+            self.next_url = f'{request.path}?{query.urlencode()}'
+        if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
+            return JsonResponse({
+                'results': [
+                    {
+                        'title': post.title,
+                        'url': post.get_absolute_url(),
+                        'snippet': post.snippet,
+                        'rank': post.rank,
+                    }
+                    for post in self.posts
+                ],
+                'next': self.next_url,
+            })
+        return super().get(request, *args, **kwargs)
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        context['title'] = f'Статьи по тегу{self.tag.name}'
+        context['title'] = f'Поиск: {self.query}' if self.query else 'Поиск'
+        context['query'] = self.query
+        context['posts'] = self.posts
+        context['next_url'] = self.next_url
         return context
 
 
-class PostDetailView(DetailView):
+class PostDetailView(AnonymousPageCacheMixin, DetailView):
     """Представление: конкретный пост."""
 
     model = Post
     context_object_name = 'post'
     template_name = 'blog/post_detail.html'
 
+    def get_page_cache_scopes(self):
+        return (SITE_SCOPE, post_scope(self.kwargs.get('slug')))
+
     def get_object(self, queryset=None):
         object = get_object_or_404(
             self.model.published.select_related('author', 'category'),
@@ -73,34 +154,54 @@ class PostDetailView(DetailView):
         return object
 
     def get_context_data(self, **kwargs):
-        """Передача к контект информации ставил ли пользователь лайк."""
+        """
+        Передача к контект информации ставил ли пользователь лайк.
+        При отложенной записи учитываются еще не записанные голоса.
+        """
         context = super().get_context_data(**kwargs)
-        if self.request.user.is_authenticated:
-            post_rating = PostRating.objects.filter(
-                user=self.request.user, post=self.object
-            ).first()
-            tag_button = post_rating.value if post_rating else None
-            context['tag_button'] = tag_button
+        with timing('rating'):
+            buffered = None
+            if settings.RATING_WRITE_BEHIND:
+                buffer = get_vote_buffer()
+                self.object.rating_sum += buffer.pending_delta(self.object.pk)
+                if self.request.user.is_authenticated:
+                    buffered = buffer.get_vote(
+                        self.object.pk, self.request.user.pk)
+            if buffered is not None:
+                context['tag_button'] = buffered or None
+            elif self.request.user.is_authenticated:
+                post_rating = PostRating.objects.filter(
+                    user=self.request.user, post=self.object
+                ).first()
+                tag_button = post_rating.value if post_rating else None
+                context['tag_button'] = tag_button
         context['title'] = self.object.title
         context['form'] = CommentCreateForm()
+        with timing('comments'):
+            comments = load_comment_page(self.object.pk)
+        context['comments'] = comments
+        context['comments_next'] = comments.has_next() and comment_page_url(
+            self.object.pk, cursor=comments.next_cursor)
+        context['max_depth'] = constants.COMMENT_MAX_DEPTH
         return context
 
 
-class CategoryListView(PostListMixin, ListView):
+class CategoryListView(FeedPageCacheMixin, PostListMixin, ListView):
     """Представление: посты по категориям."""
 
+    def get_feed_scope(self):
+        return category_scope(self.kwargs.get('slug'))
+
     def get_queryset(self):
         """
         Получает категорию, посты берутся текущей катериии и всех вложенных
-        категорий если такие есть.
+        категорий на любую глубину (id поддерева из дерева категорий).
         """
-        self.category = get_object_or_404(
-            Category,
-            slug=self.kwargs.get('slug'),
-        )
-        sub_cat = Category.objects.filter(parent=self.category)
+        self.category = get_category_tree().get(self.kwargs.get('slug'))
+        if self.category is None:
+            raise Http404('Категория не найдена')
         queryset = self.model.published_related.filter(
-            (Q(category=self.category) | Q(category__in=sub_cat)),
+            category_id__in=self.category.descendant_ids,
         ).order_by()
         return queryset
 
@@ -177,7 +278,18 @@ class CommentCreateView(LoginRequiredMixin, CreateView):
         comment.save()
 
         if self.is_ajax():
+            comment.reply_count = 0
+            comment.replies = []
+            comment.replies_url = None
             return JsonResponse({
+                'html': render_to_string(
+                    'blog/comments/comment_node.html',
+                    {
+                        'comment': comment,
+                        'max_depth': constants.COMMENT_MAX_DEPTH,
+                    },
+                    request=self.request,
+                ),
                 'is_child': comment.is_child_node(),
                 'id': comment.id,
                 'author': comment.author.username,
@@ -198,6 +310,45 @@ class CommentCreateView(LoginRequiredMixin, CreateView):
         )
 
 
+class CommentListView(View):
+    """
+    Представление: страница комментариев поста для догрузки.
+    Без parent - следующие корневые ветки, с parent - ответы на комментарий.
+    Возвращает JSON с HTML-фрагментом и адресом следующей страницы.
+    """
+
+    def get(self, request, *args, **kwargs):
+        post_id = self.kwargs.get('pk')
+        parent = None
+        if request.GET.get('parent'):
+            try:
+                parent_id = int(request.GET['parent'])
+            except ValueError:
+                return JsonResponse(
+                    {'error': 'Некорректный комментарий'},
+                    status=HTTPStatus.BAD_REQUEST,
+                )
+            parent = get_object_or_404(Comment, pk=parent_id, post_id=post_id)
+        try:
+            comments = load_comment_page(
+                post_id, parent, request.GET.get('after'))
+        except InvalidCursor as e:
+            raise Http404(str(e))
+        comments_next = comments.has_next() and comment_page_url(
+            post_id, parent, comments.next_cursor)
+        html = render_to_string(
+            'blog/comments/comment_page.html',
+            {
+                'comments': comments,
+                'comments_next': comments_next,
+                'parent': parent,
+                'max_depth': constants.COMMENT_MAX_DEPTH,
+            },
+            request=request,
+        )
+        return JsonResponse({'html': html, 'next': comments_next or None})
+
+
 class CommentDeleteView(LoginRequiredMixin, DeleteView):
     """Представление: удаление комментариев."""
 
@@ -216,37 +367,33 @@ class CommentDeleteView(LoginRequiredMixin, DeleteView):
             )
 
 
-class RatingCreateView(View):
-    """Представление: Рейтинг постов."""
-    model = PostRating
+class RatingCreateView(LoginRequiredMixin, View):
+    """
+    Представление: Рейтинг постов.
+    Голос применяется одним обращением к БД (см. apps.blog.rating), а в
+    режиме RATING_WRITE_BEHIND - копится в буфере до записи задачей
+    (см. apps.blog.rating_buffer.cast_vote).
+    """
 
     def post(self, request, *args, **kwargs):
-        user = request.user
-        post_id = request.POST.get('pk')
-        value = int(request.POST.get('value'))
-
-        rating, created = self.model.objects.get_or_create(
-            post_id=post_id,
-            user=user,
-            defaults={'value': value},
-        )
+        try:
+            post_id = int(request.POST.get('pk'))
+            value = int(request.POST.get('value'))
+            status, rating_sum = cast_vote(post_id, request.user.pk, value)
+        except (TypeError, ValueError):
+            return JsonResponse(
+                {'error': 'Некорректный голос'},
+                status=HTTPStatus.BAD_REQUEST,
+            )
+        except Post.DoesNotExist:
+            return JsonResponse(
+                {'error': 'Пост не найден'},
+                status=HTTPStatus.NOT_FOUND,
+            )
+        return JsonResponse({'status': status, 'rating_sum': rating_sum})
 
-        if not created:
-            if rating.value == value:
-                rating.delete()
-                return JsonResponse({
-                    'status': 'deleted',
-                    'rating_sum': rating.post.get_sum_rating(),
-                })
-            else:
-                rating.value = value
-                rating.save()
-                return JsonResponse({
-                    'status': 'updated',
-                    'rating_sum': rating.post.get_sum_rating(),
-                })
-        else:
-            return JsonResponse({
-                'status': 'created',
-                'rating_sum': rating.post.get_sum_rating(),
-            })
+    def handle_no_permission(self):
+        return JsonResponse(
+            {'error': 'Необходимо авторизоваться для голосования'},
+            status=400
+        )
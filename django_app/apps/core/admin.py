@@ -0,0 +1,30 @@
+from django.contrib import admin
+
+from .models import SlowQuery
+
+
+@admin.register(SlowQuery)
+class SlowQueryAdmin(admin.ModelAdmin):
+    """Админ панель журнала медленных запросов (только чтение)."""
+
+    list_display = (
+        '__str__', 'view', 'count', 'total_time', 'average_time', 'max_time',
+        'last_seen',
+    )
+    list_filter = ('view',)
+    search_fields = ('sql', 'view', 'template')
+    readonly_fields = (
+        'fingerprint', 'sql', 'count', 'total_time', 'average_time',
+        'max_time', 'view', 'template', 'explain', 'first_seen', 'last_seen',
+    )
+    fields = readonly_fields
+
+    @admin.display(description='В среднем, с')
+    def average_time(self, obj):
+        return round(obj.average_time, 4)
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
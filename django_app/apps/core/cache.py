@@ -0,0 +1,41 @@
+import time
+
+from django.core.cache.backends import locmem, redis
+
+from .metrics import current
+
+_missing = object()
+
+
+class MetricsCacheMixin:
+    """Попадания, промахи и время get() в метриках текущего запроса."""
+
+    def get(self, key, default=None, version=None):
+        started = time.perf_counter()
+        value = super().get(key, _missing, version)
+        metrics = current.get()
+        if metrics is not None:
+            metrics.cache_time += time.perf_counter() - started
+            if value is _missing:
+                metrics.cache_misses += 1
+            else:
+                metrics.cache_hits += 1
+        return default if value is _missing else value
+
+
+class LocMemCache(MetricsCacheMixin, locmem.LocMemCache):
+    # get_many базового класса вызывает get() по ключу - уже посчитано.
+    pass
+
+
+class RedisCache(MetricsCacheMixin, redis.RedisCache):
+
+    def get_many(self, keys, version=None):
+        started = time.perf_counter()
+        values = super().get_many(keys, version)
+        metrics = current.get()
+        if metrics is not None:
+            metrics.cache_time += time.perf_counter() - started
+            metrics.cache_hits += len(values)
+            metrics.cache_misses += len(keys) - len(values)
+        return values
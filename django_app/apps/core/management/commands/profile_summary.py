@@ -0,0 +1,54 @@
+from collections import Counter
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.core.profiling import make_token, profile_paths, summarize
+from apps.services import constants
+
+
+class Command(BaseCommand):
+    """
+    Команда: самые горячие функции по собранным профилям запросов
+    (PROFILING_DIR): собственное время - функция выполнялась сама,
+    общее - была в стеке (только функции модулей --module, иначе сверху
+    всегда обработчик Django). С --token выводит значение заголовка X-Profile
+    для профилирования своего запроса, например:
+    curl -H "X-Profile: $(python manage.py profile_summary --token)" ...
+    """
+
+    help = 'Сводка по профилям запросов.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--view', default=None,
+                            help='Только профили представления (blog:home).')
+        parser.add_argument('--limit', type=int, default=20)
+        parser.add_argument(
+            '--module', action='append', default=None,
+            help='Префикс модулей для общего времени (можно несколько), '
+                 'по умолчанию приложения сайта.')
+        parser.add_argument('--dir', default=settings.PROFILING_DIR)
+        parser.add_argument('--token', action='store_true',
+                            help='Вывести подписанный заголовок X-Profile.')
+
+    def handle(self, *args, **options):
+        if options['token']:
+            self.stdout.write(make_token())
+            return
+        paths = profile_paths(options['dir'], options['view'])
+        if not paths:
+            raise CommandError(f'Нет профилей в {options["dir"]}')
+        total, own, inclusive = summarize(paths)
+        modules = tuple(options['module'] or constants.PROJECT_MODULES)
+        if not total:
+            raise CommandError('В профилях нет выборок')
+        inclusive = Counter({
+            frame: count for frame, count in inclusive.items()
+            if frame.startswith(modules)
+        })
+        self.stdout.write(f'Профилей: {len(paths)}, выборок: {total}')
+        for title, counter in (('Собственное время', own),
+                               ('Общее время', inclusive)):
+            self.stdout.write(self.style.MIGRATE_HEADING(title))
+            for frame, count in counter.most_common(options['limit']):
+                self.stdout.write(f'{count / total:>7.1%} {count:>8}  {frame}')
@@ -0,0 +1,287 @@
+import atexit
+import glob
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import connections
+
+from .slow_queries import slow_query_log
+
+logger = logging.getLogger(__name__)
+
+# Границы корзин гистограмм: время ответа (с) и запросов к БД за запрос.
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200)
+# Счетчики представления: имя метрики Prometheus и описание.
+COUNTERS = {
+    'db_seconds': ('blog_request_db_seconds_total',
+                   'Время запросов к БД, с.'),
+    'template_seconds': ('blog_request_template_seconds_total',
+                         'Время отрисовки TemplateResponse, с.'),
+    'cache_hits': ('blog_cache_hits_total', 'Попаданий в кеш.'),
+    'cache_misses': ('blog_cache_misses_total', 'Промахов кеша.'),
+    'over_budget': ('blog_request_query_budget_exceeded_total',
+                    'Запросов сверх METRICS_QUERY_BUDGET обращений к БД.'),
+}
+HISTOGRAMS = {
+    'duration': ('blog_request_duration_seconds', 'Время ответа, с.',
+                 DURATION_BUCKETS),
+    'queries': ('blog_request_queries', 'Обращений к БД за запрос.',
+                QUERY_BUCKETS),
+}
+
+# Метрики текущего запроса (для кеша и шаблонов).
+current = ContextVar('request_metrics', default=None)
+
+
+class RequestMetrics:
+    """Счетчики одного запроса."""
+
+    __slots__ = ('queries', 'db_time', 'cache_hits', 'cache_misses',
+                 'cache_time', 'template_time', 'view', 'view_started',
+                 'view_time', 'spans')
+
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.cache_time = 0.0
+        self.template_time = 0.0
+        self.view = None
+        self.view_started = None
+        self.view_time = None
+        # Участки, отмеченные timing(): {имя: с}.
+        self.spans = {}
+
+    def execute(self, execute, sql, params, many, context):
+        """
+        Обертка connection.execute_wrapper: кол-во и время запросов,
+        медленные (SLOW_QUERY_THRESHOLD) - в журнал медленных запросов.
+        """
+        started = time.perf_counter()
+        try:
+            result = execute(sql, params, many, context)
+        finally:
+            duration = time.perf_counter() - started
+            self.queries += 1
+            self.db_time += duration
+        threshold = settings.SLOW_QUERY_THRESHOLD
+        if threshold and duration >= threshold:
+            slow_query_log.record(
+                sql, params, many, duration, self.view or 'middleware',
+                context)
+        return result
+
+    def end_view(self):
+        """Конец работы представления (до отрисовки шаблона)."""
+        if self.view_started is not None and self.view_time is None:
+            self.view_time = time.perf_counter() - self.view_started
+
+
+@contextmanager
+def collect():
+    """Сбор метрик запроса по всем подключениям к БД."""
+    metrics = RequestMetrics()
+    token = current.set(metrics)
+    try:
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(
+                    connection.execute_wrapper(metrics.execute))
+            yield metrics
+    finally:
+        current.reset(token)
+
+
+@contextmanager
+def timing(name):
+    """
+    Отдельная строка Server-Timing для участка кода, например:
+    with timing('comments'): ...
+    Вне запроса ничего не делает.
+    """
+    metrics = current.get()
+    if metrics is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        metrics.spans[name] = (
+            metrics.spans.get(name, 0) + time.perf_counter() - started)
+
+
+def server_timing(metrics, total):
+    """
+    Значение заголовка Server-Timing (мс). Фазы: middleware - все вне
+    представления и шаблона, view - представление (включая его запросы
+    к БД и кешу), tpl - отрисовка TemplateResponse; db и cache - суммарно
+    по запросу и пересекаются с остальными.
+    """
+    view = metrics.view_time or 0
+    entries = [
+        ('total', total, None),
+        ('mw', max(total - view - metrics.template_time, 0), None),
+        ('view', view, None),
+        ('tpl', metrics.template_time, None),
+        ('db', metrics.db_time, f'{metrics.queries} queries'),
+        ('cache', metrics.cache_time,
+         f'{metrics.cache_hits} hits, {metrics.cache_misses} misses'),
+    ]
+    entries.extend(
+        (name, duration, None) for name, duration in metrics.spans.items())
+    return ', '.join(
+        f'{name};dur={duration * 1000:.1f}'
+        + (f';desc="{description}"' if description else '')
+        for name, duration, description in entries
+    )
+
+
+def _new_stats():
+    stats = {'requests': {}}
+    stats.update(dict.fromkeys(COUNTERS, 0))
+    for name, (_, _, buckets) in HISTOGRAMS.items():
+        # Корзины (не накопительно), +Inf и сумма.
+        stats[name] = [0] * (len(buckets) + 1) + [0]
+    return stats
+
+
+def _observe(histogram, buckets, value):
+    for index, bound in enumerate(buckets):
+        if value <= bound:
+            break
+    else:
+        index = len(buckets)
+    histogram[index] += 1
+    histogram[-1] += value
+
+
+class Registry:
+    """
+    Метрики процесса по имени представления. Каждый процесс (воркер
+    gunicorn) не чаще раза в METRICS_FLUSH_INTERVAL секунд записывает
+    их в свой файл METRICS_DIR/<pid>.json, /metrics складывает файлы
+    всех процессов: запрос не ждет ни сети, ни блокировок между
+    процессами. Файлы завершившихся процессов остаются (счетчики не
+    убывают), каталог очищается при запуске (startup.sh).
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.views = {}
+        self.flushed_at = time.monotonic()
+
+    def record(self, view, method, status, duration, metrics):
+        with self.lock:
+            stats = self.views.get(view)
+            if stats is None:
+                stats = self.views[view] = _new_stats()
+            key = f'{method} {status}'
+            stats['requests'][key] = stats['requests'].get(key, 0) + 1
+            _observe(stats['duration'], DURATION_BUCKETS, duration)
+            _observe(stats['queries'], QUERY_BUCKETS, metrics.queries)
+            stats['db_seconds'] += metrics.db_time
+            stats['template_seconds'] += metrics.template_time
+            stats['cache_hits'] += metrics.cache_hits
+            stats['cache_misses'] += metrics.cache_misses
+            if metrics.queries > settings.METRICS_QUERY_BUDGET:
+                stats['over_budget'] += 1
+                logger.warning(
+                    f'{view}: {metrics.queries} запросов к БД '
+                    f'(бюджет {settings.METRICS_QUERY_BUDGET})')
+        if time.monotonic() - self.flushed_at >= settings.METRICS_FLUSH_INTERVAL:
+            self.flush()
+
+    def flush(self):
+        """Атомарная запись метрик процесса в его файл."""
+        with self.lock:
+            if not self.views:
+                return
+            data = json.dumps(self.views)
+            self.flushed_at = time.monotonic()
+        directory = settings.METRICS_DIR
+        try:
+            os.makedirs(directory, exist_ok=True)
+            descriptor, path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+            with os.fdopen(descriptor, 'w') as file:
+                file.write(data)
+            os.replace(path, os.path.join(directory, f'{os.getpid()}.json'))
+        except OSError as e:
+            logger.warning(f'Не удалось записать метрики: {e}')
+
+    def collect(self):
+        """Сумма метрик всех процессов."""
+        self.flush()
+        total = {}
+        for path in glob.glob(os.path.join(settings.METRICS_DIR, '*.json')):
+            try:
+                with open(path) as file:
+                    views = json.load(file)
+            except (OSError, ValueError):
+                continue
+            for view, stats in views.items():
+                _merge(total.setdefault(view, _new_stats()), stats)
+        return total
+
+
+def _merge(total, stats):
+    for key, count in stats['requests'].items():
+        total['requests'][key] = total['requests'].get(key, 0) + count
+    for name in COUNTERS:
+        total[name] += stats[name]
+    for name in HISTOGRAMS:
+        total[name] = [a + b for a, b in zip(total[name], stats[name])]
+
+
+def _labels(**labels):
+    escaped = (
+        (name, str(value).replace('\\', r'\\').replace('"', r'\"')
+         .replace('\n', r'\n'))
+        for name, value in labels.items()
+    )
+    return '{' + ','.join(f'{name}="{value}"' for name, value in escaped) + '}'
+
+
+def render(views):
+    """Метрики в текстовом формате Prometheus."""
+    lines = [
+        '# HELP blog_requests_total Запросов по представлению, методу и статусу.',
+        '# TYPE blog_requests_total counter',
+    ]
+    for view, stats in sorted(views.items()):
+        for key, count in sorted(stats['requests'].items()):
+            method, status = key.split(' ')
+            lines.append(
+                f'blog_requests_total'
+                f'{_labels(view=view, method=method, status=status)} {count}')
+    for name, (metric, description, buckets) in HISTOGRAMS.items():
+        lines.append(f'# HELP {metric} {description}')
+        lines.append(f'# TYPE {metric} histogram')
+        for view, stats in sorted(views.items()):
+            histogram = stats[name]
+            cumulative = 0
+            for bound, count in zip(buckets + ('+Inf',), histogram):
+                cumulative += count
+                lines.append(
+                    f'{metric}_bucket{_labels(view=view, le=bound)} {cumulative}')
+            lines.append(f'{metric}_sum{_labels(view=view)} {histogram[-1]}')
+            lines.append(f'{metric}_count{_labels(view=view)} {cumulative}')
+    for name, (metric, description) in COUNTERS.items():
+        lines.append(f'# HELP {metric} {description}')
+        lines.append(f'# TYPE {metric} counter')
+        for view, stats in sorted(views.items()):
+            lines.append(f'{metric}{_labels(view=view)} {stats[name]}')
+    return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+atexit.register(registry.flush)
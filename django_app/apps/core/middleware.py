@@ -0,0 +1,135 @@
+import logging
+import re
+import threading
+import time
+import uuid
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+
+from . import metrics, nplusone, profiling
+from .slow_queries import slow_query_log
+
+logger = logging.getLogger(__name__)
+
+# Допустимый X-Request-ID от nginx ($request_id) или балансировщика.
+REQUEST_ID_RE = re.compile(r'^[A-Za-z0-9._-]{1,64}$')
+
+
+class MetricsMiddleware:
+    """
+    Метрики запроса по имени представления (resolver_match.view_name):
+    время ответа, кол-во и время запросов к БД, попадания в кеш и время
+    отрисовки шаблона, медленные запросы к БД (apps.core.slow_queries).
+    Те же замеры уходят в ответ заголовком
+    Server-Timing по фазам (см. metrics.server_timing) вместе с
+    X-Request-ID: id из заголовка запроса (nginx) или новый, он же
+    доступен как request.id. Стоит первым в MIDDLEWARE, чтобы учитывать
+    запросы сессий и авторизации.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        started = time.perf_counter()
+        request_id = request.headers.get('X-Request-ID', '')
+        request.id = (
+            request_id if REQUEST_ID_RE.match(request_id)
+            else uuid.uuid4().hex
+        )
+        with metrics.collect() as request_metrics:
+            response = self.get_response(request)
+        request_metrics.end_view()
+        duration = time.perf_counter() - started
+        match = request.resolver_match
+        metrics.registry.record(
+            match.view_name if match else 'unresolved',
+            request.method,
+            response.status_code,
+            duration,
+            request_metrics,
+        )
+        response['Server-Timing'] = metrics.server_timing(
+            request_metrics, duration)
+        response['X-Request-ID'] = request.id
+        slow_query_log.flush_if_due()
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request_metrics = metrics.current.get()
+        if request_metrics is not None:
+            request_metrics.view = request.resolver_match.view_name
+            request_metrics.view_started = time.perf_counter()
+
+    def process_template_response(self, request, response):
+        request_metrics = metrics.current.get()
+        if request_metrics is None:
+            return response
+        request_metrics.end_view()
+        started = time.perf_counter()
+
+        def rendered(response):
+            request_metrics.template_time += time.perf_counter() - started
+
+        response.add_post_render_callback(rendered)
+        return response
+
+
+class ProfilingMiddleware:
+    """
+    Выборочное профилирование запросов (см. apps.core.profiling): по
+    подписанному заголовку X-Profile, доле PROFILING_SAMPLE_RATE или
+    порогу PROFILING_THRESHOLD - в последнем случае стеки снимаются со
+    всех запросов, а сохраняются только у медленных. Без заголовка и
+    с нулевыми настройками стоит одной проверки заголовка.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        reason = profiling.trigger(request)
+        if reason is None:
+            return self.get_response(request)
+        thread_id = threading.get_ident()
+        started = time.perf_counter()
+        profiling.sampler.start(thread_id)
+        try:
+            response = self.get_response(request)
+        finally:
+            stacks = profiling.sampler.stop(thread_id)
+        duration = time.perf_counter() - started
+        if reason == 'threshold' and duration < settings.PROFILING_THRESHOLD:
+            return response
+        match = request.resolver_match
+        try:
+            name = profiling.write_profile(
+                stacks,
+                match.view_name if match else 'unresolved',
+                getattr(request, 'id', uuid.uuid4().hex),
+                duration,
+            )
+        except OSError as e:
+            logger.warning(f'Не удалось записать профиль: {e}')
+            return response
+        if reason == 'header' and name:
+            response['X-Profile'] = name
+        return response
+
+
+class NPlusOneMiddleware:
+    """
+    Поиск N+1 в каждом запросе (apps.core.nplusone): при DEBUG -
+    предупреждение в консоль, в тестах - ошибка. При
+    NPLUSONE_DETECTOR = 'off' не подключается.
+    """
+
+    def __init__(self, get_response):
+        if settings.NPLUSONE_DETECTOR == 'off':
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with nplusone.detect(f'{request.method} {request.path}'):
+            return self.get_response(request)
@@ -0,0 +1,47 @@
+from django.db import models
+
+
+class SlowQuery(models.Model):
+    """
+    Модель: Медленный SQL-запрос, сгруппированный по отпечатку
+    нормализованного текста (см. apps.core.slow_queries): сколько раз и
+    сколько времени, где встретился последний раз и план выполнения.
+    """
+
+    fingerprint = models.CharField(
+        max_length=40,
+        unique=True,
+        verbose_name='Отпечаток',
+    )
+    sql = models.TextField(verbose_name='Запрос')
+    count = models.PositiveIntegerField(default=0, verbose_name='Кол-во')
+    total_time = models.FloatField(default=0, verbose_name='Всего, с')
+    max_time = models.FloatField(default=0, verbose_name='Максимум, с')
+    view = models.CharField(
+        max_length=255,
+        blank=True,
+        verbose_name='Представление',
+    )
+    template = models.CharField(
+        max_length=255,
+        blank=True,
+        verbose_name='Строка шаблона',
+    )
+    explain = models.TextField(blank=True, verbose_name='План (EXPLAIN)')
+    first_seen = models.DateTimeField(
+        auto_now_add=True,
+        verbose_name='Впервые',
+    )
+    last_seen = models.DateTimeField(auto_now=True, verbose_name='Последний раз')
+
+    class Meta:
+        verbose_name = 'Медленный запрос'
+        verbose_name_plural = 'Медленные запросы'
+        ordering = ('-total_time',)
+
+    def __str__(self):
+        return self.sql[:80]
+
+    @property
+    def average_time(self):
+        return self.total_time / self.count if self.count else 0
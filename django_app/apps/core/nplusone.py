@@ -0,0 +1,111 @@
+import logging
+import sys
+from contextlib import ExitStack, contextmanager
+
+from django.conf import settings
+from django.db import connections
+
+from apps.services import constants
+from .slow_queries import fingerprint, normalize, template_line
+
+logger = logging.getLogger(__name__)
+
+
+class NPlusOneError(AssertionError):
+    """Повторяющиеся однотипные запросы (NPLUSONE_DETECTOR = 'raise')."""
+
+
+def _describe(descriptor):
+    """Связь, ленивая загрузка которой выполнила запрос."""
+    field = getattr(descriptor, 'field', None)
+    if field is not None:
+        return f'{field.model.__name__}.{field.name}'
+    related = getattr(descriptor, 'related', None)
+    if related is not None:
+        return f'{related.model.__name__}.{related.get_accessor_name()}'
+    return ''
+
+
+def query_location():
+    """
+    Откуда запрос: строка шаблона, ленивая связь (post.author,
+    user.userprofile) и ближайшая строка кода приложений сайта.
+    """
+    attribute = code = ''
+    frame = sys._getframe(1)
+    while frame is not None:
+        if (not attribute and frame.f_code.co_name == '__get__'
+                and frame.f_globals.get('__name__', '').endswith(
+                    'related_descriptors')):
+            attribute = _describe(frame.f_locals.get('self'))
+        module = frame.f_globals.get('__name__', '')
+        if not code and module.startswith(constants.PROJECT_MODULES):
+            code = f'{module}:{frame.f_lineno}'
+        frame = frame.f_back
+    parts = (
+        ('шаблон', template_line()), ('связь', attribute), ('код', code))
+    return ', '.join(f'{name} {value}' for name, value in parts if value)
+
+
+class Detector:
+    """
+    Счетчик SELECT-запросов по отпечатку нормализованного текста
+    (apps.core.slow_queries.normalize): запросы одной формы, которые
+    отличаются только параметрами. Место запоминается при первом
+    повторе - стек разбирается только для повторяющихся запросов.
+    """
+
+    def __init__(self):
+        self.queries = {}
+
+    def execute(self, execute, sql, params, many, context):
+        result = execute(sql, params, many, context)
+        if not many and sql.lstrip()[:6].upper() == 'SELECT':
+            key = fingerprint(normalize(sql))
+            entry = self.queries.get(key)
+            if entry is None:
+                self.queries[key] = [1, sql, '']
+            else:
+                entry[0] += 1
+                if entry[0] == 2:
+                    entry[2] = query_location()
+        return result
+
+    def offenders(self, threshold):
+        """[(кол-во, пример запроса, место)] повторенных threshold раз."""
+        return sorted(
+            (tuple(entry) for entry in self.queries.values()
+             if entry[0] >= threshold),
+            reverse=True,
+        )
+
+
+def report(offenders, label):
+    lines = [
+        f'{count} x {sql[:200]} ({location or "место не найдено"})'
+        for count, sql, location in offenders
+    ]
+    return f'N+1 в {label}:\n' + '\n'.join(lines)
+
+
+@contextmanager
+def detect(label='блоке кода', mode=None):
+    """
+    Поиск N+1 в блоке кода по всем подключениям к БД. По итогам, если
+    блок завершился без исключения: при mode 'warn' - предупреждение в
+    лог, при 'raise' - NPlusOneError. По умолчанию режим из
+    NPLUSONE_DETECTOR.
+    """
+    detector = Detector()
+    with ExitStack() as stack:
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(detector.execute))
+        yield detector
+    mode = mode or settings.NPLUSONE_DETECTOR
+    offenders = detector.offenders(settings.NPLUSONE_THRESHOLD)
+    if not offenders or mode == 'off':
+        return
+    message = report(offenders, label)
+    if mode == 'raise':
+        raise NPlusOneError(message)
+    logger.warning(message)
@@ -0,0 +1,169 @@
+import glob
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.core import signing
+
+# Соль подписи заголовка X-Profile.
+TOKEN_SALT = 'apps.core.profiling'
+TOKEN_VALUE = 'profile'
+PROFILE_SUFFIX = '.collapsed'
+
+
+def make_token():
+    """Значение заголовка X-Profile (действует PROFILING_TOKEN_MAX_AGE)."""
+    return signing.TimestampSigner(salt=TOKEN_SALT).sign(TOKEN_VALUE)
+
+
+def valid_token(value):
+    try:
+        return signing.TimestampSigner(salt=TOKEN_SALT).unsign(
+            value, max_age=settings.PROFILING_TOKEN_MAX_AGE) == TOKEN_VALUE
+    except signing.BadSignature:
+        return False
+
+
+def trigger(request):
+    """
+    Причина профилировать запрос: 'header' (подписанный X-Profile),
+    'sample' (доля PROFILING_SAMPLE_RATE), 'threshold' (решение после
+    ответа по PROFILING_THRESHOLD) или None.
+    """
+    token = request.headers.get('X-Profile')
+    if token and valid_token(token):
+        return 'header'
+    if random.random() < settings.PROFILING_SAMPLE_RATE:
+        return 'sample'
+    if settings.PROFILING_THRESHOLD:
+        return 'threshold'
+    return None
+
+
+_labels = {}
+
+
+def _label(frame):
+    code = frame.f_code
+    label = _labels.get(code)
+    if label is None:
+        module = frame.f_globals.get('__name__', '?')
+        label = _labels[code] = f'{module}:{code.co_qualname}'.replace(';', ',')
+    return label
+
+
+def collapse(frame):
+    """Стек в формате collapsed: корень;...;текущая функция."""
+    labels = []
+    while frame is not None:
+        labels.append(_label(frame))
+        frame = frame.f_back
+    return ';'.join(reversed(labels))
+
+
+class Sampler:
+    """
+    Общий для процесса поток выборки: раз в PROFILING_INTERVAL снимает
+    стеки потоков, чьи запросы профилируются (sys._current_frames).
+    Поток запускается с первым таким запросом и завершается, когда их
+    не остается; сам запрос на выборку времени не тратит.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.active = {}
+        self.thread = None
+
+    def start(self, thread_id):
+        with self.lock:
+            self.active[thread_id] = Counter()
+            if self.thread is None or not self.thread.is_alive():
+                self.thread = threading.Thread(
+                    target=self.run, name='profiling-sampler', daemon=True)
+                self.thread.start()
+
+    def stop(self, thread_id):
+        """Снятые стеки потока: Counter {стек: кол-во выборок}."""
+        with self.lock:
+            return self.active.pop(thread_id, Counter())
+
+    def run(self):
+        while True:
+            time.sleep(settings.PROFILING_INTERVAL)
+            with self.lock:
+                if not self.active:
+                    self.thread = None
+                    return
+                frames = sys._current_frames()
+                for thread_id, stacks in self.active.items():
+                    frame = frames.get(thread_id)
+                    if frame is not None:
+                        stacks[collapse(frame)] += 1
+
+
+sampler = Sampler()
+
+
+def write_profile(stacks, view, request_id, duration):
+    """
+    Профиль в PROFILING_DIR (формат collapsed, совместим с flamegraph.pl
+    и speedscope), самые старые файлы сверх PROFILING_MAX_FILES
+    удаляются. Возвращает имя файла или None, если выборок нет (запрос
+    короче PROFILING_INTERVAL): пустой файл вытеснил бы настоящий.
+    """
+    if not stacks:
+        return None
+    directory = settings.PROFILING_DIR
+    os.makedirs(directory, exist_ok=True)
+    name = '{}-{}-{}ms-{}{}'.format(
+        time.strftime('%Y%m%d-%H%M%S'),
+        view.replace(':', '.').replace('/', '.'),
+        round(duration * 1000),
+        request_id,
+        PROFILE_SUFFIX,
+    )
+    descriptor, path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    with os.fdopen(descriptor, 'w') as file:
+        for stack, count in stacks.most_common():
+            file.write(f'{stack} {count}\n')
+    os.replace(path, os.path.join(directory, name))
+    profiles = sorted(profile_paths(directory))
+    for old in profiles[:-settings.PROFILING_MAX_FILES]:
+        try:
+            os.remove(old)
+        except FileNotFoundError:
+            pass
+    return name
+
+
+def profile_paths(directory, view=None):
+    pattern = f'*-{view.replace(":", ".")}-*' if view else '*'
+    return glob.glob(os.path.join(directory, pattern + PROFILE_SUFFIX))
+
+
+def summarize(paths):
+    """
+    Сводка по профилям: (всего выборок, собственные выборки функции,
+    выборки со функцией в стеке). Рекурсия считается один раз на стек.
+    """
+    total = 0
+    own = Counter()
+    inclusive = Counter()
+    for path in paths:
+        with open(path) as file:
+            for line in file:
+                stack, _, count = line.rstrip('\n').rpartition(' ')
+                if not stack or not count.isdigit():
+                    continue
+                count = int(count)
+                frames = stack.split(';')
+                total += count
+                own[frames[-1]] += count
+                for frame in set(frames):
+                    inclusive[frame] += count
+    return total, own, inclusive
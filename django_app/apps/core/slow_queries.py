@@ -0,0 +1,178 @@
+import hashlib
+import logging
+import re
+import sys
+import threading
+import time
+
+from django.conf import settings
+from django.db import DatabaseError, IntegrityError, transaction
+from django.db.models import F, Value
+from django.db.models.functions import Greatest
+from django.template.base import Node
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+# Нормализация: строки и числа - в ?, списки значений - в (...).
+STRING_RE = re.compile(r"'(?:[^']|'')*'")
+NUMBER_RE = re.compile(r'(?<![\w"])-?\d+(?:\.\d+)?\b')
+PLACEHOLDER_RE = re.compile(r'%s|\?')
+LIST_RE = re.compile(r'\(\s*\?(?:\s*,\s*\?)*\s*\)')
+SPACE_RE = re.compile(r'\s+')
+EXPLAINABLE = ('SELECT', 'WITH')
+
+
+def normalize(sql):
+    """Текст запроса без значений: одинаков для запросов одного вида."""
+    sql = STRING_RE.sub('?', sql)
+    sql = NUMBER_RE.sub('?', sql)
+    sql = PLACEHOLDER_RE.sub('?', sql)
+    sql = LIST_RE.sub('(...)', sql)
+    return SPACE_RE.sub(' ', sql).strip()
+
+
+def fingerprint(normalized):
+    return hashlib.sha1(normalized.encode()).hexdigest()
+
+
+def template_line():
+    """
+    Строка шаблона, при отрисовке которой выполняется запрос: ближайший
+    по стеку Node.render_annotated (узлы знают свой шаблон и строку).
+    """
+    frame = sys._getframe(1)
+    while frame is not None:
+        if frame.f_code is Node.render_annotated.__code__:
+            node = frame.f_locals.get('self')
+            origin = getattr(node, 'origin', None)
+            token = getattr(node, 'token', None)
+            if origin is not None and token is not None:
+                name = origin.template_name or origin.name
+                return f'{name}:{token.lineno}'
+        frame = frame.f_back
+    return ''
+
+
+class SlowQueryLog:
+    """
+    Медленные запросы процесса по отпечатку. Запись в БД - пачкой не
+    чаще раза в METRICS_FLUSH_INTERVAL после ответа (flush из
+    MetricsMiddleware), а не из обертки запроса: журнал не попадает
+    в транзакцию представления и не нагружает БД каждым медленным
+    запросом. EXPLAIN выполняется один раз на отпечаток в процессе.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.entries = {}
+        self.explained = set()
+        self.local = threading.local()
+        self.flushed_at = time.monotonic()
+
+    def record(self, sql, params, many, duration, view, context):
+        """Учет медленного запроса; вызывается из обертки execute."""
+        if getattr(self.local, 'busy', False):
+            return
+        normalized = normalize(sql)
+        key = fingerprint(normalized)
+        explain = None
+        if key not in self.explained and not many:
+            self.explained.add(key)
+            explain = self.explain(context['connection'], sql, params)
+        where = template_line()
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                entry = self.entries[key] = {
+                    'sql': normalized, 'count': 0, 'total_time': 0.0,
+                    'max_time': 0.0, 'explain': '',
+                }
+            entry['count'] += 1
+            entry['total_time'] += duration
+            entry['max_time'] = max(entry['max_time'], duration)
+            entry['view'] = view[:255]
+            entry['template'] = where[:255]
+            if explain:
+                entry['explain'] = explain
+        logger.warning(
+            f'Медленный запрос {duration * 1000:.0f} мс ({view} '
+            f'{where}): {normalized[:200]}')
+
+    def explain(self, connection, sql, params):
+        """
+        План запроса без выполнения (EXPLAIN без ANALYZE). В точке
+        сохранения: ошибка EXPLAIN не прерывает транзакцию представления.
+        """
+        if not sql.lstrip().upper().startswith(EXPLAINABLE):
+            return ''
+        self.local.busy = True
+        try:
+            with transaction.atomic(using=connection.alias):
+                with connection.cursor() as cursor:
+                    cursor.execute(
+                        f'{connection.ops.explain_query_prefix()} {sql}',
+                        params)
+                    rows = cursor.fetchall()
+        except DatabaseError as e:
+            return f'Не удалось получить план: {e}'
+        finally:
+            self.local.busy = False
+        return '\n'.join(
+            ' '.join(str(value) for value in row) for row in rows)
+
+    def flush_if_due(self):
+        if time.monotonic() - self.flushed_at >= settings.METRICS_FLUSH_INTERVAL:
+            self.flush()
+
+    def flush(self):
+        """Запись накопленного в SlowQuery (счетчики прибавляются)."""
+        from .models import SlowQuery
+
+        with self.lock:
+            entries, self.entries = self.entries, {}
+            self.flushed_at = time.monotonic()
+        if not entries:
+            return
+        self.local.busy = True
+        try:
+            for key, entry in entries.items():
+                self._save(SlowQuery, key, entry)
+        except DatabaseError as e:
+            logger.warning(f'Не удалось записать медленные запросы: {e}')
+        finally:
+            self.local.busy = False
+
+    def _save(self, model, key, entry):
+        fields = {
+            'count': F('count') + entry['count'],
+            'total_time': F('total_time') + entry['total_time'],
+            'max_time': Greatest('max_time', Value(entry['max_time'])),
+            'view': entry['view'],
+            'template': entry['template'],
+            # update() не проставляет auto_now.
+            'last_seen': timezone.now(),
+        }
+        queryset = model.objects.filter(fingerprint=key)
+        if not queryset.update(**fields):
+            try:
+                with transaction.atomic():
+                    model.objects.create(
+                        fingerprint=key,
+                        sql=entry['sql'],
+                        count=entry['count'],
+                        total_time=entry['total_time'],
+                        max_time=entry['max_time'],
+                        view=entry['view'],
+                        template=entry['template'],
+                        explain=entry['explain'],
+                    )
+                return
+            except IntegrityError:
+                # Запись создал другой процесс.
+                queryset.update(**fields)
+        if entry['explain']:
+            queryset.filter(explain='').update(explain=entry['explain'])
+
+
+slow_query_log = SlowQueryLog()
@@ -0,0 +1,60 @@
+from collections import Counter
+
+import pytest
+
+from apps.blog.models import Category, Comment, Post
+from apps.core.nplusone import NPlusOneError
+from apps.core.profiling import profile_paths, write_profile
+from apps.user_app.models import NextgenUser
+
+
+@pytest.fixture
+def post_with_comments(db):
+    """Пост с комментариями пяти разных авторов."""
+    authors = [
+        NextgenUser.objects.create_user(username=f'author{i}')
+        for i in range(5)
+    ]
+    post = Post.objects.create(
+        title='Пост',
+        description='Описание',
+        text='Текст',
+        category=Category.objects.create(title='Раздел', slug='razdel'),
+        author=authors[0],
+        updater=authors[0],
+    )
+    for author in authors:
+        Comment.objects.create(post=post, author=author, body='Комментарий')
+    return post
+
+
+def test_lazy_relation_in_loop_fails(nplusone, post_with_comments):
+    with pytest.raises(NPlusOneError, match='Comment.author'):
+        with nplusone():
+            for comment in post_with_comments.comments.all():
+                comment.author.username
+
+
+def test_select_related_passes(nplusone, post_with_comments):
+    with nplusone():
+        comments = post_with_comments.comments.select_related('author')
+        for comment in comments:
+            comment.author.username
+
+
+def test_post_detail_has_no_n_plus_one(nplusone, client, post_with_comments):
+    response = client.get(post_with_comments.get_absolute_url())
+    assert response.status_code == 200
+
+
+def test_empty_profile_does_not_rotate_out_real_ones(settings, tmp_path):
+    """
+    Запрос короче интервала выборки не дает стеков: файл не пишется и
+    не вытесняет сохраненный профиль при ротации.
+    """
+    settings.PROFILING_DIR = str(tmp_path)
+    settings.PROFILING_MAX_FILES = 1
+    name = write_profile(Counter({'main;view': 3}), 'blog:home', 'a', 0.1)
+
+    assert write_profile(Counter(), 'blog:home', 'b', 0.001) is None
+    assert profile_paths(str(tmp_path)) == [str(tmp_path / name)]
@@ -1,6 +1,12 @@
 from http import HTTPStatus
 
+from django.conf import settings
+from django.core.exceptions import PermissionDenied
+from django.http import HttpResponse
 from django.shortcuts import render
+from django.utils.crypto import constant_time_compare
+
+from . import metrics
 
 
 def custom_404(request, exception):
@@ -21,3 +27,19 @@ def custom_403csrf(request, reason=''):
 def custom_500(request):
     template = 'core/500.html'
     return render(request, template, status=HTTPStatus.INTERNAL_SERVER_ERROR)
+
+
+def metrics_view(request):
+    """
+    Метрики всех процессов в формате Prometheus. Доступ - персоналу или
+    по заголовку Authorization: Bearer <METRICS_TOKEN>.
+    """
+    token = settings.METRICS_TOKEN
+    authorization = request.headers.get('Authorization', '')
+    if not (request.user.is_staff or token and constant_time_compare(
+            authorization, f'Bearer {token}')):
+        raise PermissionDenied
+    return HttpResponse(
+        metrics.render(metrics.registry.collect()),
+        content_type='text/plain; version=0.0.4; charset=utf-8',
+    )
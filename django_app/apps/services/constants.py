@@ -24,3 +24,44 @@ PATH_MAX_LENGTH: int = 1000
 
 # Пагинация постов.
 PAGINATE_POSTS_COUNT: int = 4
+
+# Максимальная глубина вложенности ветки комментариев при выводе.
+COMMENT_MAX_DEPTH: int = 4
+
+# Пагинация комментариев: корневых веток и ответов в ветке.
+PAGINATE_COMMENTS_COUNT: int = 20
+
+# Пагинация результатов поиска.
+PAGINATE_SEARCH_COUNT: int = 10
+
+# Сколько последних постов тега хранить для ленты по тегу без JOIN.
+TAG_RECENT_POSTS_COUNT: int = 200
+
+# Кол-во тегов в облаке тегов.
+TAG_CLOUD_COUNT: int = 30
+
+# Ширины уменьшенных копий изображений (px): карточки и страница поста,
+# аватары в комментариях (50px, с запасом для экранов с плотностью 2x).
+THUMBNAIL_WIDTHS: tuple = (320, 640, 960, 1280)
+AVATAR_WIDTHS: tuple = (50, 100, 300)
+
+# Качество сжатия уменьшенных копий (WebP/JPEG).
+IMAGE_VARIANT_QUALITY: int = 80
+
+# Минимальный возраст (ч) неиспользуемого медиафайла для сборщика мусора:
+# более новые могут быть еще не сохранены в БД.
+MEDIA_GC_MIN_AGE_HOURS: int = 24
+
+# Slug: запас длины под суффикс -N, кол-во основ в одном запросе
+# занятых slug и попыток сохранения при гонке за один slug.
+SLUG_SUFFIX_LENGTH: int = 11
+SLUG_QUERY_BATCH: int = 100
+SLUG_SAVE_ATTEMPTS: int = 8
+
+# Модули приложений сайта: по ним ищется место запроса в N+1
+# (apps.core.nplusone) и отбираются функции в сводке профилей.
+PROJECT_MODULES: tuple = ('apps.blog', 'apps.user_app', 'apps.services')
+
+# Время жизни (с) блокировки записи буфера голосов: дольше любой записи,
+# но блокировку упавшего воркера снимает.
+RATING_FLUSH_LOCK_TIMEOUT: int = 60
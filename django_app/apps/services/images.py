@@ -0,0 +1,89 @@
+import os
+from io import BytesIO
+
+from django.core.files.base import ContentFile
+from PIL import Image, ImageOps
+
+from apps.services import constants
+
+# Форматы вариантов: WebP для современных браузеров, JPEG - запасной.
+VARIANT_FORMATS = {
+    'webp': ('WEBP', 'image/webp'),
+    'jpeg': ('JPEG', 'image/jpeg'),
+}
+
+
+def variant_name(name, width, extension):
+    """Вариант хранится рядом с оригиналом: photo.jpg -> photo.w320.webp."""
+    return f'{os.path.splitext(name)[0]}.w{width}.{extension}'
+
+
+def has_variants(field_file, variants):
+    """Варианты построены именно для текущего файла поля."""
+    return bool(variants) and variants.get('source') == field_file.name
+
+
+def needs_variants(field_file, variants):
+    """Загружен новый файл (не изображение по умолчанию) без вариантов."""
+    if not field_file or field_file.name == field_file.field.default:
+        return False
+    return not has_variants(field_file, variants)
+
+
+def _flatten(image):
+    """RGB без прозрачности (на белом фоне) для JPEG."""
+    if image.mode in ('RGBA', 'LA', 'P'):
+        image = image.convert('RGBA')
+        background = Image.new('RGB', image.size, 'white')
+        background.paste(image, mask=image.getchannel('A'))
+        return background
+    return image.convert('RGB')
+
+
+def make_variants(field_file, widths):
+    """
+    Уменьшенные копии изображения поля заданной ширины в WebP и JPEG.
+    Ширины больше оригинала пропускаются (но хотя бы одна копия
+    создается - шириной оригинала). Возвращает описание вариантов:
+    {'source': имя оригинала, 'webp': [[ширина, имя], ...], 'jpeg': ...}.
+    """
+    storage = field_file.storage
+    with field_file.open('rb') as source:
+        image = ImageOps.exif_transpose(Image.open(source))
+        image.load()
+    image = _flatten(image)
+    widths = sorted({min(width, image.width) for width in widths})
+    variants = {'source': field_file.name}
+    for extension, (image_format, _) in VARIANT_FORMATS.items():
+        variants[extension] = []
+        for width in widths:
+            height = max(round(image.height * width / image.width), 1)
+            resized = image.resize((width, height), Image.LANCZOS)
+            buffer = BytesIO()
+            resized.save(
+                buffer,
+                image_format,
+                quality=constants.IMAGE_VARIANT_QUALITY,
+                optimize=True,
+            )
+            name = variant_name(field_file.name, width, extension)
+            if storage.exists(name):
+                storage.delete(name)
+            name = storage.save(name, ContentFile(buffer.getvalue()))
+            variants[extension].append([width, name])
+    return variants
+
+
+def delete_variants(storage, variants):
+    """Удаление файлов вариантов (оригинал не трогается)."""
+    for extension in VARIANT_FORMATS:
+        for _, name in (variants or {}).get(extension, ()):
+            storage.delete(name)
+
+
+def srcset(storage, variants, extension):
+    """Значение srcset для одного формата вариантов."""
+    return ', '.join(
+        f'{storage.url(name)} {width}w'
+        for width, name in variants.get(extension, ())
+    )
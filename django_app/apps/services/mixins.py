@@ -1,9 +1,13 @@
 from django.contrib.auth.mixins import AccessMixin
 from django.contrib import messages
+from django.http import Http404, JsonResponse
 from django.shortcuts import redirect
+from django.template.loader import render_to_string
 
 from apps.blog.models import Post
+from apps.core.metrics import timing
 from apps.services.constants import PAGINATE_POSTS_COUNT
+from apps.services.pagination import KeysetPaginator, InvalidCursor
 
 
 class AuthorRequiredMixin(AccessMixin):
@@ -21,13 +25,56 @@ class AuthorRequiredMixin(AccessMixin):
 
 
 class PostListMixin:
-    """Миксин: Модель поста с пагинацией и шаблоном."""
+    """
+    Миксин: Модель поста с пагинацией и шаблоном.
+    Пагинация по курсору (?after=) в порядке закрепа/даты, AJAX-запрос
+    получает следующую страницу в JSON для бесконечной ленты.
+    """
 
     model = Post
     paginate_by = PAGINATE_POSTS_COUNT
+    paginator_class = KeysetPaginator
+    keyset_ordering = ('-fixed', '-create', 'id')
+    cursor_kwarg = 'after'
     context_object_name = 'posts'
     tempalte_name = 'blog/post_list.html'
 
+    def is_ajax(self):
+        return self.request.headers.get('X-Requested-With') == 'XMLHttpRequest'
+
+    def get_paginator(self, queryset, per_page, **kwargs):
+        return self.paginator_class(queryset, per_page, self.keyset_ordering)
+
+    def paginate_queryset(self, queryset, page_size):
+        paginator = self.get_paginator(queryset, page_size)
+        try:
+            with timing('page'):
+                page = paginator.page(self.request.GET.get(self.cursor_kwarg))
+        except InvalidCursor as e:
+            raise Http404(str(e))
+        return (paginator, page, page.object_list, page.has_other_pages())
+
+    def get_next_page_url(self, page):
+        """Ссылка на следующую страницу с сохранением прочих GET-параметров."""
+        if not page.has_next():
+            return None
+        query = self.request.GET.copy()
+        query[self.cursor_kwarg] = page.next_cursor
+        return f'{self.request.path}?{query.urlencode()}'
+
+    def render_to_response(self, context, **response_kwargs):
+        if self.is_ajax():
+            page = context['page_obj']
+            return JsonResponse({
+                'html': render_to_string(
+                    'includes/post_cards.html',
+                    {'posts': page.object_list},
+                    request=self.request,
+                ),
+                'next': self.get_next_page_url(page),
+            })
+        return super().render_to_response(context, **response_kwargs)
+
 
 class WaringFormMessageMixin:
     """Миксин: Вывод информации об ошибке в форме."""
@@ -0,0 +1,254 @@
+import hashlib
+import secrets
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Q
+from django.http import HttpResponse
+
+from apps.services.pagination import KeysetPaginator
+
+# Области кеша страниц. Ключ страницы включает версии своих областей,
+# поэтому сброс области - это смена ее версии, а старые страницы просто
+# перестают находиться и вытесняются кешем. Страницы лент сбрасываются
+# по одной: изменение поста сбрасывает только страницы с его карточкой.
+SITE_SCOPE = 'site'
+HOME_SCOPE = 'feed:home'
+SEARCH_SCOPE = 'search'
+
+PAGE_CACHE_HEADER = 'X-Page-Cache'
+
+# Поля поста, по которым определяются ленты и страницы с его карточкой.
+FEED_POSITION_FIELDS = ('slug', 'status', 'fixed', 'create', 'category')
+
+
+def post_scope(slug):
+    """Область страницы конкретного поста."""
+    return f'post:{slug}'
+
+
+def category_scope(slug):
+    """Область ленты категории (с постами вложенных категорий)."""
+    return f'feed:category:{slug}'
+
+
+def tag_scope(slug):
+    """Область ленты тега."""
+    return f'feed:tag:{slug}'
+
+
+def feed_page_scope(feed, cursor=None):
+    """Область страницы ленты: первой или следующей за курсором."""
+    return f'{feed}:page:{cursor or ""}'
+
+
+def _version_key(scope):
+    return f'pagecache:version:{scope}'
+
+
+def get_versions(scopes):
+    """Текущие версии областей, отсутствующие создаются."""
+    keys = [_version_key(scope) for scope in scopes]
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            cache.add(key, time.time_ns(), timeout=None)
+            versions[key] = cache.get(key)
+    return [versions[key] for key in keys]
+
+
+def invalidate(*scopes):
+    """
+    Сброс областей кеша страниц: всем областям записывается новая
+    случайная версия одним обращением к кешу (изменение поста сбрасывает
+    десятки страниц лент).
+    """
+    if scopes:
+        version = secrets.token_hex(8)
+        cache.set_many(
+            {_version_key(scope): version for scope in scopes}, timeout=None)
+
+
+def invalidate_post(slug):
+    """Сброс страницы поста: комментарии меняют только ее."""
+    invalidate(post_scope(slug))
+
+
+def invalidate_post_card(post_id):
+    """
+    Сброс страницы поста и страниц лент с его карточкой: голоса и готовые
+    уменьшенные копии изображения меняют карточку, но не место поста в
+    лентах.
+    """
+    invalidate(*post_card_scopes(post_id))
+
+
+def post_card_scopes(post_id):
+    """
+    Области страницы поста и страниц лент с его карточкой. Голос не
+    меняет место поста в лентах, поэтому области можно найти до голоса,
+    а после коммита останется только сбросить их.
+    """
+    from apps.blog.models import Post
+
+    post = Post.objects.only(*FEED_POSITION_FIELDS).filter(pk=post_id).first()
+    if post is None:
+        return set()
+    return {post_scope(post.slug), *feed_page_scopes(
+        post, post.tags.values_list('pk', 'slug'))}
+
+
+def invalidate_post_feeds(post, previous=None, tag_ids=()):
+    """
+    Сброс страницы поста, поиска и страниц лент, на которых карточка
+    поста есть сейчас и была до сохранения (previous - пост из БД до
+    сохранения: перенос в другую категорию, смена даты, закрепа или
+    статуса переставляют карточку). tag_ids - снятые с поста теги.
+    """
+    from taggit.models import Tag
+
+    condition = Q(pk__in=tag_ids)
+    if post.pk is not None:
+        condition |= Q(pk__in=post.tags.values('pk'))
+    tags = list(Tag.objects.filter(condition).values_list('pk', 'slug'))
+    scopes = {post_scope(post.slug), SEARCH_SCOPE}
+    for state in (post, previous):
+        if state is not None:
+            scopes.update(feed_page_scopes(state, tags))
+    invalidate(*scopes)
+
+
+def feed_page_scopes(post, tags):
+    """
+    Области страниц лент с карточкой опубликованного поста: главной,
+    категории поста и ее предков, тегов tags (пары id и slug).
+    """
+    from apps.blog.category_tree import get_category_tree
+    from apps.blog.models import Post
+
+    if post.status != 'published':
+        return set()
+    feeds = [(HOME_SCOPE, Post.published.all())]
+    node = get_category_tree().nodes.get(post.category_id)
+    if node is not None:
+        feeds += [
+            (
+                category_scope(category.slug),
+                Post.published.filter(category_id__in=category.descendant_ids),
+            )
+            for category in (*node.ancestors, node)
+        ]
+    feeds += [
+        (tag_scope(slug), Post.published.filter(tags=pk)) for pk, slug in tags
+    ]
+    scopes = set()
+    for feed, queryset in feeds:
+        scopes.update(_feed_page_scopes(feed, queryset, post))
+    return scopes
+
+
+def _feed_page_scopes(feed, queryset, post):
+    """
+    Страница ленты с курсором - следующие за курсором посты, поэтому
+    карточку поста показывают страницы после PAGINATE_POSTS_COUNT
+    ближайших постов выше него (и первая, если их меньше). Берется на
+    один пост больше: у той страницы от поста зависит кнопка "дальше".
+    Сам пост из выборки исключается, поэтому так же находятся и
+    страницы с его прежним местом.
+    """
+    from apps.services.mixins import PostListMixin
+
+    ordering = PostListMixin.keyset_ordering
+    reverse = [
+        name[1:] if name.startswith('-') else f'-{name}' for name in ordering
+    ]
+    count = PostListMixin.paginate_by + 1
+    forward = KeysetPaginator(queryset, count, ordering)
+    ahead = KeysetPaginator(
+        queryset.exclude(pk=post.pk).only('fixed', 'create'), count, reverse,
+    ).page(forward.encode(post)).object_list
+    scopes = {
+        feed_page_scope(feed, forward.encode(other)) for other in ahead
+    }
+    if len(ahead) < count:
+        scopes.add(feed_page_scope(feed))
+    return scopes
+
+
+class AnonymousPageCacheMixin:
+    """
+    Миксин: кеш целых страниц для анонимных пользователей.
+    Ключ - адрес страницы и версии областей из get_page_cache_scopes();
+    сброс областей делают сигналы моделей (см. apps.blog.signals).
+    Ответ помечается заголовком X-Page-Cache: HIT, MISS или BYPASS.
+    """
+
+    page_cache_scopes = ()
+
+    def get_page_cache_scopes(self):
+        return (SITE_SCOPE, *self.page_cache_scopes)
+
+    def page_cache_allowed(self, request):
+        """Кешируются только GET анонимов без сессии (например, сообщений)."""
+        return (
+            request.method in ('GET', 'HEAD')
+            and not request.user.is_authenticated
+            and settings.SESSION_COOKIE_NAME not in request.COOKIES
+        )
+
+    def get_page_cache_key(self, request):
+        versions = get_versions(self.get_page_cache_scopes())
+        ajax = request.headers.get('X-Requested-With') == 'XMLHttpRequest'
+        url = hashlib.md5(
+            f'{ajax}:{request.get_full_path()}'.encode()).hexdigest()
+        return 'pagecache:page:{}:{}'.format(
+            '.'.join(map(str, versions)), url)
+
+    def dispatch(self, request, *args, **kwargs):
+        if not self.page_cache_allowed(request):
+            response = super().dispatch(request, *args, **kwargs)
+            response[PAGE_CACHE_HEADER] = 'BYPASS'
+            return response
+
+        key = self.get_page_cache_key(request)
+        cached = cache.get(key)
+        if cached is not None:
+            content, content_type = cached
+            response = HttpResponse(content, content_type=content_type)
+            response[PAGE_CACHE_HEADER] = 'HIT'
+            return response
+
+        response = super().dispatch(request, *args, **kwargs)
+        response[PAGE_CACHE_HEADER] = 'MISS'
+
+        def store(response):
+            if response.status_code == 200 and not response.cookies:
+                cache.set(
+                    key,
+                    (response.content, response['Content-Type']),
+                    settings.PAGE_CACHE_TIMEOUT,
+                )
+
+        if getattr(response, 'is_rendered', True):
+            store(response)
+        else:
+            response.add_post_render_callback(store)
+        return response
+
+
+class FeedPageCacheMixin(AnonymousPageCacheMixin):
+    """
+    Миксин: кеш страниц ленты с пагинацией по курсору (PostListMixin).
+    Каждая страница - своя область (feed_page_scope), и изменение поста
+    сбрасывает только страницы с его карточкой (см. feed_page_scopes).
+    """
+
+    feed_scope = HOME_SCOPE
+
+    def get_feed_scope(self):
+        return self.feed_scope
+
+    def get_page_cache_scopes(self):
+        return (SITE_SCOPE, feed_page_scope(
+            self.get_feed_scope(), self.request.GET.get(self.cursor_kwarg)))
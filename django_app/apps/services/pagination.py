@@ -0,0 +1,119 @@
+import base64
+import binascii
+import json
+from datetime import datetime
+
+from django.core.exceptions import ValidationError
+from django.core.paginator import InvalidPage
+from django.db.models import Q
+
+
+class InvalidCursor(InvalidPage):
+    """Исключение: курсор страницы поврежден или подделан."""
+
+    pass
+
+
+class KeysetPage:
+    """
+    Страница keyset-пагинации.
+    В отличие от Page джанги не знает общего кол-ва объектов и номера
+    страницы - только есть ли следующая и курсор на нее.
+    """
+
+    is_keyset = True
+
+    def __init__(self, object_list, cursor, next_cursor):
+        self.object_list = object_list
+        self.cursor = cursor
+        self.next_cursor = next_cursor
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __repr__(self):
+        return f'<KeysetPage after={self.cursor}>'
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+class KeysetPaginator:
+    """
+    Пагинация по ключу (курсору) вместо OFFSET.
+    Следующая страница выбирается условием "строго после последней записи"
+    в порядке ordering, поэтому глубокие страницы стоят столько же сколько
+    первая, а COUNT(*) не выполняется вовсе.
+    Последнее поле ordering должно быть уникальным (обычно id).
+    """
+
+    def __init__(self, queryset, per_page, ordering):
+        self.queryset = queryset
+        self.per_page = int(per_page)
+        self.ordering = tuple(ordering)
+        self.fields = tuple(
+            (name.lstrip('-'), name.startswith('-')) for name in self.ordering
+        )
+
+    def page(self, cursor=None):
+        """Получение страницы, следующей за курсором (или первой)."""
+        queryset = self.queryset.order_by(*self.ordering)
+        if cursor:
+            queryset = queryset.filter(self._after(self.decode(cursor)))
+        object_list = list(queryset[:self.per_page + 1])
+        next_cursor = None
+        if len(object_list) > self.per_page:
+            object_list = object_list[:self.per_page]
+            next_cursor = self.encode(object_list[-1])
+        return KeysetPage(object_list, cursor or None, next_cursor)
+
+    def encode(self, obj):
+        """Курсор: значения полей сортировки объекта в base64."""
+        values = []
+        for name, _ in self.fields:
+            value = getattr(obj, name)
+            if isinstance(value, datetime):
+                value = value.isoformat()
+            values.append(value)
+        raw = json.dumps(values, separators=(',', ':')).encode()
+        return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+    def decode(self, cursor):
+        """Разбор курсора с приведением значений к типам полей модели."""
+        try:
+            raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+            values = json.loads(raw)
+        except (binascii.Error, ValueError):
+            raise InvalidCursor('Некорректный курсор страницы')
+        if not isinstance(values, list) or len(values) != len(self.fields):
+            raise InvalidCursor('Некорректный курсор страницы')
+        opts = self.queryset.model._meta
+        try:
+            return [
+                opts.get_field(name).to_python(value)
+                for (name, _), value in zip(self.fields, values)
+            ]
+        except (ValidationError, TypeError):
+            raise InvalidCursor('Некорректный курсор страницы')
+
+    def _after(self, values):
+        """
+        Условие "после курсора" для составного ключа:
+        (a < x) OR (a = x AND b < y) OR (a = x AND b = y AND c > z) ...
+        """
+        condition = Q()
+        equal = Q()
+        for (name, descending), value in zip(self.fields, values):
+            lookup = 'lt' if descending else 'gt'
+            condition |= equal & Q(**{f'{name}__{lookup}': value})
+            equal &= Q(**{name: value})
+        return condition
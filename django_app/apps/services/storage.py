@@ -0,0 +1,77 @@
+import hashlib
+import os
+import tempfile
+
+from django.conf import settings
+from django.core.files.storage import FileSystemStorage
+
+
+def blob_name(digest, extension):
+    """Имя файла по содержимому: uploads/blobs/ab/cd/<sha256>.png."""
+    return os.path.join(
+        settings.UPLOAD_BLOBS_PATH,
+        digest[:2],
+        digest[2:4],
+        f'{digest}{extension.lower()}',
+    )
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    Хранилище загрузок ckeditor с адресацией по содержимому.
+    Файл хэшируется (sha256) во время записи во временный файл, имя
+    определяется хэшем, поэтому одинаковые файлы хранятся один раз,
+    а их URL никогда не меняет содержимое (кешируется как immutable).
+    Предложенное имя используется только ради расширения.
+    Каждый файл учитывается в UploadBlob (один на содержимое).
+    """
+
+    def get_available_name(self, name, max_length=None):
+        # Имя все равно заменяется хэшем содержимого.
+        return name
+
+    def _save(self, name, content):
+        directory = self.path(settings.UPLOAD_BLOBS_PATH)
+        os.makedirs(directory, exist_ok=True)
+        digest = hashlib.sha256()
+        size = 0
+        # Временный файл в том же разделе - перенос атомарный.
+        with tempfile.NamedTemporaryFile(
+            dir=directory, prefix='.upload-', delete=False,
+        ) as temporary:
+            try:
+                if hasattr(content, 'seek'):
+                    content.seek(0)
+                for chunk in content.chunks():
+                    if isinstance(chunk, str):
+                        chunk = chunk.encode()
+                    digest.update(chunk)
+                    temporary.write(chunk)
+                    size += len(chunk)
+            except BaseException:
+                os.remove(temporary.name)
+                raise
+        name = self.register_blob(
+            digest.hexdigest(), os.path.splitext(name)[1], size)
+        path = self.path(name)
+        if os.path.exists(path):
+            os.remove(temporary.name)
+        else:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            if self.file_permissions_mode is not None:
+                os.chmod(temporary.name, self.file_permissions_mode)
+            os.replace(temporary.name, path)
+        return name
+
+    def register_blob(self, digest, extension, size):
+        """
+        Учет файла в UploadBlob. Возвращает имя уже известного файла с тем
+        же содержимым (даже с другим расширением) или новое имя.
+        """
+        from apps.blog.models import UploadBlob
+
+        blob, _ = UploadBlob.objects.get_or_create(
+            sha256=digest,
+            defaults={'file': blob_name(digest, extension), 'size': size},
+        )
+        return blob.file
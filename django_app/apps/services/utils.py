@@ -1,17 +1,117 @@
 from django.conf import settings
+from django.db import IntegrityError, connections, router, transaction
+from django.db.models import Q
 
 import os
+import random
+import re
 from uuid import uuid4
 from pytils.translit import slugify
 
+from apps.services import constants
 
-def unique_slugify(instance, slug: str):
-    """Генератор уникальных SLUG."""
-    model = instance.__class__
-    unique_slug = slugify(slug)
-    while model.objects.filter(slug=unique_slug).exists():
-        unique_slug = f'{unique_slug}-{uuid4().hex[:8]}'
-    return unique_slug
+
+class SlugAllocator:
+    """
+    Выдача уникальных slug для модели без цикла exists(): занятые slug
+    вида base и base-N читаются одним запросом по индексу (префикс:
+    LIKE или диапазон в SQLite), свободный номер выбирается в памяти.
+    allocate_many выдает slug пачке записей: один запрос на
+    SLUG_QUERY_BATCH разных основ, slug уникальны и внутри пачки.
+    """
+
+    def __init__(self, model, field_name='slug'):
+        self.model = model
+        self.field_name = field_name
+        max_length = model._meta.get_field(field_name).max_length
+        # Запас под суффикс -N.
+        self.base_length = max_length - constants.SLUG_SUFFIX_LENGTH
+
+    def base(self, text):
+        """Основа slug: транслитерация, обрезанная под суффикс."""
+        base = slugify(text)[:self.base_length].strip('-')
+        return base or self.model._meta.model_name
+
+    def allocate(self, text, skip=0):
+        return self.allocate_many([text], skip=skip)[0]
+
+    def allocate_many(self, texts, skip=0):
+        """
+        Свободные slug для списка текстов. skip - сколько свободных
+        номеров пропустить (разводит параллельные повторные попытки).
+        """
+        bases = [self.base(text) for text in texts]
+        taken = set()
+        unique_bases = list(dict.fromkeys(bases))
+        for start in range(0, len(unique_bases), constants.SLUG_QUERY_BATCH):
+            taken.update(self.taken_slugs(
+                unique_bases[start:start + constants.SLUG_QUERY_BATCH]))
+        counters = {}
+        slugs = []
+        for base in bases:
+            slug = base
+            number = counters.get(base, 1)
+            skipped = 0
+            while slug in taken or skipped < skip:
+                if slug not in taken:
+                    skipped += 1
+                number += 1
+                slug = f'{base}-{number}'
+            counters[base] = number
+            taken.add(slug)
+            slugs.append(slug)
+        return slugs
+
+    def taken_slugs(self, bases):
+        """Занятые slug вида base и base-N для указанных основ."""
+        manager = self.model._default_manager
+        vendor = connections[router.db_for_read(self.model)].vendor
+        condition = Q()
+        for base in bases:
+            condition |= Q(**{self.field_name: base})
+            if vendor == 'sqlite':
+                # LIKE с ESCAPE в SQLite не идет по индексу, а диапазон
+                # верен при побайтовом сравнении ('.' следует за '-').
+                condition |= Q(**{
+                    f'{self.field_name}__gte': f'{base}-',
+                    f'{self.field_name}__lt': f'{base}.',
+                })
+            else:
+                # Диапазон зависит от сопоставления (en_US.utf8 не
+                # учитывает '-'); LIKE идет по индексу *_like.
+                condition |= Q(**{f'{self.field_name}__startswith': f'{base}-'})
+        pattern = re.compile(
+            '^(?:' + '|'.join(map(re.escape, bases)) + r')(?:-\d+)?$')
+        slugs = manager.filter(condition).values_list(
+            self.field_name, flat=True)
+        return {slug for slug in slugs.iterator() if pattern.match(slug)}
+
+    def is_taken(self, slug):
+        return self.model._default_manager.filter(
+            **{self.field_name: slug}).exists()
+
+
+def save_with_unique_slug(instance, text, save, *args, **kwargs):
+    """
+    Сохранение новой записи со свободным slug. Если параллельный запрос
+    занял тот же slug раньше (IntegrityError по уникальному индексу),
+    вставка откатывается до точки сохранения и повторяется со свободным
+    номером, выбранным случайно из растущего окна - иначе все участники
+    гонки снова возьмут один и тот же номер.
+    """
+    allocator = SlugAllocator(type(instance))
+    for attempt in range(1, constants.SLUG_SAVE_ATTEMPTS + 1):
+        skip = random.randrange(2 ** attempt) if attempt > 1 else 0
+        instance.slug = allocator.allocate(text, skip=skip)
+        try:
+            with transaction.atomic():
+                return save(*args, **kwargs)
+        except IntegrityError:
+            if (
+                attempt == constants.SLUG_SAVE_ATTEMPTS
+                or not allocator.is_taken(instance.slug)
+            ):
+                raise
 
 
 def file_directory_path(instance, filename):
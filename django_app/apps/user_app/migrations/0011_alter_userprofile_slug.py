@@ -0,0 +1,37 @@
+# Generated by Django 5.0.4 on 2026-10-18 21:10
+
+from django.db import migrations, models
+from django.db.models import Count
+
+from apps.services.utils import SlugAllocator
+
+
+def reallocate_duplicate_slugs(apps, schema_editor):
+    """Новые slug для повторов (первый профиль сохраняет свой)."""
+    UserProfile = apps.get_model('user_app', 'UserProfile')
+    duplicates = UserProfile.objects.values('slug').annotate(
+        count=Count('id')).filter(count__gt=1).values_list('slug', flat=True)
+    allocator = SlugAllocator(UserProfile)
+    for slug in list(duplicates):
+        profiles = list(UserProfile.objects.filter(slug=slug).order_by('id')[1:])
+        slugs = allocator.allocate_many([slug] * len(profiles))
+        for profile, new_slug in zip(profiles, slugs):
+            profile.slug = new_slug
+        UserProfile.objects.bulk_update(profiles, ['slug'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('user_app', '0010_userprofile_avatar_variants'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            reallocate_duplicate_slugs, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='userprofile',
+            name='slug',
+            field=models.SlugField(max_length=255, unique=True, verbose_name='URL'),
+        ),
+    ]
@@ -8,7 +8,7 @@ from django.core.validators import FileExtensionValidator
 
 import os
 from apps.services import constants
-from apps.services.utils import unique_slugify
+from apps.services.utils import save_with_unique_slug
 
 
 class NextgenUser(AbstractUser):
@@ -48,6 +48,7 @@ class UserProfile(models.Model):
     )
     slug = models.SlugField(
         max_length=constants.SLUG_MAX_LENGTH,
+        unique=True,
         verbose_name='URL',
     )
     avatar = models.ImageField(
@@ -60,6 +61,14 @@ class UserProfile(models.Model):
         ))],
         verbose_name='Аватар',
     )
+    # Уменьшенные копии аватара, создаются задачей Celery
+    # (см. apps.services.images.make_variants).
+    avatar_variants = models.JSONField(
+        default=dict,
+        blank=True,
+        editable=False,
+        verbose_name='Варианты аватара',
+    )
     bio = models.TextField(
         max_length=constants.BIO_MAX_LENGTH,
         blank=True,
@@ -79,15 +88,15 @@ class UserProfile(models.Model):
         При обновлении фото, старое фото будет удаляться если оно не default.
         """
         if not self.pk:
-            self.slug = unique_slugify(self, self.user.username)
-        else:
-            pre_save_user = self.__class__.objects.get(pk=self.pk)
-            if (
-                pre_save_user.avatar != self.avatar
-                and os.path.isfile(pre_save_user.avatar.path)
-                and pre_save_user.avatar.name != 'images/default_user.jpg'
-            ):
-                os.remove(pre_save_user.avatar.path)
+            return save_with_unique_slug(
+                self, self.user.username, super().save, *args, **kwargs)
+        pre_save_user = self.__class__.objects.get(pk=self.pk)
+        if (
+            pre_save_user.avatar != self.avatar
+            and os.path.isfile(pre_save_user.avatar.path)
+            and pre_save_user.avatar.name != 'images/default_user.jpg'
+        ):
+            os.remove(pre_save_user.avatar.path)
         super().save(*args, **kwargs)
 
     def get_absolute_url(self):
@@ -11,8 +11,16 @@ app.config_from_object('django.conf:settings')
 app.autodiscover_tasks()
 
 app.conf.beat_schedule = {
-    "autolike_post_every_5_seconds": {
-        "task": "apps.blog.tasks.autolike_post_every_5_seconds",
+    "generate_engagement": {
+        "task": "apps.blog.tasks.generate_engagement",
         "schedule": timedelta(seconds=20),
     },
+    "flush_rating_buffer": {
+        "task": "apps.blog.tasks.flush_rating_buffer",
+        "schedule": timedelta(seconds=5),
+    },
+    "collect_orphaned_media": {
+        "task": "apps.blog.tasks.collect_orphaned_media",
+        "schedule": timedelta(days=1),
+    },
 }
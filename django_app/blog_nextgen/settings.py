@@ -1,6 +1,7 @@
 from pathlib import Path
 from dotenv import load_dotenv
 import os
+import tempfile
 load_dotenv()
 
 
@@ -54,6 +55,10 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # Метрики запросов: первым, чтобы учитывать всю обработку.
+    'apps.core.middleware.MetricsMiddleware',
+    'apps.core.middleware.ProfilingMiddleware',
+    'apps.core.middleware.NPlusOneMiddleware',
     # Base middleware.
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -160,6 +165,10 @@ MEDIA_URL = 'media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
 CKEDITOR_UPLOAD_PATH = 'uploads/'
+# Загрузки ckeditor хранятся по хэшу содержимого (без дублей) в
+# UPLOAD_BLOBS_PATH, nginx отдает их с Cache-Control: immutable.
+CKEDITOR_STORAGE_BACKEND = 'apps.services.storage.ContentAddressedStorage'
+UPLOAD_BLOBS_PATH = CKEDITOR_UPLOAD_PATH + 'blobs/'
 
 CKEDITOR_CONFIGS = {
     'awesome_ckeditor': {
@@ -176,9 +185,77 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 # Redis
 REDIS_HOST = 'redis'
 REDIS_PORT = '6379'
+
+# Кеш: общий для воркеров gunicorn Redis, при разработке - в памяти.
+if DEBUG:
+    CACHES = {
+        'default': {
+            'BACKEND': 'apps.core.cache.LocMemCache',
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'apps.core.cache.RedisCache',
+            'LOCATION': 'redis://' + REDIS_HOST + ':' + REDIS_PORT + '/2',
+        }
+    }
+
+# Метрики запросов (apps.core.metrics): каждый процесс пишет свой файл
+# в METRICS_DIR, /metrics отдает их сумму (персоналу или по токену).
+METRICS_DIR = os.getenv(
+    'METRICS_DIR', os.path.join(tempfile.gettempdir(), 'blog_nextgen_metrics'))
+METRICS_FLUSH_INTERVAL = 10
+METRICS_TOKEN = os.getenv('METRICS_TOKEN', '')
+# Обращений к БД за запрос, сверх которых пишется предупреждение.
+METRICS_QUERY_BUDGET = 30
+
+# Запросы к БД дольше порога (с) попадают в журнал медленных запросов
+# с планом выполнения (apps.core.slow_queries, админка), 0 - выключено.
+SLOW_QUERY_THRESHOLD = float(os.getenv('SLOW_QUERY_THRESHOLD', 0.1))
+
+# Поиск N+1 (apps.core.nplusone): однотипные запросы, повторенные за
+# запрос NPLUSONE_THRESHOLD раз и больше. 'warn' - предупреждение в лог,
+# 'raise' - ошибка (тесты, фикстура nplusone), 'off' - выключено.
+NPLUSONE_DETECTOR = (
+    os.getenv('NPLUSONE_DETECTOR') or ('warn' if DEBUG else 'off'))
+NPLUSONE_THRESHOLD = 3
+
+# Профилирование запросов (apps.core.profiling): всегда по подписанному
+# заголовку X-Profile (значение выдает profile_summary --token), а также
+# доля случайных запросов и порог медленного запроса в секундах (0 - нет).
+PROFILING_SAMPLE_RATE = float(os.getenv('PROFILING_SAMPLE_RATE', 0))
+PROFILING_THRESHOLD = float(os.getenv('PROFILING_THRESHOLD', 0))
+PROFILING_INTERVAL = 0.005
+PROFILING_TOKEN_MAX_AGE = 60 * 60 * 24
+PROFILING_DIR = os.getenv('PROFILING_DIR', str(BASE_DIR / 'profiles'))
+# Сколько последних профилей хранить.
+PROFILING_MAX_FILES = 500
+
+# Сколько хранить страницу в кеше для анонимов. Актуальность страниц
+# обеспечивает сброс по изменению моделей, срок лишь освобождает память.
+PAGE_CACHE_TIMEOUT = 60 * 60 * 24
+
+# Сколько хранить карточку поста в кеше фрагментов.
+POST_CARD_CACHE_TIMEOUT = 60 * 60 * 24 * 7
 BROKER_URL = 'redis://' + REDIS_HOST + ':' + REDIS_PORT + '/0'
 BROKER_TRANSPORT_OPTIONS = {'visibility_timeout': 3600}
 CELERY_RESULT_BACKEND = 'redis://' + REDIS_HOST + ':' + REDIS_PORT + '/0'
+# При разработке задачи (например, уменьшение изображений) выполняются
+# сразу, без брокера.
+CELERY_ALWAYS_EAGER = DEBUG
+
+# Отложенная запись голосов: клики копятся в буфере и пачками
+# записываются в БД задачей flush_rating_buffer. Буфер в Redis и при
+# разработке: задача выполняется в воркере Celery, отдельном процессе.
+RATING_WRITE_BEHIND = str(os.getenv('RATING_WRITE_BEHIND')) == 'True'
+RATING_BUFFER_BACKEND = 'apps.blog.rating_buffer.RedisVoteBuffer'
+RATING_BUFFER_REDIS_URL = 'redis://' + REDIS_HOST + ':' + REDIS_PORT + '/1'
+
+# Синтетическая активность (задача generate_engagement): пул
+# пользователей и события за один запуск.
+ENGAGEMENT_USERS = 100
+ENGAGEMENT_EVENTS = {'ratings': 1}
 
 # Переопределенная модель пользователя.
 AUTH_USER_MODEL = 'user_app.NextgenUser'
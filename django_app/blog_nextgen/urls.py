@@ -3,6 +3,8 @@ from django.urls import path, include, re_path
 from django.conf import settings
 from django.conf.urls.static import static
 
+from apps.core.views import metrics_view
+
 
 handler403 = 'apps.core.views.custom_403'
 handler404 = 'apps.core.views.custom_404'
@@ -11,6 +13,7 @@ handler500 = 'apps.core.views.custom_500'
 
 urlpatterns = [
     path('admin/', admin.site.urls),
+    path('metrics', metrics_view, name='metrics'),
     path('', include('apps.blog.urls', namespace='blog')),
     path('', include('apps.user_app.urls', namespace='user_app')),
     path('ckeditor/', include('ckeditor_uploader.urls')),
@@ -0,0 +1,16 @@
+import pytest
+
+
+@pytest.fixture
+def nplusone():
+    """
+    N+1 - ошибка теста (apps.core.nplusone): в запросах тестового клиента
+    через NPlusOneMiddleware и в блоках with nplusone(): для кода вне
+    представлений. Настройки Django подключает pytest-django (pytest.ini).
+    """
+    from django.test.utils import override_settings
+
+    from apps.core.nplusone import detect
+
+    with override_settings(NPLUSONE_DETECTOR='raise'):
+        yield detect
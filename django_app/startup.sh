@@ -3,4 +3,6 @@ cd django_app
 python manage.py migrate
 python manage.py collectstatic --no-input
 cp -r /blog_nextgen/static/. /backend_static/
+# Файлы метрик прошлых воркеров (apps.core.metrics).
+rm -rf "${METRICS_DIR:-/tmp/blog_nextgen_metrics}"
 gunicorn blog_nextgen.wsgi:application --bind 0.0.0.0:8000
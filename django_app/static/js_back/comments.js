@@ -1,33 +1,71 @@
+// Форма есть только у авторизованных, а догрузка и удаление нужны всем,
+// поэтому кнопки обрабатываются одним делегированным обработчиком: он
+// работает и для догруженных фрагментов, без повторной привязки.
 const commentForm = document.forms.commentForm;
-const commentFormContent = commentForm.body;
-const commentFormParentInput = commentForm.parent;
-const commentFormSubmit = commentForm.commentSubmit;
-const commentPostId = commentForm.getAttribute('data-post-id');
+const commentsRoot = document.querySelector('.nested-comments');
+// Ветка комментария, на который отвечают (null - новый корневой).
+let replyThread = null;
 
-commentForm.addEventListener('submit', createComment);
-
-replyUser();
+document.addEventListener('click', event => {
+  const moreButton = event.target.closest('.btn-more-comments');
+  if (moreButton) {
+    loadComments(moreButton);
+    return;
+  }
+  const deleteButton = event.target.closest('.btn-delete-comment');
+  if (deleteButton) {
+    event.preventDefault();
+    deleteComment(deleteButton);
+    return;
+  }
+  const replyButton = event.target.closest('.btn-reply');
+  if (replyButton && commentForm) {
+    replyComment(replyButton);
+  }
+});
 
-function replyUser() {
-  document.querySelectorAll('.btn-reply').forEach(e => {
-    e.addEventListener('click', replyComment);
-  });
+if (commentForm) {
+  commentForm.addEventListener('submit', createComment);
 }
 
-function replyComment() {
-  const commentUsername = this.getAttribute('data-comment-username');
-  const commentMessageId = this.getAttribute('data-comment-id');
-  commentFormContent.value = `${commentUsername}, `;
-  commentFormParentInput.value = commentMessageId;
+function replyComment(button) {
+  const commentUsername = button.getAttribute('data-comment-username');
+  const commentMessageId = button.getAttribute('data-comment-id');
+  commentForm.body.value = `${commentUsername}, `;
+  commentForm.parent.value = commentMessageId;
+  replyThread = button.closest('.comment-thread');
 }
 
-function setupEventHandlers() {
-  document.querySelectorAll('.btn-delete-comment').forEach(button => {
-    button.addEventListener('click', deleteComment);
-  });
+// Ответ кладется в ветку комментария, а на предельной глубине
+// (у комментария нет своей ветки) - рядом с ним, как и на сервере.
+function insertComment(html) {
+  if (!replyThread) {
+    commentsRoot.insertAdjacentHTML('afterbegin', html);
+    return;
+  }
+  const replies = replyThread.querySelector(':scope > .comment-replies');
+  (replies || replyThread.parentElement).insertAdjacentHTML('beforeend', html);
 }
 
-setupEventHandlers();
+// Догрузка корневых веток и ответов: фрагмент со страницей комментариев
+// (и кнопкой следующей страницы) встает на место нажатой кнопки.
+async function loadComments(button) {
+  button.disabled = true;
+  try {
+    const response = await fetch(button.getAttribute('data-url'), {
+      headers: {'X-Requested-With': 'XMLHttpRequest'},
+    });
+    if (!response.ok) {
+      throw new Error(response.status);
+    }
+    const page = await response.json();
+    button.insertAdjacentHTML('beforebegin', page.html);
+    button.remove();
+  } catch (error) {
+    console.error('Ошибка при загрузке комментариев:', error);
+    button.disabled = false;
+  }
+}
 
 async function createComment(event) {
   event.preventDefault();
@@ -35,6 +73,8 @@ async function createComment(event) {
     alert('Пожалуйста, введите капчу');
     return;
   }
+  const commentFormSubmit = commentForm.commentSubmit;
+  const commentPostId = commentForm.getAttribute('data-post-id');
   commentFormSubmit.disabled = true;
   commentFormSubmit.innerText = "Ожидаем ответа сервера";
   try {
@@ -47,57 +87,26 @@ async function createComment(event) {
       body: new FormData(commentForm),
     });
     const comment = await response.json();
-    const formattedDate = new Intl.DateTimeFormat('ru', {
-      year: 'numeric',
-      month: 'long',
-      day: 'numeric',
-      hour: 'numeric',
-      minute: 'numeric',
-      second: 'numeric',
-    }).format(new Date(comment.create));
-    console.log(comment);
-    let commentTemplate = `<li class="card border-1 m-1">
-                                <div class="row">
-                                  <div class="col-md-1">
-                                    <img src="${comment.avatar}" style="width: 50px;height: 50px;object-fit: cover;" alt="${comment.author}" class="rounded-circle m-2"/>
-                                  </div>
-                                  <div class="col-md-11">
-                                    <div class="card-body">
-                                      <span class="card-title">
-                                        <a href="${comment.get_absolute_url}">${comment.author}</a>
-                                        <time>${formattedDate}</time>
-                                      </span>
-                                      <p class="card-text">
-                                        ${comment.body}
-                                      </p>
-                                      <a class="btn btn-sm btn-dark btn-reply" href="#commentForm" data-comment-id="${comment.id}" data-comment-username="${comment.author}">Ответить</a>
-                                      <a class="btn btn-sm btn-danger btn-delete-comment" href="#commentForm" data-comment-id="${comment.id}">Удалить комментарий</a>
-                                    </div>
-                                  </div>
-                                </div>
-                              </li>`;
-    document.querySelector('.nested-comments').insertAdjacentHTML("beforeend", commentTemplate);
+    if (!response.ok) {
+      console.log(comment);
+      return;
+    }
+    insertComment(comment.html);
     commentForm.reset()
     grecaptcha.reset()
-    commentFormSubmit.disabled = false;
-    commentFormSubmit.innerText = "Добавить комментарий";
-    commentFormParentInput.value = null;
-    replyUser();
-    setupEventHandlers();
+    commentForm.parent.value = null;
+    replyThread = null;
   } catch (error) {
     console.log(error)
+  } finally {
+    commentFormSubmit.disabled = false;
+    commentFormSubmit.innerText = "Добавить комментарий";
   }
 }
 
-document.querySelectorAll('.btn-delete-comment').forEach(button => {
-  button.addEventListener('click', deleteComment);
-});
-
-async function deleteComment(event) {
-  event.preventDefault();
-  const commentId = this.getAttribute('data-comment-id');
+async function deleteComment(button) {
   try {
-    const response = await fetch(`/post/${commentPostId}/comments/${commentId}/delete/`, {
+    const response = await fetch(button.getAttribute('href'), {
       method: 'DELETE',
       headers: {
           'X-CSRFToken': getCookie('csrftoken'),
@@ -105,7 +114,7 @@ async function deleteComment(event) {
       },
     });
     if (response.ok) {
-      this.closest('.card').remove();
+      button.closest('.card').remove();
     } else {
       console.error('Ошибка при удалении комментария');
     }
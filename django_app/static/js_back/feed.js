@@ -0,0 +1,27 @@
+const feedNext = document.querySelector('.feed-next');
+const feedContainer = document.querySelector('.posts-feed');
+
+if (feedNext && feedContainer) {
+  feedNext.addEventListener('click', loadNextPage);
+}
+
+async function loadNextPage(event) {
+  event.preventDefault();
+  feedNext.classList.add('disabled');
+  try {
+    const response = await fetch(feedNext.href, {
+      headers: {'X-Requested-With': 'XMLHttpRequest'},
+    });
+    const page = await response.json();
+    feedContainer.insertAdjacentHTML('beforeend', page.html);
+    if (page.next) {
+      feedNext.href = page.next;
+      feedNext.classList.remove('disabled');
+    } else {
+      feedNext.closest('.page-item').remove();
+    }
+  } catch (error) {
+    console.error('Ошибка при загрузке ленты:', error);
+    feedNext.classList.remove('disabled');
+  }
+}